@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Configuration loading benchmark
+
+Measure the loading time of a generated configuration with many plugins,
+parsed by the pure Python and LibYAML loaders, and served by the cache.
+
+Usage:
+
+    $ python benchmarks/config.py --plugins 500 --repeat 20
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sirbot.utils import config  # noqa: E402
+
+
+def generate(plugins):
+    data = {'sirbot': {'port': 8080, 'plugins': []}}
+    for i in range(plugins):
+        name = 'plugin{}'.format(i)
+        data['sirbot']['plugins'].append('sirbot.plugins.{}'.format(name))
+        data[name] = {
+            'priority': 50,
+            'http': {'limit': 10, 'timeout': {'total': 30}},
+            'channels': ['C{:04d}'.format(j) for j in range(10)],
+            'options': {'key{}'.format(j): j for j in range(10)}
+        }
+    return yaml.dump(data, default_flow_style=False)
+
+
+def measure(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--plugins', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['SIRBOT_CONFIG_CACHE'] = os.path.join(directory, 'cache')
+        path = os.path.join(directory, 'sirbot.yml')
+        with open(path, 'w') as file:
+            file.write(generate(args.plugins))
+
+        def parse(loader):
+            with open(path) as file:
+                yaml.load(file, Loader=loader)
+
+        def cached():
+            config._memory.clear()
+            config.load_yaml(path)
+
+        config.load_yaml(path)
+        results = [
+            ('pure python', measure(lambda: parse(yaml.SafeLoader),
+                                    args.repeat)),
+            ('libyaml', measure(lambda: parse(config.Loader), args.repeat)),
+            ('disk cache', measure(cached, args.repeat)),
+            ('memory cache', measure(lambda: config.load_yaml(path),
+                                     args.repeat)),
+        ]
+
+    print('{:<14} {:>10}'.format('loader', 'ms'))
+    for name, duration in results:
+        print('{:<14} {:>10.2f}'.format(name, duration))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Log formatter benchmark
+
+Compare the default :code:`simple` formatter with the JSON formatter and the
+cost of eager and lazy arguments for disabled records.
+
+Usage:
+
+    $ python benchmarks/log_formatter.py --records 100000
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sirbot.utils.log import JSONFormatter, Lazy  # noqa: E402
+
+PAYLOAD = {'type': 'message', 'channel': 'C000', 'text': 'hello' * 20,
+           'attachments': [{'text': 'attachment', 'fields': list(range(20))}]}
+
+
+def make_record():
+    record = logging.LogRecord('sirbot.plugin', logging.INFO, __file__, 1,
+                               'Message %s from %s', ('M000', 'U000'), None)
+    record.plugin = 'slack'
+    record.request_id = '1a2b-42'
+    return record
+
+
+def bench_formatters(records):
+    formatters = {
+        'simple': logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        ),
+        'json': JSONFormatter()
+    }
+
+    results = {}
+    for name, formatter in formatters.items():
+        record = make_record()
+        results[name] = timeit.timeit(
+            lambda: formatter.format(record), number=records
+        )
+    return results
+
+
+def bench_disabled(records):
+    logger = logging.getLogger('sirbot.benchmark')
+    logger.setLevel(logging.INFO)
+
+    return {
+        'eager': timeit.timeit(
+            lambda: logger.debug('Payload %s' % json.dumps(PAYLOAD)),
+            number=records
+        ),
+        'lazy': timeit.timeit(
+            lambda: logger.debug('Payload %s', Lazy(json.dumps, PAYLOAD)),
+            number=records
+        )
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--records', type=int, default=100000)
+    args = parser.parse_args()
+
+    print('{:<16} {:>12}'.format('case', 'records/s'))
+    for name, duration in bench_formatters(args.records).items():
+        print('{:<16} {:>12.0f}'.format(name, args.records / duration))
+    for name, duration in bench_disabled(args.records).items():
+        print('{:<16} {:>12.0f}'.format(
+            'debug ' + name, args.records / duration))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""
+Webhook throughput benchmark
+
+Start Sir Bot-a-lot with the test plugin and a webhook route, once per event
+loop implementation, and measure the number of requests handled per second.
+
+Usage:
+
+    $ python benchmarks/webhook.py --requests 20000 --concurrency 100
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CONFIG = {
+    'sirbot': {
+        'plugins': ['tests.core.test_plugin.sirbot'],
+        'metrics': {'enabled': False}
+    },
+    'test': {}
+}
+
+
+def serve(loop_name, port):
+    from aiohttp import web
+
+    from sirbot import SirBot
+    from sirbot.registry import registry
+    from sirbot.utils import set_event_loop_policy
+
+    installed = set_event_loop_policy(loop_name)
+    if installed != loop_name:
+        sys.exit(2)
+
+    async def webhook(request):
+        await request.read()
+        registry['test']
+        return web.Response(status=200)
+
+    loop = asyncio.get_event_loop()
+    bot = SirBot(config=CONFIG, loop=loop)
+    bot.app.router.add_post('/webhook', webhook)
+    bot.run(host='127.0.0.1', port=port)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_port(port, process, timeout=10):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if process.poll() is not None:
+            return False
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+async def load(url, requests, concurrency, loop):
+    connector = aiohttp.TCPConnector(limit=concurrency, loop=loop)
+    async with aiohttp.ClientSession(connector=connector, loop=loop) as s:
+        remaining = iter(range(requests))
+        payload = b'{"type": "event_callback", "event": {"type": "message"}}'
+
+        async def worker():
+            for _ in remaining:
+                async with s.post(url, data=payload) as response:
+                    await response.read()
+
+        start = loop.time()
+        await asyncio.gather(
+            *(worker() for _ in range(concurrency)), loop=loop
+        )
+        return loop.time() - start
+
+
+def bench(loop_name, requests, concurrency):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, __file__, 'serve', '--loop', loop_name,
+         '--port', str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_port(port, process):
+            return None
+
+        loop = asyncio.new_event_loop()
+        url = 'http://127.0.0.1:{}/webhook'.format(port)
+        loop.run_until_complete(load(url, 100, concurrency, loop))  # warmup
+        duration = loop.run_until_complete(
+            load(url, requests, concurrency, loop)
+        )
+        loop.close()
+        return requests / duration
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('command', nargs='?', default='bench',
+                        choices=['bench', 'serve'])
+    parser.add_argument('--loop', default='asyncio')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.loop, args.port)
+        return
+
+    results = {}
+    for loop_name in ('asyncio', 'uvloop'):
+        results[loop_name] = bench(loop_name, args.requests, args.concurrency)
+
+    print('{:<10} {:>12}'.format('loop', 'requests/s'))
+    for loop_name, throughput in results.items():
+        if throughput is None:
+            print('{:<10} {:>12}'.format(loop_name, 'unavailable'))
+        else:
+            print('{:<10} {:>12.0f}'.format(loop_name, throughput))
+
+    if results['asyncio'] and results['uvloop']:
+        print('uvloop speedup: {:.2f}x'.format(
+            results['uvloop'] / results['asyncio']))
+
+
+if __name__ == '__main__':
+    main()
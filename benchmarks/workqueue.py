@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+Work queue throughput benchmark
+
+Measure the number of jobs enqueued and dequeued (and acknowledged) per
+second for several batch sizes.
+
+Usage:
+
+    $ python benchmarks/workqueue.py --jobs 10000 --batch 1 10 100
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sirbot.core.workqueue import WorkQueue  # noqa: E402
+
+PAYLOAD = {'type': 'event_callback',
+           'event': {'type': 'message', 'channel': 'C000', 'text': 'hello'}}
+
+
+async def enqueue(queue, jobs, batch, loop):
+    start = loop.time()
+    for _ in range(jobs // batch):
+        if batch == 1:
+            await queue.put('bench', PAYLOAD)
+        else:
+            await queue.put_many('bench', [PAYLOAD] * batch)
+    return loop.time() - start
+
+
+async def dequeue(queue, jobs, batch, loop):
+    start = loop.time()
+    done = 0
+    while done < jobs:
+        taken = await queue.get_nowait('bench', batch)
+        if not taken:
+            break
+        await queue.ack(*taken)
+        done += len(taken)
+    return loop.time() - start
+
+
+def bench(jobs, batch):
+    loop = asyncio.new_event_loop()
+    with tempfile.TemporaryDirectory() as directory:
+        queue = WorkQueue(os.path.join(directory, 'bench.db'), loop=loop)
+        put = loop.run_until_complete(enqueue(queue, jobs, batch, loop))
+        get = loop.run_until_complete(dequeue(queue, jobs, batch, loop))
+        loop.run_until_complete(queue.close())
+    loop.close()
+    return jobs / put, jobs / get
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--jobs', type=int, default=10000)
+    parser.add_argument('--batch', type=int, nargs='+', default=[1, 10, 100])
+    args = parser.parse_args()
+
+    print('{:<8} {:>12} {:>12}'.format('batch', 'enqueue/s', 'dequeue/s'))
+    for batch in args.batch:
+        put, get = bench(args.jobs, batch)
+        print('{:<8} {:>12.0f} {:>12.0f}'.format(batch, put, get))
+
+
+if __name__ == '__main__':
+    main()
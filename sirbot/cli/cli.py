@@ -1,10 +1,13 @@
 import argparse
 import asyncio
+import functools
 import logging
 import sys
 
 from . import config, initialize
 from ..core import SirBot
+from ..core.workers import Supervisor
+from ..utils import set_event_loop_policy
 
 
 def parse_args(arguments):
@@ -14,8 +17,21 @@ def parse_args(arguments):
                         help='port')
     parser.add_argument('-c', '--config', action='store',
                         help='config file path')
-    parser.add_argument('-u', '--update', help='Update plugins',
-                        action='store_true', dest='update')
+    parser.add_argument('-w', '--workers', dest='workers', action='store',
+                        type=int,
+                        help='number of worker processes')
+    parser.add_argument('-L', '--loop', dest='loop', action='store',
+                        choices=['asyncio', 'uvloop'],
+                        help='event loop implementation')
+    parser.add_argument('-u', '--update', dest='update', nargs='*',
+                        metavar='PLUGIN',
+                        help='Update plugins, all of them by default')
+    parser.add_argument('--dry-run', action='store_true', dest='dry_run',
+                        help='With --update, only report the pending updates')
+    parser.add_argument('--profile-startup', action='store_true',
+                        dest='profile_startup',
+                        help='Start and stop the plugins and report the '
+                             'startup duration of each of them')
     parser.add_argument('-p', '--plugins', help='Plugins to load',
                         dest='plugins', nargs='+')
 
@@ -47,29 +63,110 @@ def main():  # pragma: no cover
         args.func(args)
     else:
         configuration = config.load_config(args)
-        if args.update:
-            update(configuration)
+        set_event_loop_policy(configuration['sirbot'].get('loop'))
+        if args.update is not None:
+            update(configuration, plugins=args.update, dry_run=args.dry_run)
+        elif args.profile_startup:
+            print(format_timings(profile_startup(configuration)))
         else:
-            start(configuration)
+            start(configuration,
+                  config_loader=functools.partial(config.load_config, args))
+
 
+def start(configuration, loop=None, config_loader=None):  # pragma: no cover
+    workers = int(configuration['sirbot'].get('workers', 1))
+    if workers > 1:
+        target = functools.partial(start_worker, configuration,
+                                   config_loader)
+        Supervisor(target, workers).run()
+        return
 
-def start(configuration, loop=None):  # pragma: no cover
     if not loop:
         loop = asyncio.get_event_loop()
 
-    bot = SirBot(config=configuration, loop=loop)
+    bot = SirBot(config=configuration, loop=loop, config_loader=config_loader)
     bot.run(port=int(configuration['sirbot']['port']))
     return bot
 
 
-def update(configuration, loop=None):
+def start_worker(configuration, config_loader=None):  # pragma: no cover
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    bot = SirBot(config=configuration, loop=loop, config_loader=config_loader)
+    bot.run(port=int(configuration['sirbot']['port']), reuse_port=True)
+    return bot
+
+
+def update(configuration, loop=None, plugins=None, dry_run=False):
     if not loop:
         loop = asyncio.get_event_loop()
 
     bot = SirBot(config=configuration, loop=loop)
-    loop.run_until_complete(bot.update())
+    report = loop.run_until_complete(bot.update(plugins, dry_run=dry_run))
+    if dry_run:
+        print(format_pending(report))
     return bot
 
 
+def format_pending(report):
+    """
+    Format the pending updates of the plugins
+
+    Args:
+        report (dict): :meth:`sirbot.core.SirBot.update` dry run report
+
+    Returns:
+        str: One line per plugin
+    """
+    lines = list()
+    for name, pending in sorted(report.items()):
+        if pending is None:
+            lines.append('{}: unknown'.format(name))
+        elif pending:
+            lines.append('{}: {}'.format(name, ', '.join(map(str, pending))))
+        else:
+            lines.append('{}: up to date'.format(name))
+    return '\n'.join(lines)
+
+
+def profile_startup(configuration, loop=None):
+    if not loop:
+        loop = asyncio.get_event_loop()
+
+    bot = SirBot(config=configuration, loop=loop)
+    return loop.run_until_complete(bot.profile_startup())
+
+
+def format_timings(timings):
+    """
+    Format the startup duration of the plugins as a table
+
+    Args:
+        timings (dict): :meth:`sirbot.core.SirBot.startup_timings`
+
+    Returns:
+        str: The table, slowest plugin first
+    """
+    phases = ('import', 'init', 'configure', 'start')
+    rows = sorted(
+        timings.items(), key=lambda item: -sum(item[1].values())
+    )
+    width = max([len('plugin')] + [len(name) for name in timings])
+    lines = ['{:<{width}} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+        'plugin', *phases, 'total', width=width
+    )]
+    for name, timing in rows:
+        lines.append('{:<{width}} {} {:>10.3f}'.format(
+            name,
+            ' '.join('{:>10}'.format(
+                '{:.3f}'.format(timing[phase]) if phase in timing else '-'
+            ) for phase in phases),
+            sum(timing.values()),
+            width=width
+        ))
+    return '\n'.join(lines)
+
+
 if __name__ == '__main__':
     main()  # pragma: no cover
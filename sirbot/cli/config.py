@@ -1,12 +1,15 @@
 import os
-import yaml
+
+from ..utils.config import env_overlay, load_yaml
 
 
 def load_config(args):
 
     path = args.config or os.getenv('SIRBOT_CONFIG')
     port = args.port or os.getenv('SIRBOT_PORT')
-    config = load_file(path)
+    workers = args.workers or os.getenv('SIRBOT_WORKERS')
+    loop = args.loop or os.getenv('SIRBOT_LOOP')
+    config = env_overlay(load_file(path))
 
     if 'sirbot' not in config:
         config['sirbot'] = dict()
@@ -21,6 +24,12 @@ def load_config(args):
     elif 'port' not in config['sirbot']:
         config['sirbot']['port'] = 8080
 
+    if workers:
+        config['sirbot']['workers'] = int(workers)
+
+    if loop:
+        config['sirbot']['loop'] = loop
+
     return config
 
 
@@ -31,5 +40,4 @@ def load_file(path=None):
     if not os.path.isabs(path):
         path = os.path.join(os.getcwd(), path)
 
-    with open(path) as file:
-        return yaml.load(file)
+    return load_yaml(path)
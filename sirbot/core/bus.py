@@ -0,0 +1,333 @@
+"""
+sirbot event bus
+
+Publish and subscribe to events between plugins
+"""
+
+import asyncio
+import collections
+import fnmatch
+import re
+
+DROP = 'drop'
+BLOCK = 'block'
+
+EXACT = 'exact'
+PREFIX = 'prefix'
+GLOB = 'glob'
+
+CACHE_SIZE = 1024
+
+Message = collections.namedtuple('Message', ['topic', 'event'])
+
+
+def compile_pattern(pattern):
+    """
+    Classify a subscription pattern
+
+    Patterns without wildcard are exact topics. Patterns with a single
+    trailing :code:`*` are prefixes. Other patterns are :mod:`fnmatch`
+    globs.
+
+    Args:
+        pattern (str): Subscription pattern
+
+    Returns:
+        tuple: Kind of the pattern and its compiled form (the topic, the
+        prefix or the regex match function)
+    """
+    if not any(char in pattern for char in '*?['):
+        return EXACT, pattern
+    elif pattern.endswith('*') and \
+            not any(char in pattern[:-1] for char in '*?['):
+        return PREFIX, pattern[:-1]
+    return GLOB, re.compile(fnmatch.translate(pattern)).match
+
+
+class Subscription:
+    """
+    Bounded queue of the messages matching a pattern
+
+    Messages are :class:`Message` named tuples of :code:`topic` and
+    :code:`event`.
+
+    .. code-block:: python
+
+        async for message in subscription:
+            await handle(message.event)
+
+    Args:
+        bus (EventBus): Event bus
+        pattern (str): Subscription pattern
+        size (int): Maximum number of queued messages
+        policy (str): :data:`DROP` or :data:`BLOCK` when the queue is full
+        loop (asyncio.AbstractEventLoop): Event loop
+        dropped (sirbot.core.metrics.Counter): Dropped messages metric
+    """
+    def __init__(self, bus, pattern, size, policy, *, loop, dropped=None):
+        if policy not in (DROP, BLOCK):
+            raise ValueError('Unknown subscription policy: {}'.format(policy))
+
+        self.pattern = pattern
+        self.policy = policy
+        self.dropped = 0
+        self._bus = bus
+        self._queue = asyncio.Queue(size, loop=loop)
+        self._dropped = dropped
+
+    def qsize(self):
+        """
+        Number of queued messages
+        """
+        return self._queue.qsize()
+
+    async def get(self):
+        """
+        Wait for the next message
+
+        Returns:
+            Message: The message
+        """
+        return await self._queue.get()
+
+    async def get_batch(self, size):
+        """
+        Wait for at least one message and return up to :code:`size` queued
+        messages
+
+        Args:
+            size (int): Maximum number of messages
+
+        Returns:
+            list: The messages
+        """
+        batch = [await self._queue.get()]
+        while len(batch) < size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    def close(self):
+        """
+        Stop receiving messages
+        """
+        self._bus.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._queue.get()
+
+    def _put_nowait(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self._dropped:
+                self._dropped.inc()
+            return False
+        return True
+
+    async def _put(self, message):
+        await self._queue.put(message)
+
+
+class EventBus:
+    """
+    In-process publish and subscribe event bus
+
+    Subscriptions are indexed by kind of pattern and the subscribers of each
+    published topic are cached, the dispatch cost doesn't grow with the
+    number of subscriptions.
+
+    Args:
+        config (dict): :code:`bus` configuration. Keys:
+
+            * :code:`size`: Default maximum number of queued messages per
+              subscription
+            * :code:`policy`: Default policy when a subscription queue is
+              full
+
+        loop (asyncio.AbstractEventLoop): Event loop
+        metrics (sirbot.core.metrics.Metrics): Metrics collection
+    """
+    def __init__(self, config=None, *, loop, metrics=None):
+        config = config or {}
+        self._size = config.get('size', 1000)
+        self._policy = config.get('policy', DROP)
+        self._loop = loop
+
+        self._exact = collections.defaultdict(list)
+        self._prefix = collections.defaultdict(list)
+        self._glob = dict()
+        self._cache = dict()
+
+        self._published = self._dropped = None
+        if metrics:
+            self._published = metrics.counter(
+                'sirbot_bus_published_total', 'Events published on the bus'
+            ).labels()
+            self._dropped = metrics.counter(
+                'sirbot_bus_dropped_total',
+                'Events dropped because a subscription queue was full',
+                ('pattern', )
+            )
+
+    def subscribe(self, pattern, *, size=None, policy=None):
+        """
+        Subscribe to the topics matching a pattern
+
+        Args:
+            pattern (str): Exact topic (:code:`slack.message`), prefix
+                (:code:`slack.*`) or glob (:code:`*.message`)
+            size (int): Maximum number of queued messages
+            policy (str): :data:`DROP` new messages or :data:`BLOCK` the
+                publisher when the queue is full
+
+        Returns:
+            Subscription: The subscription
+        """
+        subscription = Subscription(
+            self, pattern,
+            self._size if size is None else size,
+            policy or self._policy,
+            loop=self._loop,
+            dropped=self._dropped.labels(pattern) if self._dropped else None
+        )
+
+        kind, compiled = compile_pattern(pattern)
+        if kind == EXACT:
+            self._exact[compiled].append(subscription)
+        elif kind == PREFIX:
+            self._prefix[compiled].append(subscription)
+        else:
+            self._glob.setdefault(pattern, (compiled, []))[1].append(
+                subscription
+            )
+
+        self._cache.clear()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Remove a subscription
+
+        Args:
+            subscription (Subscription): The subscription
+        """
+        kind, compiled = compile_pattern(subscription.pattern)
+        if kind == EXACT:
+            index, key = self._exact, compiled
+        elif kind == PREFIX:
+            index, key = self._prefix, compiled
+        else:
+            index, key = self._glob, subscription.pattern
+
+        subscriptions = index.get(key)
+        if kind == GLOB and subscriptions:
+            subscriptions = subscriptions[1]
+
+        if subscriptions and subscription in subscriptions:
+            subscriptions.remove(subscription)
+            if not subscriptions:
+                del index[key]
+        self._cache.clear()
+
+    def subscriptions(self, topic):
+        """
+        Subscriptions matching a topic
+
+        Args:
+            topic (str): Topic
+
+        Returns:
+            tuple: The subscriptions
+        """
+        try:
+            return self._cache[topic]
+        except KeyError:
+            pass
+
+        subscriptions = list(self._exact.get(topic, ()))
+        for prefix, prefixed in self._prefix.items():
+            if topic.startswith(prefix):
+                subscriptions.extend(prefixed)
+        for match, globbed in self._glob.values():
+            if match(topic):
+                subscriptions.extend(globbed)
+
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        subscriptions = self._cache[topic] = tuple(subscriptions)
+        return subscriptions
+
+    def publish_nowait(self, topic, event):
+        """
+        Publish an event without waiting
+
+        The event is dropped for subscriptions with a full queue, whatever
+        their policy.
+
+        Args:
+            topic (str): Topic
+            event: Event
+
+        Returns:
+            int: Number of subscriptions the event was delivered to
+        """
+        if self._published:
+            self._published.inc()
+
+        message = Message(topic, event)
+        delivered = 0
+        for subscription in self.subscriptions(topic):
+            delivered += subscription._put_nowait(message)
+        return delivered
+
+    async def publish(self, topic, event):
+        """
+        Publish an event
+
+        Wait for room in the full queues of the :data:`BLOCK` subscriptions.
+
+        Args:
+            topic (str): Topic
+            event: Event
+
+        Returns:
+            int: Number of subscriptions the event was delivered to
+        """
+        if self._published:
+            self._published.inc()
+
+        message = Message(topic, event)
+        delivered = 0
+        for subscription in self.subscriptions(topic):
+            if subscription.policy == BLOCK:
+                await subscription._put(message)
+                delivered += 1
+            else:
+                delivered += subscription._put_nowait(message)
+        return delivered
+
+    def stats(self):
+        """
+        Queued and dropped messages per pattern
+
+        Returns:
+            dict: :code:`{pattern: {'subscriptions': int, 'queued': int,
+            'dropped': int}}`
+        """
+        indexes = list(self._exact.values()) + list(self._prefix.values()) + \
+            [subscriptions for _, subscriptions in self._glob.values()]
+
+        stats = dict()
+        for subscription in (s for index in indexes for s in index):
+            pattern = stats.setdefault(
+                subscription.pattern,
+                {'subscriptions': 0, 'queued': 0, 'dropped': 0}
+            )
+            pattern['subscriptions'] += 1
+            pattern['queued'] += subscription.qsize()
+            pattern['dropped'] += subscription.dropped
+        return stats
@@ -5,25 +5,38 @@ Core API of Sir Bot-a-lot
 """
 
 import asyncio
+import functools
+import hmac
 import importlib
+import json
 import logging
 import logging.config
 import os
+import signal
 import sys
-import aiohttp
+import time
 import pluggy
-import yaml
 
 from collections import defaultdict
 from aiohttp import web
 
-from sirbot.utils import merge_dict
-from sirbot.registry import registry
+from sirbot.utils import accepted_kwargs, cache, ensure_future, log, merge_dict
+from sirbot.utils.config import load_yaml
+from sirbot.registry import registry, TRANSIENT
 
-from . import hookspecs
+from . import (bus, executor, hookspecs, http, metrics, supervisor, trace,
+               watchdog, workers, workqueue)
+from .errors import (CircularDependencyError, DependencyError,
+                     PluginLoadError, StartupBudgetExceeded, UpdateError)
+from .plugin import Plugin
+from .state import create_state, purge_expired
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_CONFIG = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'config.yml'
+)
+
 if sys.version_info[:2] == (3, 5):
     ModuleNotFoundError = ImportError
 
@@ -36,9 +49,18 @@ class SirBot:
     Args:
         config (dict): Configuration of Sir Bot-a-lot
         loop (asyncio.AbstractEventLoop): Event loop
+        config_loader (callable): Return a fresh configuration on
+            :meth:`reload`
     """
-    def __init__(self, config=None, *, loop=None):
+    def __init__(self, config=None, *, loop=None, config_loader=None):
+        init_start = time.perf_counter()
         self.config = config or {}
+        self._tracer = trace.StartupTracer(
+            self.config.get('sirbot', {}).get('startup', {}).get('trace',
+                                                                 False)
+        )
+        self._log_queue = None
+        self._config_loader = config_loader
         self._configure()
         logger.info('Initializing Sir Bot-a-lot')
 
@@ -46,21 +68,69 @@ class SirBot:
         self._tasks = {}
         self._dispatcher = None
         self._pm = None
+        self._modules = list()
         self._plugins = dict()
+        self._timings = defaultdict(dict)
 
-        self._start_priority = defaultdict(list)
+        self._dependencies = dict()
+        self._start_order = list()
+        self._metrics = metrics.Metrics()
+        self._lag_task = None
+        self._purge_task = None
+        self._watchdog = None
+        self._ready = False
+        self._health = dict()
+        self._readiness = None
+        self._inflight = 0
+        self._idle = asyncio.Event(loop=self._loop)
+        self._idle.set()
+        self._reload_lock = asyncio.Lock(loop=self._loop)
         self._import_plugins()
-        self._app = web.Application(loop=self._loop)
+        self._app = web.Application(
+            loop=self._loop, middlewares=self._middlewares()
+        )
         self._app.on_startup.append(self._start)
+        self._app.on_shutdown.append(self._shutdown)
         self._app.on_cleanup.append(self._stop)
+        self._setup_metrics()
 
         self._initialize_plugins()
+        self._setup_health()
+        self._setup_reload()
+        self._resolve_dependencies()
         self._register_factory()
-        headers = {'User-Agent': self.config['sirbot']['user-agent']}
-        self._session = aiohttp.ClientSession(loop=self._loop, headers=headers)
+        self._session = None
+        self._create_sessions()
+        self._executors = executor.Executors(
+            self.config['sirbot']['executor'],
+            loop=self._loop,
+            metrics=self._metrics
+        )
+        self._supervisor = supervisor.TaskSupervisor(
+            self.config['sirbot']['tasks'],
+            loop=self._loop,
+            metrics=self._metrics
+        )
+        self._bus = bus.EventBus(
+            self.config['sirbot']['bus'],
+            loop=self._loop,
+            metrics=self._metrics
+        )
+        self._workqueue = None
+        self._create_workqueue()
+        self._caches = cache.Caches(
+            self.config['sirbot']['cache'],
+            loop=self._loop,
+            metrics=self._metrics
+        )
+        self._state = create_state(
+            self.config['sirbot']['state'], loop=self._loop
+        )
 
+        self._tracer.add_span('SirBot.__init__', init_start)
         logger.info('Sir Bot-a-lot Initialized')
 
+    @trace.traced
     def _configure(self):
         """
         Configure the core of sirbot
@@ -68,175 +138,1266 @@ class SirBot:
         Merge the config with the default core config and configure logging.
         The default logging level is `INFO`
         """
-        path = os.path.join(
-            os.path.dirname(os.path.abspath(__file__)), 'config.yml'
-        )
-
-        with open(path) as file:
-            defaultconfig = yaml.load(file)
-
-        self.config = merge_dict(self.config, defaultconfig)
+        self.config = merge_dict(self.config, load_yaml(DEFAULT_CONFIG))
 
         if 'logging' in self.config:
             logging.config.dictConfig(self.config['logging'])
         else:
             logging.getLogger('sirbot').setLevel('INFO')
 
+        queue_config = self.config['sirbot']['log_queue']
+        if queue_config['enabled']:
+            self._log_queue = log.QueueLogging(
+                size=queue_config['size'],
+                policy=queue_config['policy'],
+                sample=queue_config['sample']
+            )
+            self._log_queue.start()
+
+        if self.config['sirbot']['log_context']['enabled']:
+            log.install_context()
+
     async def _start(self, app: web.Application) -> None:
         """
         Start sirbot
         """
         logger.info('Starting Sir Bot-a-lot ...')
+        if self.config['sirbot']['metrics']['enabled']:
+            self._lag_task = self._loop.create_task(metrics.monitor_loop_lag(
+                self._metrics.gauge('sirbot_loop_lag_seconds',
+                                    'Last measured event loop lag'),
+                self._metrics.histogram('sirbot_loop_lag_distribution_seconds',
+                                        'Event loop lag'),
+                self.config['sirbot']['metrics']['lag_interval'],
+                loop=self._loop
+            ))
+
+        purge_interval = self.config['sirbot']['state'].get('purge_interval')
+        if purge_interval:
+            self._purge_task = self._loop.create_task(purge_expired(
+                self._state, purge_interval, loop=self._loop
+            ))
+
+        if self.config['sirbot']['watchdog']['enabled']:
+            self._start_watchdog()
+
+        if self.config['sirbot']['reload']['signal'] and self._config_loader:
+            try:
+                self._loop.add_signal_handler(signal.SIGHUP,
+                                              self._reload_signal)
+            except (AttributeError, NotImplementedError):  # pragma: no cover
+                logger.warning('Configuration reload on SIGHUP unavailable')
+
         await self._start_plugins()
+        self._finish_startup()
 
+        self._set_ready(True)
         logger.info('Sir Bot-a-lot fully started')
 
+    def _finish_startup(self) -> None:
+        """
+        Report the startup trace and check the plugins startup budgets
+
+        Raises:
+            sirbot.core.errors.StartupBudgetExceeded: A plugin exceeded its
+                budget and :code:`budget_action` is :code:`fail`
+        """
+        config = self.config['sirbot']['startup']
+        self._tracer.finish()
+        if self._tracer.enabled:
+            for item in self._tracer.slowest_imports(config['top_imports']):
+                logger.info('Import of %s took %.3fs (%.3fs cumulative)',
+                            item.module, item.self, item.cumulative)
+            if config['trace_path']:
+                self._tracer.write(config['trace_path'],
+                                   config['trace_format'],
+                                   config['top_imports'])
+
+        exceeded = self.check_startup_budgets()
+        for message in exceeded:
+            logger.warning('Startup budget exceeded: %s', message)
+        if exceeded and config['budget_action'] == 'fail':
+            raise StartupBudgetExceeded('; '.join(exceeded))
+
+    def check_startup_budgets(self) -> list:
+        """
+        Compare the plugins startup duration with their budget
+
+        A budget is a number of seconds for the whole startup of a plugin or
+        a mapping of seconds per phase (:code:`import`, :code:`init`,
+        :code:`configure` and :code:`start`).
+
+        Returns:
+            list: Description of each exceeded budget
+        """
+        exceeded = list()
+        timings = self.startup_timings()
+        budgets = self.config['sirbot']['startup']['budgets']
+        for name, budget in sorted(budgets.items()):
+            timing = timings.get(name, {})
+            if not isinstance(budget, dict):
+                budget = {'total': budget}
+                timing = {'total': sum(timing.values())}
+
+            for phase, seconds in sorted(budget.items()):
+                if timing.get(phase, 0) > seconds:
+                    exceeded.append('{} {} took {:.3f}s, budget {}s'.format(
+                        name, phase, timing[phase], seconds
+                    ))
+        return exceeded
+
+    async def _shutdown(self, app) -> None:
+        """
+        Drain sirbot
+
+        Called once the server stopped accepting connections. Wait for the
+        in-flight requests and then for the supervised tasks, up to the
+        shutdown timeout.
+        """
+        logger.info('Shutting down Sir Bot-a-lot ...')
+        self._set_ready(False)
+        deadline = self._loop.time() + \
+            self.config['sirbot']['shutdown']['timeout']
+
+        start = self._loop.time()
+        if not await self._wait_until(self._idle.wait(), deadline):
+            logger.warning('%s requests still in flight', self._inflight)
+        self._log_phase('requests draining', start)
+
+        start = self._loop.time()
+        if not await self._wait_until(self._supervisor.join(), deadline):
+            logger.warning('Supervised tasks still running: %s',
+                           self._supervisor.stats())
+        self._log_phase('tasks draining', start)
+
+    async def _wait_until(self, coroutine, deadline) -> bool:
+        """
+        Wait for a coroutine until a deadline
+
+        Returns:
+            bool: :code:`False` if the deadline was reached
+        """
+        try:
+            await asyncio.wait_for(
+                coroutine, max(deadline - self._loop.time(), 0),
+                loop=self._loop
+            )
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def _log_phase(self, phase, start) -> None:
+        logger.info('Shutdown phase %s done in %.3fs', phase,
+                    self._loop.time() - start)
+
     async def _stop(self, app) -> None:
         """
         Stop sirbot
+
+        Stop the plugins, cancel the remaining tasks and close the HTTP
+        sessions.
         """
         logger.info('Stopping Sir Bot-a-lot ...')
+        self._set_ready(False)
+        self._tracer.finish()
+        try:
+            self._loop.remove_signal_handler(signal.SIGHUP)
+        except (AttributeError, NotImplementedError):  # pragma: no cover
+            pass
 
+        if self._lag_task:
+            self._lag_task.cancel()
+        if self._purge_task:
+            self._purge_task.cancel()
+        if self._watchdog:
+            self._watchdog.stop()
+
+        start = self._loop.time()
+        await self._stop_plugins()
+        self._log_phase('plugins stop', start)
+
+        start = self._loop.time()
         for task in self._tasks.values():
             task.cancel()
-        await asyncio.gather(*self._tasks.values(), loop=self._loop)
-        await self._session.close()
+        results = await asyncio.gather(*self._tasks.values(), loop=self._loop,
+                                       return_exceptions=True)
+        for name, result in zip(self._tasks, results):
+            if isinstance(result, Exception) and \
+                    not isinstance(result, asyncio.CancelledError):
+                logger.error('Plugin %s start task failed', name,
+                             exc_info=result)
 
+        self._log_phase('tasks cancellation', start)
+
+        await self._close()
         logger.info('Sir Bot-a-lot fully stopped')
+        if self._log_queue:
+            self._log_queue.stop()
+
+    async def _close(self) -> None:
+        """
+        Release the resources of the core
+
+        Shutdown the supervised tasks and the executors, close the work
+        queue, the state and the HTTP sessions. Each stage runs even if a
+        previous one failed.
+        """
+        stages = [
+            ('supervisor shutdown', functools.partial(
+                self._supervisor.shutdown,
+                self.config['sirbot']['tasks']['shutdown_timeout']
+            )),
+            ('executors shutdown', functools.partial(
+                self._executors.shutdown,
+                self.config['sirbot']['executor']['shutdown_timeout']
+            )),
+            ('workqueue close',
+             self._workqueue.close if self._workqueue else None),
+            ('state close', self._state.close),
+            ('sessions close', self._close_sessions),
+        ]
+
+        for phase, stage in stages:
+            if stage is None:
+                continue
+            start = self._loop.time()
+            try:
+                await stage()
+            except Exception:
+                logger.exception('Error during shutdown phase %s', phase)
+            else:
+                self._log_phase(phase, start)
+
+    async def _stop_plugins(self) -> None:
+        """
+        Call :meth:`sirbot.core.plugin.Plugin.stop` of the started plugins in
+        the reverse of the starting order
+        """
+        timeout = self.config['sirbot']['shutdown']['plugin_timeout']
+        for name in reversed(self._start_order):
+            stop = getattr(self._plugins[name]['plugin'], 'stop', None)
+            if name not in self._tasks or stop is None:
+                continue
+
+            logger.debug('Stopping plugin %s', name)
+            try:
+                await asyncio.wait_for(stop(), timeout, loop=self._loop)
+            except asyncio.TimeoutError:
+                logger.warning('Plugin %s not stopped after %ss', name,
+                               timeout)
+            except Exception:
+                logger.exception('Error while stopping plugin %s', name)
+
+    def _middlewares(self) -> list:
+        """
+        aiohttp middlewares of the core
+        """
+        middlewares = [self._inflight_middleware]
+        if self.config['sirbot']['log_context']['enabled']:
+            middlewares.append(log.context_middleware())
+        if self.config['sirbot']['metrics']['enabled']:
+            middlewares.append(metrics.middleware(self._metrics.histogram(
+                'sirbot_http_request_duration_seconds',
+                'Duration of the incoming requests',
+                ('method', 'route')
+            )))
+        return middlewares
+
+    async def _inflight_middleware(self, app, handler):
+        """
+        aiohttp middleware factory counting the in-flight requests
+        """
+        async def inflight_middleware(request):
+            self._inflight += 1
+            self._idle.clear()
+            try:
+                return await handler(request)
+            finally:
+                self._inflight -= 1
+                if not self._inflight:
+                    self._idle.set()
+        return inflight_middleware
+
+    def _setup_metrics(self) -> None:
+        """
+        Register the metrics route and collector
+        """
+        config = self.config['sirbot']['metrics']
+        if config['enabled']:
+            self._app.router.add_get(config['path'], self._metrics_handler)
+            self._metrics.add_collector(self._collect_metrics)
+
+    def _create_workqueue(self) -> None:
+        """
+        Create the durable work queue if enabled
+        """
+        config = dict(self.config['sirbot']['workqueue'])
+        if config.pop('enabled'):
+            self._workqueue = workqueue.WorkQueue(
+                config.pop('path'), loop=self._loop, metrics=self._metrics,
+                **config
+            )
+
+    def _setup_health(self) -> None:
+        """
+        Register the liveness and readiness routes
+        """
+        config = self.config['sirbot']['health']
+        self._update_health()
+        if config['enabled']:
+            self._app.router.add_get(config['liveness_path'],
+                                     self._liveness_handler)
+            self._app.router.add_get(config['readiness_path'],
+                                     self._readiness_handler)
+
+    def _set_ready(self, ready: bool) -> None:
+        self._ready = ready
+        self._update_health()
+
+    def _set_plugin_status(self, name: str, status: str) -> None:
+        self._health[name] = status
+        self._update_health()
+
+    def _plugin_done(self, name: str, task: asyncio.Task) -> None:
+        """
+        Start task done callback updating the plugin status
+
+        A plugin whose :meth:`sirbot.core.plugin.Plugin.start` returned
+        normally keeps its status.
+        """
+        if task.cancelled():
+            self._set_plugin_status(name, 'stopped')
+        elif task.exception() is not None:
+            self._set_plugin_status(name, 'failed')
+
+    def _update_health(self) -> None:
+        """
+        Precompute the readiness response
+
+        Called on every state change so the readiness handler only returns
+        the cached response.
+        """
+        ready = self._ready and all(
+            status == 'started' for status in self._health.values()
+        )
+        body = json.dumps({'ready': ready, 'plugins': self._health},
+                          sort_keys=True).encode()
+        self._readiness = (200 if ready else 503, body)
+
+    async def _liveness_handler(self, request: web.Request) -> web.Response:
+        return web.Response(body=b'{"alive": true}',
+                            content_type='application/json')
+
+    async def _readiness_handler(self, request: web.Request) -> web.Response:
+        status, body = self._readiness
+        return web.Response(body=body, status=status,
+                            content_type='application/json')
+
+    def _setup_reload(self) -> None:
+        """
+        Register the configuration reload route
+        """
+        path = self.config['sirbot']['reload']['path']
+        if path:
+            self._app.router.add_post(path, self._reload_handler)
+
+    async def _reload_handler(self, request: web.Request) -> web.Response:
+        """
+        Reload the configuration and respond with the
+        :meth:`reload` report
+        """
+        token = self.config['sirbot']['reload']['token']
+        if token and not hmac.compare_digest(
+                request.headers.get('Authorization', ''),
+                'Bearer {}'.format(token)):
+            return web.json_response({'error': 'Unauthorized'}, status=401)
+
+        try:
+            report = await self.reload()
+        except Exception as e:
+            logger.exception('Error while reloading the configuration')
+            return web.json_response({'error': str(e)}, status=500)
+        return web.json_response(report)
+
+    def _reload_signal(self) -> None:
+        logger.info('SIGHUP received, reloading the configuration')
+        ensure_future(self.reload(), loop=self._loop, logger=logger)
+
+    def _collect_metrics(self) -> None:
+        """
+        Refresh the metrics computed from the state of sirbot
+        """
+        tasks = self._metrics.gauge(
+            'sirbot_plugin_tasks', 'Plugins start tasks', ('state', )
+        )
+        done = sum(1 for task in self._tasks.values() if task.done())
+        tasks.labels('running').set(len(self._tasks) - done)
+        tasks.labels('done').set(done)
+
+        self._metrics.gauge(
+            'sirbot_loop_tasks', 'Tasks in the event loop'
+        ).set(len(asyncio.Task.all_tasks(loop=self._loop)))
+
+        pool = self._metrics.gauge(
+            'sirbot_http_pool_connections',
+            'Outgoing connections pool utilization',
+            ('session', 'state')
+        )
+        for session, stats in self.http_stats().items():
+            for state in ('in_use', 'idle', 'waiting'):
+                pool.labels(session, state).set(stats[state])
+
+        if self._log_queue:
+            records = self._metrics.gauge(
+                'sirbot_log_records', 'Records in the logging queues',
+                ('state', )
+            )
+            for state, value in self._log_queue.stats().items():
+                records.labels(state).set(value)
+
+        lookups = self._metrics.gauge(
+            'sirbot_registry_lookups',
+            'Registry lookups served from the cache (hit) or calling the '
+            'factory (miss)',
+            ('factory', 'result')
+        )
+        for name, stats in registry.stats().items():
+            lookups.labels(name, 'hit').set(stats['hits'])
+            lookups.labels(name, 'miss').set(stats['misses'])
+
+    async def _metrics_handler(self, request: web.Request) -> web.Response:
+        """
+        Render the metrics in the Prometheus text format
+        """
+        return web.Response(
+            body=self._metrics.render().encode('utf-8'),
+            headers={
+                'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'
+            }
+        )
+
+    def _start_watchdog(self) -> None:
+        """
+        Start the event loop watchdog
 
+        Stalls are blamed on the plugin owning the module of the innermost
+        frame belonging to a plugin.
+        """
+        paths = [
+            path['module'] if isinstance(path, dict) else path
+            for path in self.config['sirbot']['plugins']
+        ]
+        modules = dict()
+        for name, info in self._plugins.items():
+            if info['plugin'] is None:
+                module = info['manifest']['module']
+            else:
+                module = type(info['plugin']).__module__
+            modules[module] = name
+            for path in paths:
+                if module.startswith(path + '.'):
+                    modules[path] = name
+
+        config = self.config['sirbot']['watchdog']
+        self._watchdog = watchdog.Watchdog(
+            self._loop,
+            modules,
+            threshold=config['threshold'],
+            interval=config['interval'],
+            stack_depth=config['stack_depth'],
+            metrics=self._metrics
+        )
+        self._watchdog.start()
+
+    @trace.traced
     def _import_plugins(self) -> None:
         """
         Import and register plugin in the plugin manager.
 
-        The pluggy library is used as plugin manager.
+        The pluggy library is used as plugin manager. Plugins declared with a
+        manifest are imported later (see :meth:`_load_plugin`).
         """
         logger.debug('Importing plugins')
         self._pm = pluggy.PluginManager('sirbot')
         self._pm.add_hookspecs(hookspecs)
+        self._modules = list()
 
         for plugin in self.config['sirbot']['plugins']:
-            try:
-                p = importlib.import_module(plugin)
-            except (ModuleNotFoundError, ):
-                if os.getcwd() not in sys.path:
-                    sys.path.append(os.getcwd())
-                    p = importlib.import_module(plugin)
-                else:
-                    raise
-            self._pm.register(p)
+            if not isinstance(plugin, dict):
+                self._modules.append(self._import_module(plugin))
+
+    def _import_module(self, path: str) -> tuple:
+        """
+        Import a plugin module and register it in the plugin manager
+
+        Args:
+            path (str): Python path of the module
+
+        Returns:
+            tuple: The module and its import duration
+        """
+        start = time.perf_counter()
+        try:
+            module = importlib.import_module(path)
+        except (ModuleNotFoundError, ):
+            if os.getcwd() not in sys.path:
+                sys.path.append(os.getcwd())
+                module = importlib.import_module(path)
+            else:
+                raise
+        duration = time.perf_counter() - start
+
+        if not self._pm.is_registered(module):
+            self._pm.register(module)
+        return module, duration
+
+    def _create_plugin(self, module):
+        """
+        Call the :code:`plugins` hook of a single module
 
+        Returns:
+            tuple: The plugin, or :code:`None`, and its initialization
+            duration
+        """
+        others = [p for p in self._pm.get_plugins() if p is not module]
+        hook = self._pm.subset_hook_caller('plugins', others)
+        start = time.perf_counter()
+        plugins = hook(loop=self._loop)
+        return (plugins[0] if plugins else None,
+                time.perf_counter() - start)
+
+    @trace.traced
     def _initialize_plugins(self):
         """
         Initialize the plugins
 
         Query the configuration and the plugins for info
-        (name, registry name, start priority, etc)
+        (name, registry name, start priority, etc). Plugins declared with a
+        manifest are only registered.
         """
         logger.debug('Initializing plugins')
-        plugins = self._pm.hook.plugins(loop=self._loop)
-        if plugins:
-            for plugin in plugins:
-                name = plugin.__name__
-                registry_name = plugin.__registry__ or plugin.__name__
-                config = self.config.get(name, {})
-
-                priority = config.get('priority', 50)
-
-                if priority:
-                    self._plugins[name] = {
-                        'plugin': plugin,
-                        'config': config,
-                        'priority': priority,
-                        'factory': registry_name
-                    }
-
-                    self._start_priority[priority].append(name)
-        else:
+        for module, import_duration in reversed(self._modules):
+            plugin, init_duration = self._create_plugin(module)
+            if plugin is None:
+                continue
+            if self._add_plugin(plugin.__name__, plugin=plugin,
+                                factory=plugin.__registry__):
+                self._timings[plugin.__name__].update(
+                    {'import': import_duration, 'init': init_duration}
+                )
+
+        for manifest in self.config['sirbot']['plugins']:
+            if isinstance(manifest, dict):
+                self._add_plugin(manifest['name'], manifest=manifest,
+                                 factory=manifest.get('registry'))
+
+        if not self._plugins:
             logger.error('No plugins found')
 
+    def _add_plugin(self, name, *, plugin=None, manifest=None, factory=None):
+        """
+        Register a plugin unless it is disabled by its priority
+
+        Returns:
+            bool: :code:`True` if the plugin was added
+        """
+        config = self.config.get(name, {})
+        priority = config.get('priority', 50)
+        if not priority:
+            return False
+
+        self._plugins[name] = {
+            'plugin': plugin,
+            'manifest': manifest,
+            'config': config,
+            'priority': priority,
+            'factory': factory or name,
+            'configured': False
+        }
+        self._health[name] = 'pending'
+        return True
+
+    def _load_plugin(self, name: str):
+        """
+        Import and initialize a plugin declared with a manifest
+
+        Called on the first use of the plugin in the registry or when it
+        starts.
+
+        Args:
+            name (str): Name of the plugin
+
+        Returns:
+            sirbot.core.plugin.Plugin: The plugin
+        """
+        info = self._plugins[name]
+        if info['plugin'] is not None:
+            return info['plugin']
+
+        logger.debug('Loading plugin %s', name)
+        module, import_duration = self._import_module(
+            info['manifest']['module']
+        )
+        plugin, init_duration = self._create_plugin(module)
+        if plugin is None or plugin.__name__ != name:
+            raise PluginLoadError(
+                'Module "{}" does not provide plugin "{}"'.format(
+                    info['manifest']['module'], name
+                )
+            )
+
+        info['plugin'] = plugin
+        self._timings[name].update(
+            {'import': import_duration, 'init': init_duration}
+        )
+        return plugin
+
+    def _plugin_attribute(self, name, attribute, key, default=None):
+        """
+        Metadata of a plugin, from the plugin once loaded or from its
+        manifest
+        """
+        info = self._plugins[name]
+        if info['plugin'] is not None:
+            return getattr(info['plugin'], attribute, default)
+        return info['manifest'].get(key, default)
+
+    def _resolve_dependencies(self):
+        """
+        Build the plugins dependency graph
+
+        Plugins declaring :attr:`sirbot.core.plugin.Plugin.__requires__`
+        depend on the listed registry names. Other plugins depend on every
+        other plugin not declaring its requirements with a higher priority.
+
+        Raises:
+            sirbot.core.errors.DependencyError: A required plugin is missing
+            sirbot.core.errors.CircularDependencyError: Requirements form a
+                cycle
+        """
+        logger.debug('Resolving plugins dependencies')
+        registry_names = {
+            info['factory']: name for name, info in self._plugins.items()
+        }
+
+        requirements = {
+            name: self._plugin_attribute(name, '__requires__', 'requires')
+            for name in self._plugins
+        }
+
+        for name, info in self._plugins.items():
+            requires = requirements[name]
+            if requires is None:
+                self._dependencies[name] = {
+                    other for other, other_info in self._plugins.items()
+                    if other_info['priority'] > info['priority'] and
+                    requirements[other] is None
+                }
+                continue
+
+            self._dependencies[name] = set()
+            for required in requires:
+                if required not in registry_names:
+                    raise DependencyError(
+                        'Plugin "{}" requires unavailable plugin "{}"'.format(
+                            name, required
+                        )
+                    )
+                self._dependencies[name].add(registry_names[required])
+
+        self._start_order = self._sort_dependencies()
+
+    def _sort_dependencies(self):
+        """
+        Topologically sort the plugins dependency graph
+
+        Returns:
+            list: Plugins names, dependencies first
+        """
+        order = list()
+        visiting = list()
+        visited = set()
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                cycle = visiting[visiting.index(name):] + [name]
+                raise CircularDependencyError(
+                    'Circular plugins dependency: {}'.format(
+                        ' -> '.join(cycle)
+                    )
+                )
+
+            visiting.append(name)
+            for dependency in sorted(self._dependencies[name]):
+                visit(dependency)
+            visiting.pop()
+            visited.add(name)
+            order.append(name)
+
+        names = sorted(
+            self._plugins, key=lambda n: (-self._plugins[n]['priority'], n)
+        )
+        for name in names:
+            visit(name)
+
+        return order
+
+    @trace.traced
     def _register_factory(self):
         """
         Index the available factories
 
-        Query the plugins for an usable factory and register it
+        Query the plugins for an usable factory and register it. Plugins
+        declared with a manifest are loaded on the first call of their
+        factory.
         """
         for name, info in self._plugins.items():
-            if info['priority']:
+            if info['plugin'] is None:
+                if not info['manifest'].get('factory'):
+                    continue
+                factory = functools.partial(self._lazy_factory, name)
+            else:
                 factory = getattr(info['plugin'], 'factory', None)
-                if callable(factory):
-                    registry[info['factory']] = info['plugin'].factory
+
+            if callable(factory):
+                registry.register(
+                    info['factory'],
+                    factory,
+                    scope=self._plugin_attribute(
+                        name, '__factory_scope__', 'scope', TRANSIENT
+                    )
+                )
         registry.freeze()
 
+    def _lazy_factory(self, name: str):
+        """
+        Factory of a plugin declared with a manifest
+        """
+        return self._load_plugin(name).factory()
+
+    def _create_sessions(self):
+        """
+        Create the aiohttp sessions
+
+        One session is shared by all plugins. Plugins with an :code:`http`
+        configuration get an isolated session with their own limits.
+        """
+        headers = {'User-Agent': self.config['sirbot']['user-agent']}
+        shared = self.config['sirbot']['http']
+        duration = limiter_metrics = None
+        if self.config['sirbot']['metrics']['enabled']:
+            limiter_metrics = self._metrics
+            duration = self._metrics.histogram(
+                'sirbot_http_client_request_duration_seconds',
+                'Duration of the outgoing requests',
+                ('method', 'host')
+            )
+
+        limiter = http.create_limiter(
+            shared, loop=self._loop, metrics=limiter_metrics
+        )
+        self._session = http.create_session(
+            shared, loop=self._loop, headers=headers, metrics=duration,
+            limiter=limiter
+        )
+
+        for name, info in self._plugins.items():
+            config = info['config'].get('http')
+            if config:
+                logger.debug('Creating isolated session for %s', name)
+                if 'rate_limits' in config:
+                    plugin_limiter = http.create_limiter(
+                        config, loop=self._loop, metrics=limiter_metrics
+                    )
+                else:
+                    plugin_limiter = limiter
+
+                info['session'] = http.create_session(
+                    http.plugin_config(shared, config),
+                    loop=self._loop,
+                    headers=headers,
+                    metrics=duration,
+                    limiter=plugin_limiter
+                )
+            else:
+                info['session'] = self._session
+
+    async def _close_sessions(self):
+        """
+        Close the shared and isolated aiohttp sessions
+        """
+        for info in self._plugins.values():
+            if info['session'] is not self._session:
+                await info['session'].close()
+        await self._session.close()
+
+    def http_stats(self):
+        """
+        Connection pool utilization of the aiohttp sessions
+
+        Returns:
+            dict: :func:`sirbot.core.http.pool_stats` of the shared
+            session (:code:`shared` key) and of each isolated session (plugin
+            name key)
+        """
+        stats = {'shared': http.pool_stats(self._session)}
+        for name, info in self._plugins.items():
+            if info['session'] is not self._session:
+                stats[name] = http.pool_stats(info['session'])
+        return stats
+
+    @trace.traced_coroutine
     async def _configure_plugins(self) -> None:
         """
         Configure the plugins
 
         Asynchronously configure the plugins. Pass them their configuration,
-        the aiohttp session, the registry and the aiohttp router
+        the aiohttp session, the aiohttp router and the executor. Plugins
+        declared with a manifest are configured when they start, unless
+        their factory is registered: any plugin can then use them before they
+        start.
         """
         logger.debug('Configuring plugins')
         funcs = [
-            info['plugin'].configure(
-                config=info['config'],
-                session=self._session,
-                router=self.app.router
-            )
-            for info in self._plugins.values()
+            self._configure_plugin(name)
+            for name, info in self._plugins.items()
+            if not info['manifest'] or info['manifest'].get('factory')
         ]
 
         if funcs:
             await asyncio.gather(*funcs, loop=self._loop)
         logger.debug('Plugins configured')
 
+    async def _configure_plugin(self, name: str) -> None:
+        """
+        Configure a plugin and record the configuration duration
+
+        Args:
+            name (str): Name of the plugin
+        """
+        info = self._plugins[name]
+        start = self._loop.time()
+        configure = self._load_plugin(name).configure
+        with log.bind(plugin=name), \
+                self._tracer.span('configure', 'plugin', plugin=name):
+            await configure(**accepted_kwargs(
+                configure,
+                config=info['config'],
+                session=info['session'],
+                router=self.app.router,
+                executor=self._executors.for_plugin(
+                    name, info['config'].get('executor', {}).get('quota')
+                ),
+                supervisor=self._supervisor,
+                bus=self._bus,
+                workqueue=self._workqueue,
+                caches=self._caches,
+                state=self._state
+            ))
+        info['configured'] = True
+        duration = self._loop.time() - start
+        self._timings[name]['configure'] = duration
+        self._metrics.gauge(
+            'sirbot_plugin_configure_seconds',
+            'Duration of the plugins configuration',
+            ('plugin', )
+        ).labels(name).set(duration)
+
+    @trace.traced_coroutine
     async def _start_plugins(self) -> None:
         """
-        Start the plugins by priority
+        Start the plugins following their dependencies
 
-        Start the plugins based on the priority and wait for them to be fully
-        started before starting the next one. This ensure plugins can use
-        a previously started one during startup.
+        Each plugin is started as soon as all the plugins it depends on are
+        fully started. This ensure plugins can use a required one during
+        startup while independent plugins start simultaneously.
         """
         logger.debug('Starting plugins')
-        for priority in sorted(self._start_priority, reverse=True):
-            logger.debug(
-                'Starting plugins %s',
-                ', '.join(self._start_priority[priority])
+        starting = dict()
+        for name in self._start_order:
+            starting[name] = asyncio.ensure_future(
+                self._start_plugin(
+                    name, [starting[dep] for dep in self._dependencies[name]]
+                ),
+                loop=self._loop
             )
 
-            for name in self._start_priority[priority]:
-                plugin = self._plugins[name]
-                self._tasks[name] = self._loop.create_task(
-                    plugin['plugin'].start()
-                )
+        try:
+            await asyncio.gather(*starting.values(), loop=self._loop)
+        except BaseException:
+            for future in starting.values():
+                future.cancel()
+            raise
 
-            while not all(self._plugins[name]['plugin'].started
-                          for name in self._tasks):
+    async def _start_plugin(self, name: str, requires: list) -> None:
+        """
+        Start a plugin once its dependencies are started
 
-                for task in self._tasks.values():
-                    if task.done():
-                        task.result()
-                await asyncio.sleep(0.2, loop=self._loop)
+        Args:
+            name (str): Name of the plugin
+            requires (list): Starting futures of the plugin dependencies
+        """
+        if requires:
+            await asyncio.wait(requires, loop=self._loop)
+            for future in requires:
+                future.result()
 
-            else:
-                logger.debug('Plugins %s started',
-                             ', '.join(self._start_priority[priority]))
+        if not self._plugins[name]['configured']:
+            await self._configure_plugin(name)
 
-    async def update(self):
+        logger.debug('Starting plugin %s', name)
+        start = self._loop.time()
+        with self._tracer.span('start', 'plugin', plugin=name):
+            self._tasks[name] = self._loop.create_task(
+                self._plugins[name]['plugin'].start()
+            )
+            log.set_task_context(self._tasks[name], plugin=name)
+            self._set_plugin_status(name, 'starting')
+            self._tasks[name].add_done_callback(
+                functools.partial(self._plugin_done, name)
+            )
+            await self._wait_started(name)
+        if self._health[name] == 'starting':
+            self._set_plugin_status(name, 'started')
+        duration = self._loop.time() - start
+        self._timings[name]['start'] = duration
+        self._metrics.gauge(
+            'sirbot_plugin_start_seconds',
+            'Duration of the plugins startup',
+            ('plugin', )
+        ).labels(name).set(duration)
+        logger.debug('Plugin %s started', name)
+
+    async def _wait_started(self, name: str) -> None:
+        """
+        Wait for a plugin to be fully started
+
+        Await the plugin :meth:`sirbot.core.plugin.Plugin.wait_started`
+        alongside its start task so errors raised during startup are
+        propagated as soon as they happen. Plugins without the method have
+        their :code:`started` property polled.
+
+        Args:
+            name (str): Name of the plugin
+        """
+        task = self._tasks[name]
+        plugin = self._plugins[name]['plugin']
+        wait_started = getattr(plugin, 'wait_started', None)
+        if wait_started is None:
+            wait_started = functools.partial(Plugin.wait_started, plugin)
+        waiter = asyncio.ensure_future(
+            wait_started(loop=self._loop), loop=self._loop
+        )
+
+        try:
+            await asyncio.wait(
+                (task, waiter),
+                return_when=asyncio.FIRST_COMPLETED,
+                loop=self._loop
+            )
+
+            if task.done() and not waiter.done():
+                task.result()
+
+            await waiter
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+
+    async def update(self, plugins=None, *, dry_run=False):
         """
         Update sirbot
 
         Trigger the update method of the plugins. This is needed if the plugins
-        need to perform update migration (i.e database)
+        need to perform update migration (i.e database). Plugins declared
+        with a manifest are only imported if they are updated.
+
+        Plugins are updated concurrently, each one once the plugins it depends
+        on are updated (see :meth:`_resolve_dependencies`), and within the
+        :code:`update.timeout` of the core or the :code:`update_timeout` of
+        the plugin configuration.
+
+        The resources of the core are released once done, as on shutdown.
+
+        Args:
+            plugins (list): Names of the plugins to update. Default to every
+                plugin
+            dry_run (bool): Only report the pending updates of the plugins
+                (see :meth:`sirbot.core.plugin.Plugin.pending_updates`)
+
+        Returns:
+            dict: :code:`{name: {'status': str, 'duration': float}}` with a
+            status among :code:`updated`, :code:`skipped` (no update method),
+            :code:`failed`, :code:`timeout` and :code:`blocked` (a dependency
+            was not updated). In dry run mode :code:`{name: list}` of the
+            pending updates, :code:`None` if unknown
+
+        Raises:
+            ValueError: An unknown plugin is requested
+            sirbot.core.errors.UpdateError: A plugin was not updated
+        """
+        names = plugins or list(self._plugins)
+        unknown = [name for name in names if name not in self._plugins]
+        if unknown:
+            raise ValueError('Unknown plugins: {}'.format(', '.join(unknown)))
+
+        try:
+            if dry_run:
+                return await self._pending_updates(names)
+            return await self._update_plugins(names)
+        finally:
+            self._tracer.finish()
+            await self._close()
+            if self._log_queue:
+                self._log_queue.stop()
+
+    async def _update_plugins(self, names: list) -> dict:
+        """
+        Update plugins following their dependencies
         """
         logger.info('Updating Sir Bot-a-lot')
-        for name, plugin in self._plugins.items():
-            plugin_update = getattr(plugin['plugin'], 'update', None)
-            if callable(plugin_update):
-                logger.info('Updating %s', name)
-                await plugin_update(self.config.get(name, {}), self._plugins)
-                logger.info('%s updated', name)
-        self._session.close()
-        logger.info('Sir Bot-a-lot updated')
+        start = self._loop.time()
+        progress = {'done': 0, 'total': len(names)}
+        updating = dict()
+        for name in self._start_order:
+            if name in names:
+                updating[name] = asyncio.ensure_future(
+                    self._update_plugin(name, [
+                        updating[dep] for dep in self._dependencies[name]
+                        if dep in updating
+                    ], progress),
+                    loop=self._loop
+                )
+
+        try:
+            results = await asyncio.gather(*updating.values(), loop=self._loop)
+        except BaseException:
+            for future in updating.values():
+                future.cancel()
+            raise
+
+        report = dict(zip(updating, results))
+        errors = sorted(name for name, result in report.items()
+                        if result['status'] not in ('updated', 'skipped'))
+        if errors:
+            raise UpdateError('Plugins not updated: {}'.format(
+                ', '.join(errors)), report)
+
+        logger.info('Sir Bot-a-lot updated in %.3fs',
+                    self._loop.time() - start)
+        return report
+
+    async def _update_plugin(self, name: str, requires: list,
+                             progress: dict) -> dict:
+        """
+        Update a plugin once its dependencies are updated
+
+        Args:
+            name (str): Name of the plugin
+            requires (list): Updating futures of the plugin dependencies
+            progress (dict): :code:`done` and :code:`total` number of plugins
+
+        Returns:
+            dict: :code:`status` and :code:`duration` of the update
+        """
+        if requires:
+            await asyncio.wait(requires, loop=self._loop)
+
+        start = self._loop.time()
+        if any(future.result()['status'] not in ('updated', 'skipped')
+               for future in requires):
+            status = 'blocked'
+        else:
+            status = await self._run_update(name)
+
+        duration = self._loop.time() - start
+        progress['done'] += 1
+        logger.info('Plugin %s %s in %.3fs (%s/%s)', name, status, duration,
+                    progress['done'], progress['total'])
+        return {'status': status, 'duration': duration}
+
+    async def _run_update(self, name: str) -> str:
+        """
+        Call the update method of a plugin within its timeout
+
+        Returns:
+            str: Status of the update
+        """
+        try:
+            plugin_update = getattr(self._load_plugin(name), 'update', None)
+            if not callable(plugin_update):
+                return 'skipped'
+
+            logger.info('Updating %s', name)
+            with log.bind(plugin=name):
+                await asyncio.wait_for(
+                    plugin_update(self.config.get(name, {}), self._plugins),
+                    self._update_timeout(name),
+                    loop=self._loop
+                )
+        except asyncio.TimeoutError:
+            logger.error('Plugin %s not updated after %ss', name,
+                         self._update_timeout(name))
+            return 'timeout'
+        except Exception:
+            logger.exception('Error while updating plugin %s', name)
+            return 'failed'
+        return 'updated'
+
+    def _update_timeout(self, name: str) -> float:
+        return self._plugins[name]['config'].get(
+            'update_timeout', self.config['sirbot']['update']['timeout']
+        )
+
+    async def _pending_updates(self, names: list) -> dict:
+        """
+        Query the plugins for their pending updates
+        """
+        results = await asyncio.gather(
+            *(self._pending_update(name) for name in names), loop=self._loop
+        )
+        report = dict(zip(names, results))
+        for name in names:
+            if report[name] is None:
+                logger.info('Plugin %s: pending updates unknown', name)
+            else:
+                logger.info('Plugin %s: %s pending updates', name,
+                            len(report[name]))
+        return report
+
+    async def _pending_update(self, name: str):
+        """
+        Pending updates of a plugin
+
+        Returns:
+            list: The pending updates or :code:`None` if unknown
+        """
+        try:
+            pending = getattr(self._load_plugin(name), 'pending_updates', None)
+            if pending is None:
+                return None
+            return list(await asyncio.wait_for(
+                pending(self.config.get(name, {})),
+                self._update_timeout(name),
+                loop=self._loop
+            ))
+        except NotImplementedError:
+            return None
+        except Exception:
+            logger.exception('Error while querying plugin %s pending '
+                             'updates', name)
+            return None
+
+    async def reload(self, config=None) -> dict:
+        """
+        Reload the configuration without restarting
+
+        :meth:`sirbot.core.plugin.Plugin.reconfigure` is called, following
+        the starting order, on the plugins whose configuration changed.
+        Once done the new configuration replaces the current one. Changes
+        of plugins that can't be reconfigured, and of the core, need a
+        restart: their current sections are kept until then, as are the
+        sections of the plugins that failed to reconfigure.
+
+        Args:
+            config (dict): New configuration. Default to the result of the
+                :code:`config_loader`
+
+        Returns:
+            dict: Plugins names by outcome: :code:`reconfigured`,
+            :code:`restart` (including :code:`sirbot` and :code:`logging`
+            for the core) and :code:`failed`
+        """
+        async with self._reload_lock:
+            if config is None:
+                if self._config_loader is None:
+                    raise ValueError('No configuration loader')
+                config = self._config_loader()
+            config = merge_dict(config, load_yaml(DEFAULT_CONFIG))
+
+            report = {'reconfigured': [], 'restart': [], 'failed': []}
+            for section in ('sirbot', 'logging'):
+                if config.get(section) != self.config.get(section):
+                    report['restart'].append(section)
+
+            for name in self._start_order:
+                info = self._plugins[name]
+                new = config.get(name, {})
+                if new == info['config']:
+                    continue
+
+                outcome = await self._reconfigure_plugin(name, new)
+                report[outcome].append(name)
+
+            for section in report['restart'] + report['failed']:
+                if section in self.config:
+                    config[section] = self.config[section]
+                else:
+                    config.pop(section, None)
+
+            self.config = config
+            logger.info('Configuration reloaded. Reconfigured: %s, restart '
+                        'needed: %s, failed: %s',
+                        *(', '.join(report[key]) or '-' for key in report))
+            return report
+
+    async def _reconfigure_plugin(self, name: str, config: dict) -> str:
+        """
+        Apply the new configuration of a plugin
+
+        Returns:
+            str: Outcome of the :meth:`reload` report
+        """
+        info = self._plugins[name]
+        if not info['configured']:
+            info['config'] = config
+            return 'reconfigured'
+
+        reconfigure = getattr(info['plugin'], 'reconfigure', None)
+        try:
+            if reconfigure is None:
+                raise NotImplementedError()
+            with log.bind(plugin=name):
+                await reconfigure(config)
+        except NotImplementedError:
+            logger.warning('Plugin %s needs a restart to apply its new '
+                           'configuration', name)
+            return 'restart'
+        except Exception:
+            logger.exception('Error while reconfiguring plugin %s', name)
+            return 'failed'
+
+        info['config'] = config
+        return 'reconfigured'
+
+    def startup_timings(self) -> dict:
+        """
+        Startup duration of the plugins
+
+        Returns:
+            dict: :code:`{name: {phase: seconds}}` for the :code:`import`,
+            :code:`init`, :code:`configure` and :code:`start` phases a plugin
+            went through
+        """
+        return {name: dict(self._timings.get(name, {}))
+                for name in self._plugins}
+
+    async def profile_startup(self) -> dict:
+        """
+        Start and stop sirbot without serving requests
+
+        Returns:
+            dict: :meth:`startup_timings`
+        """
+        try:
+            await self._configure_plugins()
+            await self.app.startup()
+        finally:
+            await self.app.shutdown()
+            await self.app.cleanup()
+        return self.startup_timings()
 
     @property
     def app(self) -> web.Application:
@@ -247,7 +1408,8 @@ class SirBot:
         """
         return self._app
 
-    def run(self, host: str = '0.0.0.0', port: int = 8080):
+    def run(self, host: str = '0.0.0.0', port: int = 8080,
+            reuse_port: bool = False):
         """
         Start sirbot
 
@@ -256,6 +1418,16 @@ class SirBot:
         Args:
             host (str): host
             port (int): port
+            reuse_port (bool): Bind the port with :code:`SO_REUSEPORT` so
+                multiple processes can share it
         """
         self._loop.run_until_complete(self._configure_plugins())
-        web.run_app(self._app, host=host, port=port)  # pragma: no cover
+        if reuse_port:  # pragma: no cover
+            address = {'sock': workers.reuse_port_socket(host, port)}
+        else:
+            address = {'host': host, 'port': port}
+        web.run_app(
+            self._app,
+            shutdown_timeout=self.config['sirbot']['shutdown']['timeout'],
+            **address
+        )  # pragma: no cover
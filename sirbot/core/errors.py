@@ -2,3 +2,52 @@ class SirBotError(Exception):
     """
     Top level sirbot error
     """
+
+
+class DependencyError(SirBotError):
+    """
+    A plugin requires an unavailable plugin
+    """
+
+
+class CircularDependencyError(DependencyError):
+    """
+    Plugins requirements form a cycle
+    """
+
+
+class TaskQueueFull(SirBotError):
+    """
+    A supervised task group can't accept more tasks
+    """
+
+
+class RateLimitExceeded(SirBotError):
+    """
+    An outgoing request would wait too long for the rate limit
+    """
+
+
+class PluginLoadError(SirBotError):
+    """
+    A lazily loaded module doesn't provide the declared plugin
+    """
+
+
+class StartupBudgetExceeded(SirBotError):
+    """
+    Plugins took longer to start than their startup budget
+    """
+
+
+class UpdateError(SirBotError):
+    """
+    Plugins failed to update
+
+    Args:
+        message (str): Error message
+        report (dict): :meth:`sirbot.core.SirBot.update` report
+    """
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report
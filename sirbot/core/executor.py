@@ -0,0 +1,220 @@
+"""
+sirbot executor
+
+Run blocking or CPU bound work outside of the event loop
+"""
+
+import asyncio
+import functools
+import logging
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+THREAD = 'thread'
+PROCESS = 'process'
+
+
+class Executors:
+    """
+    Thread and process pools owned by sirbot
+
+    The process pool is only created on first use.
+
+    Args:
+        config (dict): :code:`executor` configuration. Keys:
+
+            * :code:`threads`: Size of the thread pool
+            * :code:`processes`: Size of the process pool. :code:`0`
+              disable the pool
+            * :code:`quota`: Default maximum number of concurrent jobs per
+              plugin. :code:`0` for no limit
+
+        loop (asyncio.AbstractEventLoop): Event loop
+        metrics (sirbot.core.metrics.Metrics): Metrics collection
+    """
+    def __init__(self, config, *, loop, metrics=None):
+        self._config = config
+        self._loop = loop
+        self._pending = set()
+        self._pools = {THREAD: ThreadPoolExecutor(config.get('threads'))}
+        self._closed = False
+
+        self._running = self._waiting = None
+        if metrics:
+            self._running = metrics.gauge(
+                'sirbot_executor_running',
+                'Jobs running in the executors',
+                ('plugin', 'pool')
+            )
+            self._waiting = metrics.gauge(
+                'sirbot_executor_waiting',
+                'Jobs waiting for the plugin quota',
+                ('plugin', 'pool')
+            )
+            self._queued = metrics.gauge(
+                'sirbot_executor_queued',
+                'Jobs queued in the executors',
+                ('pool', )
+            )
+            metrics.add_collector(self._collect)
+
+    def for_plugin(self, name, quota=None):
+        """
+        Executor API for a plugin
+
+        Args:
+            name (str): Name of the plugin
+            quota (int): Maximum number of concurrent jobs. Default to the
+                configured :code:`quota`
+
+        Returns:
+            PluginExecutor: The plugin executor
+        """
+        if quota is None:
+            quota = self._config.get('quota', 0)
+        return PluginExecutor(self, name, quota)
+
+    def _pool(self, kind):
+        if self._closed:
+            raise RuntimeError('Executors are shut down')
+
+        if kind not in self._pools:
+            if not self._config.get('processes'):
+                raise RuntimeError('The process pool is disabled')
+            self._pools[kind] = ProcessPoolExecutor(
+                self._config['processes']
+            )
+        return self._pools[kind]
+
+    async def run(self, kind, func, *args, **kwargs):
+        """
+        Run a function in a pool
+
+        Args:
+            kind (str): :data:`THREAD` or :data:`PROCESS`
+            func (callable): Function to run
+            *args: Function arguments
+            **kwargs: Function keyword arguments
+        """
+        if kwargs:
+            func = functools.partial(func, *args, **kwargs)
+            args = ()
+
+        future = self._loop.run_in_executor(self._pool(kind), func, *args)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        return await future
+
+    async def shutdown(self, timeout=None):
+        """
+        Wait for the running jobs and shut down the pools
+
+        Args:
+            timeout (float): Seconds to wait for the running jobs
+        """
+        self._closed = True
+        if self._pending:
+            logger.debug('Waiting for %s executor jobs', len(self._pending))
+            done, pending = await asyncio.wait(
+                self._pending, timeout=timeout, loop=self._loop
+            )
+            if pending:
+                logger.warning('%s executor jobs still running', len(pending))
+
+        for pool in self._pools.values():
+            pool.shutdown(wait=not self._pending)
+
+    def _collect(self):
+        for kind, pool in self._pools.items():
+            queue = getattr(pool, '_work_queue', None)
+            if queue is None:
+                queue = getattr(pool, '_call_queue', None)
+            if queue is not None:
+                self._queued.labels(kind).set(queue.qsize())
+
+
+class PluginExecutor:
+    """
+    Executor API given to a plugin
+
+    Limit the number of concurrent jobs of the plugin. Jobs over the quota
+    wait without blocking the event loop.
+
+    Args:
+        executors (Executors): Executors owned by sirbot
+        name (str): Name of the plugin
+        quota (int): Maximum number of concurrent jobs. :code:`0` for no
+            limit
+    """
+    def __init__(self, executors, name, quota):
+        self._executors = executors
+        self._semaphore = None
+        if quota:
+            self._semaphore = asyncio.Semaphore(quota, loop=executors._loop)
+
+        self._metrics = dict()
+        for kind in (THREAD, PROCESS):
+            if executors._running:
+                self._metrics[kind] = (
+                    executors._running.labels(name, kind),
+                    executors._waiting.labels(name, kind)
+                )
+
+    async def run_in_thread(self, func, *args, **kwargs):
+        """
+        Run a blocking function in the thread pool
+
+        Args:
+            func (callable): Function to run
+            *args: Function arguments
+            **kwargs: Function keyword arguments
+
+        Returns:
+            The function result
+        """
+        return await self._run(THREAD, func, *args, **kwargs)
+
+    async def run_in_process(self, func, *args, **kwargs):
+        """
+        Run a CPU bound function in the process pool
+
+        The function, its arguments and result must be picklable.
+
+        Args:
+            func (callable): Function to run
+            *args: Function arguments
+            **kwargs: Function keyword arguments
+
+        Returns:
+            The function result
+        """
+        return await self._run(PROCESS, func, *args, **kwargs)
+
+    async def _run(self, kind, func, *args, **kwargs):
+        running, waiting = self._metrics.get(kind, (None, None))
+        if self._semaphore is None:
+            return await self._execute(running, kind, func, *args, **kwargs)
+
+        if waiting:
+            waiting.inc()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            if waiting:
+                waiting.dec()
+
+        try:
+            return await self._execute(running, kind, func, *args, **kwargs)
+        finally:
+            self._semaphore.release()
+
+    async def _execute(self, running, kind, func, *args, **kwargs):
+        if running:
+            running.inc()
+        try:
+            return await self._executors.run(kind, func, *args, **kwargs)
+        finally:
+            if running:
+                running.dec()
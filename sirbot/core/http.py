@@ -0,0 +1,284 @@
+"""
+sirbot http
+
+Outgoing HTTP sessions shared with the plugins
+"""
+
+import asyncio
+import copy
+import email.utils
+import logging
+import time
+
+import aiohttp
+
+from yarl import URL
+
+from sirbot.utils import merge_dict
+
+from .ratelimit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 5 * 60
+
+
+def _freeze(value):
+    if value is None or isinstance(value, str):
+        return value
+    elif hasattr(value, 'items'):
+        value = value.items()
+    return tuple(sorted(((str(k), str(v)) for k, v in value),
+                        key=lambda item: item[0]))
+
+
+def retry_after(headers):
+    """
+    Delay requested by a :code:`Retry-After` header
+
+    Args:
+        headers (dict): Response headers
+
+    Returns:
+        float: Seconds to wait or :code:`None`
+    """
+    value = headers.get('Retry-After')
+    if value is None:
+        return None
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(date.timestamp() - time.time(), 0)
+
+
+class Session(aiohttp.ClientSession):
+    """
+    :class:`aiohttp.ClientSession` coordinating the outgoing requests
+
+    * The requests wait for the :class:`sirbot.core.ratelimit.RateLimiter`
+    * Requests answered with a :code:`429` status are retried after the
+      :code:`Retry-After` delay
+    * Identical in-flight :code:`GET` requests are coalesced into a single
+      request. The body of their response is read before being shared: the
+      callers receive the same :class:`aiohttp.ClientResponse` and must use
+      :meth:`aiohttp.ClientResponse.read` (or :code:`text` / :code:`json`),
+      :code:`response.content` is already consumed.
+    * The duration of the requests is measured until the response headers
+      are received.
+
+    Args:
+        metrics (sirbot.core.metrics.Histogram): Requests duration metric
+            with :code:`method` and :code:`host` labels
+        limiter (sirbot.core.ratelimit.RateLimiter): Rate limits
+        retries (int): Maximum number of retries of a :code:`429` response
+        max_retry_delay (float): Maximum :code:`Retry-After` delay waited
+        coalesce (bool): Coalesce the identical in-flight :code:`GET`
+    """
+    def __init__(self, *args, metrics=None, limiter=None, retries=0,
+                 max_retry_delay=60, coalesce=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._request_metrics = metrics
+        self._request_metrics_children = dict()
+        self._limiter = limiter
+        self._retries = retries
+        self._max_retry_delay = max_retry_delay
+        self._coalesce = coalesce
+        self._inflight = dict()
+        self.coalesced = 0
+        self.retried = 0
+
+    async def _request(self, method, url, **kwargs):
+        if self._coalesce and method == 'GET':
+            key = self._coalesce_key(url, kwargs)
+            if key is not None:
+                return await self._coalesced(key, method, url, kwargs)
+        return await self._send(method, url, **kwargs)
+
+    def _coalesce_key(self, url, kwargs):
+        if set(kwargs) - {'params', 'headers', 'allow_redirects'}:
+            return None
+        return (str(url), _freeze(kwargs.get('params')),
+                _freeze(kwargs.get('headers')),
+                kwargs.get('allow_redirects'))
+
+    async def _coalesced(self, key, method, url, kwargs):
+        try:
+            task = self._inflight[key]
+        except KeyError:
+            task = self._inflight[key] = asyncio.ensure_future(
+                self._send_and_read(method, url, **kwargs), loop=self._loop
+            )
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task, loop=self._loop)
+
+    async def _send_and_read(self, method, url, **kwargs):
+        response = await self._send(method, url, **kwargs)
+        try:
+            await response.read()
+        finally:
+            response.release()
+        return response
+
+    async def _send(self, method, url, **kwargs):
+        retries = self._retries
+        if not isinstance(kwargs.get('data'), (type(None), bytes, str, dict)):
+            retries = 0
+
+        while True:
+            if self._limiter:
+                await self._limiter.acquire(url)
+
+            response = await self._timed(method, url, **kwargs)
+            if response.status != 429 or retries <= 0:
+                return response
+
+            delay = retry_after(response.headers)
+            if delay is None or delay > self._max_retry_delay:
+                return response
+
+            logger.debug('%s %s rate limited, retrying in %.3fs',
+                         method, url, delay)
+            response.release()
+            if self._limiter:
+                self._limiter.pause(url, delay)
+            retries -= 1
+            self.retried += 1
+            await asyncio.sleep(delay, loop=self._loop)
+
+    async def _timed(self, method, url, **kwargs):
+        if self._request_metrics is None:
+            return await super()._request(method, url, **kwargs)
+
+        start = self._loop.time()
+        try:
+            return await super()._request(method, url, **kwargs)
+        finally:
+            self._observe(method, url, self._loop.time() - start)
+
+    def _observe(self, method, url, duration):
+        key = (method, URL(url).host)
+        try:
+            child = self._request_metrics_children[key]
+        except KeyError:
+            child = self._request_metrics_children[key] = \
+                self._request_metrics.labels(*key)
+        child.observe(duration)
+
+
+def create_session(config, *, loop, headers=None, metrics=None,
+                   limiter=None):
+    """
+    Create a :class:`Session` with a tuned connection pool
+
+    Args:
+        config (dict): :code:`http` configuration. Keys:
+
+            * :code:`limit`: Maximum number of connections
+            * :code:`limit_per_host`: Maximum number of connections per
+              host. :code:`0` for no limit
+            * :code:`ttl_dns_cache`: Seconds a resolved address is cached
+            * :code:`keepalive_timeout`: Seconds an idle connection is kept
+            * :code:`timeout.total`: Seconds a request can last
+            * :code:`timeout.connect`: Seconds to acquire a connection
+            * :code:`retry_after.retries`: Maximum number of retries of a
+              :code:`429` response
+            * :code:`retry_after.max_delay`: Maximum :code:`Retry-After`
+              delay waited
+            * :code:`coalesce`: Coalesce the identical in-flight
+              :code:`GET` requests
+
+        loop (asyncio.AbstractEventLoop): Event loop
+        headers (dict): Default headers of the session
+        metrics (sirbot.core.metrics.Histogram): Requests duration metric
+        limiter (sirbot.core.ratelimit.RateLimiter): Rate limits
+
+    Returns:
+        Session: The session
+    """
+    timeout = config.get('timeout') or {}
+    retry = config.get('retry_after') or {}
+    connector = aiohttp.TCPConnector(
+        limit=config.get('limit', 100),
+        limit_per_host=config.get('limit_per_host', 0),
+        ttl_dns_cache=config.get('ttl_dns_cache', 10),
+        keepalive_timeout=config.get('keepalive_timeout', 15),
+        loop=loop
+    )
+    return Session(
+        connector=connector,
+        loop=loop,
+        headers=headers,
+        metrics=metrics,
+        limiter=limiter,
+        retries=retry.get('retries', 0),
+        max_retry_delay=retry.get('max_delay', 60),
+        coalesce=config.get('coalesce', False),
+        read_timeout=timeout.get('total', DEFAULT_TIMEOUT),
+        conn_timeout=timeout.get('connect')
+    )
+
+
+def plugin_config(shared, plugin):
+    """
+    Merge a plugin :code:`http` configuration with the shared one
+
+    Args:
+        shared (dict): Shared :code:`http` configuration
+        plugin (dict): Plugin :code:`http` configuration
+
+    Returns:
+        dict: The plugin configuration completed by the shared one
+    """
+    return merge_dict(copy.deepcopy(plugin), shared)
+
+
+def create_limiter(config, *, loop, metrics=None):
+    """
+    Create the :class:`sirbot.core.ratelimit.RateLimiter` of an :code:`http`
+    configuration
+
+    Args:
+        config (dict): :code:`http` configuration
+        loop (asyncio.AbstractEventLoop): Event loop
+        metrics (sirbot.core.metrics.Metrics): Metrics collection
+
+    Returns:
+        sirbot.core.ratelimit.RateLimiter: The rate limiter or :code:`None`
+        without :code:`rate_limits`
+    """
+    if not config.get('rate_limits'):
+        return None
+    return RateLimiter(config['rate_limits'], loop=loop, metrics=metrics)
+
+
+def pool_stats(session):
+    """
+    Connection pool utilization of a session
+
+    Args:
+        session (aiohttp.ClientSession): Session
+
+    Returns:
+        dict: :code:`limit`, :code:`in_use`, :code:`idle` and
+        :code:`waiting` connections.
+    """
+    connector = session.connector
+    if connector is None or connector.closed:
+        return {'limit': 0, 'in_use': 0, 'idle': 0, 'waiting': 0}
+
+    return {
+        'limit': connector.limit,
+        'in_use': len(connector._acquired),
+        'idle': sum(len(conns) for conns in connector._conns.values()),
+        'waiting': sum(len(waiters) for waiters in
+                       connector._waiters.values()),
+    }
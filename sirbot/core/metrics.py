@@ -0,0 +1,353 @@
+"""
+sirbot metrics
+
+Lightweight metrics exposed in the Prometheus text format
+"""
+
+import asyncio
+import bisect
+import math
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace(
+        '"', r'\"')
+
+
+def _format_labels(names, values, extra=''):
+    labels = ['{}="{}"'.format(name, _escape(value))
+              for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    if not labels:
+        return ''
+    return '{' + ','.join(labels) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    elif value == -math.inf:
+        return '-Inf'
+    return repr(float(value))
+
+
+class _CounterValue:
+    __slots__ = ('value', )
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class _GaugeValue:
+    __slots__ = ('value', )
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class _HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Metric:
+    """
+    Base class of the metrics
+
+    A metric is split in children, one per combination of labels values.
+    Children are created on first use and should be kept by the caller to
+    avoid the label lookup on the hot path.
+
+    Args:
+        name (str): Metric name
+        documentation (str): Metric help message
+        labels (tuple): Labels names
+    """
+    type = 'untyped'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels_names = tuple(labels)
+        self._children = dict()
+
+    def labels(self, *values):
+        """
+        Child of the metric for the labels values
+
+        Args:
+            *values: Labels values, in the order of the labels names
+
+        Returns:
+            The child metric
+        """
+        if len(values) != len(self.labels_names):
+            raise ValueError('Incorrect labels for metric {}: {}'.format(
+                self.name, values))
+
+        try:
+            return self._children[values]
+        except KeyError:
+            child = self._children[values] = self._child()
+            return child
+
+    def clear(self):
+        """
+        Remove all children
+        """
+        self._children.clear()
+
+    def _child(self):
+        raise NotImplementedError()
+
+    def render(self):
+        """
+        Render the metric in the Prometheus text format
+
+        Returns:
+            list: Lines of the metric
+        """
+        lines = [
+            '# HELP {} {}'.format(self.name, self.documentation),
+            '# TYPE {} {}'.format(self.name, self.type)
+        ]
+        for values, child in sorted(self._children.items(),
+                                    key=lambda item: item[0]):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child):
+        return ['{}{} {}'.format(
+            self.name,
+            _format_labels(self.labels_names, values),
+            _format_value(child.value)
+        )]
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing value
+    """
+    type = 'counter'
+
+    def _child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    """
+    Value going up and down
+    """
+    type = 'gauge'
+
+    def _child(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+
+class Histogram(Metric):
+    """
+    Distribution of values in pre-defined buckets
+
+    Args:
+        name (str): Metric name
+        documentation (str): Metric help message
+        labels (tuple): Labels names
+        buckets (tuple): Buckets upper bounds
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf, ), child.counts):
+            cumulative += count
+            lines.append('{}_bucket{} {}'.format(
+                self.name,
+                _format_labels(self.labels_names, values,
+                               'le="{}"'.format(_format_value(bound))),
+                cumulative
+            ))
+
+        labels = _format_labels(self.labels_names, values)
+        lines.append('{}_sum{} {}'.format(
+            self.name, labels, _format_value(child.sum)))
+        lines.append('{}_count{} {}'.format(self.name, labels, cumulative))
+        return lines
+
+
+class Metrics:
+    """
+    Collection of metrics
+
+    Collectors are called before rendering to refresh metrics computed from
+    the state of the bot (e.g. connection pool utilization).
+    """
+    def __init__(self):
+        self._metrics = dict()
+        self._collectors = list()
+
+    def counter(self, name, documentation, labels=()):
+        """
+        Get or create a :class:`Counter`
+        """
+        return self._get_or_create(Counter, name, documentation, labels)
+
+    def gauge(self, name, documentation, labels=()):
+        """
+        Get or create a :class:`Gauge`
+        """
+        return self._get_or_create(Gauge, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(),
+                  buckets=DEFAULT_BUCKETS):
+        """
+        Get or create a :class:`Histogram`
+        """
+        return self._get_or_create(Histogram, name, documentation, labels,
+                                   buckets=buckets)
+
+    def _get_or_create(self, cls, name, documentation, labels, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(
+                name, documentation, labels, **kwargs
+            )
+        elif not isinstance(metric, cls):
+            raise ValueError('Metric {} already exists as {}'.format(
+                name, metric.type))
+        return metric
+
+    def add_collector(self, collector):
+        """
+        Register a collector
+
+        Args:
+            collector (callable): Called without argument before rendering
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text format
+
+        Returns:
+            str: The metrics
+        """
+        for collector in self._collectors:
+            collector()
+
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return '\n'.join(lines) + '\n'
+
+
+def _route_name(route):
+    resource = route.resource
+    if resource is None:
+        return 'unmatched'
+
+    info = resource.get_info()
+    return info.get('formatter') or info.get('path') or \
+        info.get('prefix') or resource.name or 'unknown'
+
+
+def middleware(histogram):
+    """
+    aiohttp middleware factory recording the requests duration
+
+    Args:
+        histogram (Histogram): Requests duration metric with :code:`method`
+            and :code:`route` labels
+
+    Returns:
+        The middleware factory
+    """
+    children = dict()
+
+    async def factory(app, handler):
+        async def metrics_middleware(request):
+            start = app.loop.time()
+            try:
+                return await handler(request)
+            finally:
+                route = request.match_info.route
+                # aiohttp creates a new route for every 404 / 405 response
+                key = route if route.resource is not None else route.method
+                try:
+                    child = children[key]
+                except KeyError:
+                    child = children[key] = histogram.labels(
+                        route.method, _route_name(route)
+                    )
+                child.observe(app.loop.time() - start)
+        return metrics_middleware
+
+    factory.children = children
+    return factory
+
+
+async def monitor_loop_lag(gauge, histogram, interval, *, loop):
+    """
+    Measure the event loop lag
+
+    Sleep for :code:`interval` seconds and measure how late the loop wake up.
+
+    Args:
+        gauge (Gauge): Last measured lag
+        histogram (Histogram): Lag distribution
+        interval (float): Seconds between measures
+        loop (asyncio.AbstractEventLoop): Event loop
+    """
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval, loop=loop)
+        lag = max(0, loop.time() - start - interval)
+        gauge.set(lag)
+        histogram.observe(lag)
@@ -1,3 +1,5 @@
+import asyncio
+
 from abc import ABC
 
 
@@ -20,34 +22,83 @@ class Plugin(ABC):  # pragma: no cover
     __registry__ = ''
     """Name in the registry. Default to the plugin name."""
 
+    __factory_scope__ = 'transient'
+    """
+    Scope of the factory in the registry. One of :code:`transient`,
+    :code:`per-task` or :code:`singleton`.
+    """
+
+    __requires__ = None
+    """
+    Registry names of the plugins needed to start. Default to the plugins
+    with a higher starting priority.
+    """
+
     def __init__(self, loop):
         pass
 
-    async def configure(self, config, router, session):
+    async def configure(self, config, router, session, executor, supervisor,
+                        bus, workqueue, caches, state):
         """
         Method called after the initialization of all plugins
 
+        Only the arguments present in the signature of the method are passed.
+
         Args:
             config (dict): configuration for this plugin
             router (aiohttp.web_urldispatcher.UrlDispatcher): incoming request
                 router
             session (aiohttp.ClientSession): Session
-            registry (sirbot.core.registry.Registry): registry of all available
-                plugins factories
+            executor (sirbot.core.executor.PluginExecutor): thread and process
+                pools for blocking or CPU bound work
+            supervisor (sirbot.core.supervisor.TaskSupervisor): bounded
+                groups for background tasks
+            bus (sirbot.core.bus.EventBus): publish and subscribe to events
+                of other plugins
+            workqueue (sirbot.core.workqueue.WorkQueue): durable queue of
+                jobs. :code:`None` when disabled
+            caches (sirbot.utils.cache.Caches): named in memory caches
+            state (sirbot.core.state.State): key value state, shared by the
+                workers with an on disk backend
         """
         pass
 
+    async def reconfigure(self, config):
+        """
+        Method called by :meth:`sirbot.core.SirBot.reload` when the
+        configuration of the plugin changed
+
+        Apply the new configuration without restarting (e.g. keep the
+        connections and caches). Raise :exc:`NotImplementedError`, the
+        default, if the plugin needs a restart.
+
+        Args:
+            config (dict): new configuration for this plugin
+        """
+        raise NotImplementedError()
+
     async def start(self):
         """
         Method called at the bot startup
 
-        Plugins with a higher priority will be started first
+        Plugins listed in :attr:`__requires__` (or with a higher priority)
+        will be started first
 
         Stored as an asyncio tasks. Is kept running while the bot is alive.
         All incoming data (if any) should be processed here.
         """
         pass
 
+    async def stop(self):
+        """
+        Method called when the bot stops
+
+        Called once the in-flight requests and the supervised tasks are
+        drained, in the reverse of the starting order, before the
+        :meth:`start` task is cancelled and the HTTP sessions are closed.
+        """
+        pass
+
     async def update(self, config, plugins):
         """
         Method called by :meth:`sirbot.core.SirBot.update`
@@ -60,6 +111,22 @@ class Plugin(ABC):  # pragma: no cover
         """
         pass
 
+    async def pending_updates(self, config):
+        """
+        Method called by :meth:`sirbot.core.SirBot.update` in dry run mode
+
+        Raise :exc:`NotImplementedError`, the default, if the pending
+        updates are unknown.
+
+        Args:
+            config (dict): configuration for this plugin
+
+        Returns:
+            list: Description of the updates :meth:`update` would perform.
+            Empty if the plugin is up to date
+        """
+        raise NotImplementedError()
+
     @property
     def started(self):
         """
@@ -70,11 +137,31 @@ class Plugin(ABC):  # pragma: no cover
         """
         return False
 
+    async def wait_started(self, loop):
+        """
+        Wait for the plugin to be fully started
+
+        Awaited by sirbot right after scheduling :meth:`start`. Plugins able
+        to signal readiness (e.g. with an :class:`asyncio.Event` set at the
+        end of the startup) should override it.
+
+        The default implementation polls :attr:`started` with an exponential
+        backoff for plugins only exposing the property.
+
+        Args:
+            loop (asyncio.AbstractEventLoop): Event loop
+        """
+        delay = 0.001
+        while not self.started:
+            await asyncio.sleep(delay, loop=loop)
+            delay = min(delay * 2, 0.2)
+
     def factory(self):
         """
         Plugin factory
 
         Called when requesting this plugin from the registry. Interaction point
-        between the plugins.
+        between the plugins. The result is cached according to
+        :attr:`__factory_scope__`.
         """
         return
@@ -0,0 +1,208 @@
+"""
+sirbot rate limiter
+
+Token bucket rate limits of the outgoing requests
+"""
+
+import asyncio
+import collections
+
+from yarl import URL
+
+from .errors import RateLimitExceeded
+
+
+class TokenBucket:
+    """
+    Token bucket
+
+    Holds up to :code:`burst` tokens refilled at :code:`rate` tokens per
+    second. Tokens are reserved in order, a caller waits for the token it
+    reserved.
+
+    Args:
+        rate (float): Tokens per second
+        burst (int): Maximum number of tokens
+        loop (asyncio.AbstractEventLoop): Event loop
+    """
+    def __init__(self, rate, burst=None, *, loop):
+        self.rate = rate
+        self.burst = burst or max(rate, 1)
+        self._loop = loop
+        self._tokens = self.burst
+        self._updated = loop.time()
+        self._paused_until = 0
+
+    def reserve(self):
+        """
+        Reserve a token
+
+        Returns:
+            float: Seconds to wait before using the token
+        """
+        now = self._loop.time()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+        self._tokens -= 1
+
+        delay = max(self._paused_until - now, 0)
+        if self._tokens < 0:
+            delay = max(delay, -self._tokens / self.rate)
+        return delay
+
+    def cancel(self):
+        """
+        Give back a reserved token
+        """
+        self._tokens += 1
+
+    def pause(self, seconds):
+        """
+        Don't deliver tokens for some time
+
+        Args:
+            seconds (float): Duration of the pause
+        """
+        self._paused_until = max(self._paused_until,
+                                 self._loop.time() + seconds)
+
+
+class RateLimiter:
+    """
+    Rate limits of the outgoing requests
+
+    Each rule applies to the requests to a :code:`host` (any host if
+    missing) whose path starts with :code:`path`. The most specific rule is
+    used.
+
+    Args:
+        rules (list): Rules. Keys:
+
+            * :code:`host`: Host of the requests
+            * :code:`path`: Prefix of the requests path
+            * :code:`rate`: Requests per second
+            * :code:`burst`: Maximum burst of requests. Default to
+              :code:`rate`
+            * :code:`max_wait`: Seconds a request can wait before being
+              rejected. :code:`null` for no limit
+            * :code:`name`: Name of the rule in the metrics
+
+        loop (asyncio.AbstractEventLoop): Event loop
+        metrics (sirbot.core.metrics.Metrics): Metrics collection
+    """
+    def __init__(self, rules, *, loop, metrics=None):
+        self._loop = loop
+        self._rules = collections.defaultdict(list)
+        self._cache = dict()
+
+        wait = rejected = None
+        if metrics:
+            wait = metrics.histogram(
+                'sirbot_http_ratelimit_wait_seconds',
+                'Time spent by the outgoing requests waiting for the rate '
+                'limit',
+                ('rule', )
+            )
+            rejected = metrics.counter(
+                'sirbot_http_ratelimit_rejected_total',
+                'Outgoing requests rejected by the rate limit',
+                ('rule', )
+            )
+
+        for rule in rules or ():
+            host, path = rule.get('host'), rule.get('path', '')
+            name = rule.get('name') or '{}{}'.format(host or '*', path)
+            self._rules[host].append((
+                path,
+                name,
+                TokenBucket(rule['rate'], rule.get('burst'), loop=loop),
+                rule.get('max_wait'),
+                wait.labels(name) if wait else None,
+                rejected.labels(name) if rejected else None
+            ))
+
+        for rules in self._rules.values():
+            rules.sort(key=lambda rule: -len(rule[0]))
+
+    def __bool__(self):
+        return bool(self._rules)
+
+    def rule(self, url):
+        """
+        Rule applying to an url
+
+        Args:
+            url (str or yarl.URL): Url of the request
+
+        Returns:
+            tuple: The rule or :code:`None`
+        """
+        url = URL(url)
+        key = (url.host, url.path)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+
+        found = None
+        for host in (url.host, None):
+            for rule in self._rules.get(host, ()):
+                if url.path.startswith(rule[0]):
+                    found = rule
+                    break
+            if found:
+                break
+
+        if len(self._cache) >= 1024:
+            self._cache.clear()
+        self._cache[key] = found
+        return found
+
+    async def acquire(self, url):
+        """
+        Wait for the rate limit of an url
+
+        Args:
+            url (str or yarl.URL): Url of the request
+
+        Raises:
+            sirbot.core.errors.RateLimitExceeded: The request would wait
+                longer than the rule :code:`max_wait`
+        """
+        rule = self.rule(url)
+        if rule is None:
+            return
+
+        _, name, bucket, max_wait, wait, rejected = rule
+        delay = bucket.reserve()
+        if max_wait is not None and delay > max_wait:
+            bucket.cancel()
+            if rejected:
+                rejected.inc()
+            raise RateLimitExceeded(
+                'Rate limit {} exceeded, request would wait {:.3f}s'.format(
+                    name, delay)
+            )
+
+        if wait:
+            wait.observe(delay)
+        if delay:
+            try:
+                await asyncio.sleep(delay, loop=self._loop)
+            except asyncio.CancelledError:
+                bucket.cancel()
+                raise
+
+    def pause(self, url, seconds):
+        """
+        Pause the rule of an url, following a :code:`Retry-After` header
+
+        Args:
+            url (str or yarl.URL): Url of the request
+            seconds (float): Duration of the pause
+        """
+        rule = self.rule(url)
+        if rule is not None:
+            rule[2].pause(seconds)
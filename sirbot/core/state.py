@@ -0,0 +1,390 @@
+"""
+sirbot state
+
+Key value state shared by the plugins, and by the workers with an on disk
+backend
+"""
+
+import abc
+import asyncio
+import contextlib
+import json
+import logging
+import sqlite3
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+MEMORY = 'memory'
+SQLITE = 'sqlite'
+
+_MISSING = object()
+
+
+def create_state(config, *, loop):
+    """
+    Create the state backend
+
+    Args:
+        config (dict): :code:`state` configuration. Keys:
+
+            * :code:`backend`: :data:`MEMORY` or :data:`SQLITE`
+            * :code:`path`: Path of the :data:`SQLITE` database
+
+        loop (asyncio.AbstractEventLoop): Event loop
+
+    Returns:
+        State: The state backend
+    """
+    backend = config.get('backend', MEMORY)
+    if backend == MEMORY:
+        return MemoryState()
+    elif backend == SQLITE:
+        return SQLiteState(config['path'], loop=loop)
+    raise ValueError('Unknown state backend: {}'.format(backend))
+
+
+async def purge_expired(state, interval, *, loop):
+    """
+    Periodically remove the expired keys
+
+    Expired keys are otherwise only removed when read.
+
+    Args:
+        state (State): State backend
+        interval (float): Seconds between purges
+        loop (asyncio.AbstractEventLoop): Event loop
+    """
+    while True:
+        await asyncio.sleep(interval, loop=loop)
+        try:
+            removed = await state.purge()
+        except Exception:
+            logger.exception('Error while purging the expired state keys')
+        else:
+            logger.debug('Purged %s expired state keys', removed)
+
+
+class State(abc.ABC):
+    """
+    Key value state
+
+    Values must be JSON serializable. Keys with a :code:`ttl` expire after
+    that many seconds.
+    """
+    @abc.abstractmethod
+    async def get(self, key, default=None):
+        """
+        Value of a key
+
+        Args:
+            key (str): Key
+            default: Value returned for a missing key
+        """
+
+    @abc.abstractmethod
+    async def mget(self, keys):
+        """
+        Values of several keys
+
+        Args:
+            keys (list): Keys
+
+        Returns:
+            list: The values, :code:`None` for missing keys
+        """
+
+    @abc.abstractmethod
+    async def set(self, key, value, ttl=None):
+        """
+        Set the value of a key
+
+        Args:
+            key (str): Key
+            value: Value
+            ttl (float): Seconds before the key expires
+        """
+
+    @abc.abstractmethod
+    async def delete(self, key):
+        """
+        Remove a key
+
+        Args:
+            key (str): Key
+        """
+
+    @abc.abstractmethod
+    async def incr(self, key, amount=1, ttl=None):
+        """
+        Atomically increment the integer value of a key
+
+        A missing key is created with the value :code:`amount` and the
+        :code:`ttl`.
+
+        Args:
+            key (str): Key
+            amount (int): Increment
+            ttl (float): Seconds before a created key expires
+
+        Returns:
+            int: The new value
+        """
+
+    @abc.abstractmethod
+    async def cas(self, key, expected, value, ttl=None):
+        """
+        Atomically set the value of a key if it is :code:`expected`
+
+        Args:
+            key (str): Key
+            expected: Expected value. :code:`None` for a missing key
+            value: New value
+            ttl (float): Seconds before the key expires
+
+        Returns:
+            bool: :code:`True` if the value was set
+        """
+
+    @abc.abstractmethod
+    async def expire(self, key, ttl):
+        """
+        Set the expiration of a key
+
+        Args:
+            key (str): Key
+            ttl (float): Seconds before the key expires. :code:`None` to
+                remove the expiration
+
+        Returns:
+            bool: :code:`False` if the key doesn't exist
+        """
+
+    async def purge(self):
+        """
+        Remove the expired keys
+
+        Returns:
+            int: Number of keys removed
+        """
+        return 0
+
+    async def close(self):
+        """
+        Release the resources of the backend
+        """
+
+
+class MemoryState(State):
+    """
+    State stored in the memory of the process
+    """
+    def __init__(self):
+        self._data = dict()
+
+    def _get(self, key):
+        try:
+            value, expires_at = self._data[key]
+        except KeyError:
+            return _MISSING
+
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            return _MISSING
+        return value
+
+    def _set(self, key, value, ttl):
+        self._data[key] = (
+            value, None if ttl is None else time.time() + ttl
+        )
+
+    async def get(self, key, default=None):
+        value = self._get(key)
+        return default if value is _MISSING else value
+
+    async def mget(self, keys):
+        return [await self.get(key) for key in keys]
+
+    async def set(self, key, value, ttl=None):
+        self._set(key, value, ttl)
+
+    async def delete(self, key):
+        self._data.pop(key, None)
+
+    async def incr(self, key, amount=1, ttl=None):
+        value = self._get(key)
+        if value is _MISSING:
+            self._set(key, amount, ttl)
+            return amount
+
+        value += amount
+        self._data[key] = (value, self._data[key][1])
+        return value
+
+    async def cas(self, key, expected, value, ttl=None):
+        current = self._get(key)
+        if current is _MISSING:
+            current = None
+        if current != expected:
+            return False
+        self._set(key, value, ttl)
+        return True
+
+    async def expire(self, key, ttl):
+        value = self._get(key)
+        if value is _MISSING:
+            return False
+        self._set(key, value, ttl)
+        return True
+
+    async def purge(self):
+        now = time.time()
+        expired = [key for key, (_, expires_at) in self._data.items()
+                   if expires_at is not None and expires_at <= now]
+        for key in expired:
+            del self._data[key]
+        return len(expired)
+
+
+class SQLiteState(State):
+    """
+    State stored in a SQLite database
+
+    The database is in WAL mode and can be shared by the workers of a host.
+    Every database access runs in a dedicated thread.
+
+    Args:
+        path (str): Path of the database
+        loop (asyncio.AbstractEventLoop): Event loop
+    """
+    def __init__(self, path, *, loop):
+        self.path = path
+        self._loop = loop
+        self._executor = ThreadPoolExecutor(1)
+        self._db = None
+
+    async def _run(self, func, *args):
+        return await self._loop.run_in_executor(self._executor, func, *args)
+
+    def _connection(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS state ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)'
+            )
+        return self._db
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        db = self._connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        else:
+            db.execute('COMMIT')
+
+    @staticmethod
+    def _expires_at(ttl):
+        return None if ttl is None else time.time() + ttl
+
+    def _select(self, db, keys):
+        rows = db.execute(
+            'SELECT key, value FROM state WHERE key IN ({}) AND '
+            '(expires_at IS NULL OR expires_at > ?)'.format(
+                ','.join('?' * len(keys))),
+            list(keys) + [time.time()]
+        )
+        return {key: json.loads(value) for key, value in rows}
+
+    def _write(self, db, key, value, ttl):
+        db.execute(
+            'INSERT OR REPLACE INTO state (key, value, expires_at) '
+            'VALUES (?, ?, ?)', (key, json.dumps(value), self._expires_at(ttl))
+        )
+
+    async def get(self, key, default=None):
+        values = await self._run(self._mget, [key])
+        return values.get(key, default)
+
+    async def mget(self, keys):
+        values = await self._run(self._mget, keys)
+        return [values.get(key) for key in keys]
+
+    def _mget(self, keys):
+        return self._select(self._connection(), keys) if keys else {}
+
+    async def set(self, key, value, ttl=None):
+        await self._run(self._set, key, value, ttl)
+
+    def _set(self, key, value, ttl):
+        with self._transaction() as db:
+            self._write(db, key, value, ttl)
+
+    async def delete(self, key):
+        await self._run(self._delete, key)
+
+    def _delete(self, key):
+        with self._transaction() as db:
+            db.execute('DELETE FROM state WHERE key = ?', (key, ))
+
+    async def incr(self, key, amount=1, ttl=None):
+        return await self._run(self._incr, key, amount, ttl)
+
+    def _incr(self, key, amount, ttl):
+        with self._transaction() as db:
+            current = self._select(db, [key])
+            if key not in current:
+                self._write(db, key, amount, ttl)
+                return amount
+
+            value = current[key] + amount
+            db.execute('UPDATE state SET value = ? WHERE key = ?',
+                       (json.dumps(value), key))
+            return value
+
+    async def cas(self, key, expected, value, ttl=None):
+        return await self._run(self._cas, key, expected, value, ttl)
+
+    def _cas(self, key, expected, value, ttl):
+        with self._transaction() as db:
+            if self._select(db, [key]).get(key) != expected:
+                return False
+            self._write(db, key, value, ttl)
+            return True
+
+    async def expire(self, key, ttl):
+        return await self._run(self._expire, key, ttl)
+
+    def _expire(self, key, ttl):
+        with self._transaction() as db:
+            return db.execute(
+                'UPDATE state SET expires_at = ? WHERE key = ? AND '
+                '(expires_at IS NULL OR expires_at > ?)',
+                (self._expires_at(ttl), key, time.time())
+            ).rowcount > 0
+
+    async def purge(self):
+        return await self._run(self._purge)
+
+    def _purge(self):
+        with self._transaction() as db:
+            return db.execute(
+                'DELETE FROM state WHERE expires_at <= ?', (time.time(), )
+            ).rowcount
+
+    async def close(self):
+        await self._run(self._close)
+        self._executor.shutdown()
+
+    def _close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,360 @@
+"""
+sirbot task supervisor
+
+Run background tasks in bounded groups
+"""
+
+import asyncio
+import collections
+import functools
+import logging
+
+from .errors import TaskQueueFull
+from ..utils import log
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GROUP = 'default'
+
+
+class TaskGroup:
+    """
+    Group of supervised tasks
+
+    At most :code:`limit` tasks of the group run concurrently. Tasks over the
+    limit wait in a queue of :code:`size` coroutines, they are not scheduled
+    on the event loop until admitted.
+
+    Args:
+        name (str): Name of the group
+        limit (int): Maximum number of running tasks
+        size (int): Maximum number of queued coroutines
+        loop (asyncio.AbstractEventLoop): Event loop
+        metrics (dict): Metrics children of the group
+    """
+    def __init__(self, name, limit, size, *, loop, metrics=None):
+        self.name = name
+        self.limit = limit
+        self.size = size
+        self._loop = loop
+        self._metrics = metrics or dict()
+        self._running = set()
+        self._pending = collections.deque()
+        self._waiters = collections.deque()
+        self._closed = False
+        self._idle = asyncio.Event(loop=loop)
+        self._idle.set()
+
+    @property
+    def running(self):
+        """
+        Number of running tasks
+        """
+        return len(self._running)
+
+    @property
+    def queued(self):
+        """
+        Number of queued coroutines
+        """
+        return len(self._pending)
+
+    def full(self):
+        """
+        The group can't accept more coroutines
+
+        Returns:
+            bool: :code:`True` when the limit and the queue are reached
+        """
+        return len(self._running) >= self.limit and \
+            len(self._pending) >= self.size
+
+    async def spawn(self, coroutine):
+        """
+        Schedule a coroutine, waiting for room in the queue
+
+        Args:
+            coroutine: Coroutine to run
+
+        Returns:
+            asyncio.Future: Result of the coroutine
+        """
+        while self.full() and not self._closed:
+            waiter = self._loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except BaseException:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif not waiter.cancelled():
+                    self._wake()
+                coroutine.close()
+                raise
+        return self.spawn_nowait(coroutine)
+
+    def spawn_nowait(self, coroutine):
+        """
+        Schedule a coroutine
+
+        Args:
+            coroutine: Coroutine to run
+
+        Returns:
+            asyncio.Future: Result of the coroutine
+
+        Raises:
+            sirbot.core.errors.TaskQueueFull: The group is full
+            RuntimeError: The group is shut down
+        """
+        if self._closed:
+            coroutine.close()
+            raise RuntimeError('Task group {} is shut down'.format(self.name))
+        elif self.full():
+            coroutine.close()
+            if 'rejected' in self._metrics:
+                self._metrics['rejected'].inc()
+            raise TaskQueueFull('Task group {} is full'.format(self.name))
+
+        self._idle.clear()
+        future = self._loop.create_future()
+        item = (coroutine, future, self._loop.time(), log.get_context())
+        if len(self._running) < self.limit:
+            self._start(*item)
+        else:
+            self._pending.append(item)
+            self._update()
+        return future
+
+    def _start(self, coroutine, future, queued_at, context):
+        now = self._loop.time()
+        if 'wait' in self._metrics:
+            self._metrics['wait'].observe(now - queued_at)
+
+        task = self._loop.create_task(coroutine)
+        if context:
+            log.set_task_context(task, **context)
+        self._running.add(task)
+        task.add_done_callback(functools.partial(self._done, future, now))
+        future.add_done_callback(functools.partial(self._cancel, task))
+        self._update()
+
+    def _cancel(self, task, future):
+        if future.cancelled():
+            task.cancel()
+
+    def _done(self, future, start, task):
+        self._running.discard(task)
+        if 'duration' in self._metrics:
+            self._metrics['duration'].observe(self._loop.time() - start)
+
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            logger.error('Task of group %s exited with error', self.name,
+                         exc_info=task.exception())
+            if not future.done():
+                future.set_exception(task.exception())
+                # The error is logged, don't warn when the result is unused
+                future.exception()
+        elif not future.done():
+            future.set_result(task.result())
+
+        self._next()
+
+    def _next(self):
+        while self._pending and len(self._running) < self.limit:
+            coroutine, future, queued_at, context = self._pending.popleft()
+            if future.cancelled():
+                coroutine.close()
+            else:
+                self._start(coroutine, future, queued_at, context)
+        if not self._running and not self._pending:
+            self._idle.set()
+        self._update()
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and (self._closed or not self.full()):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                if not self._closed:
+                    break
+
+    def _update(self):
+        if 'running' in self._metrics:
+            self._metrics['running'].set(len(self._running))
+            self._metrics['queued'].set(len(self._pending))
+
+    async def join(self):
+        """
+        Wait until no task is running or queued
+        """
+        await self._idle.wait()
+
+    async def shutdown(self, timeout=None):
+        """
+        Drop the queued coroutines and cancel the running tasks
+
+        Args:
+            timeout (float): Seconds to wait for the tasks to finish
+        """
+        self._closed = True
+        self._wake()
+        while self._pending:
+            coroutine, future, _, _ = self._pending.popleft()
+            coroutine.close()
+            future.cancel()
+
+        running = set(self._running)
+        for task in running:
+            task.cancel()
+        if running:
+            _, pending = await asyncio.wait(running, timeout=timeout,
+                                            loop=self._loop)
+            if pending:
+                logger.warning('%s tasks of group %s still running',
+                               len(pending), self.name)
+        self._update()
+
+
+class TaskSupervisor:
+    """
+    Supervise the background tasks of the plugins
+
+    Tasks are spawned in named groups, each with its own concurrency limit
+    and queue.
+
+    Args:
+        config (dict): :code:`tasks` configuration. Keys:
+
+            * :code:`limit`: Default maximum number of running tasks per group
+            * :code:`queue`: Default maximum number of queued coroutines per
+              group
+            * :code:`groups`: :code:`limit` and :code:`queue` of specific
+              groups
+
+        loop (asyncio.AbstractEventLoop): Event loop
+        metrics (sirbot.core.metrics.Metrics): Metrics collection
+    """
+    def __init__(self, config, *, loop, metrics=None):
+        self._config = config
+        self._loop = loop
+        self._groups = dict()
+        self._metrics = metrics
+
+    def group(self, name=DEFAULT_GROUP):
+        """
+        Get or create a group
+
+        Args:
+            name (str): Name of the group
+
+        Returns:
+            TaskGroup: The group
+        """
+        try:
+            return self._groups[name]
+        except KeyError:
+            pass
+
+        config = self._config.get('groups', {}).get(name, {})
+        group = self._groups[name] = TaskGroup(
+            name,
+            config.get('limit', self._config.get('limit', 100)),
+            config.get('queue', self._config.get('queue', 1000)),
+            loop=self._loop,
+            metrics=self._group_metrics(name)
+        )
+        return group
+
+    def _group_metrics(self, name):
+        if not self._metrics:
+            return None
+
+        return {
+            'running': self._metrics.gauge(
+                'sirbot_tasks_running', 'Supervised tasks running',
+                ('group', )).labels(name),
+            'queued': self._metrics.gauge(
+                'sirbot_tasks_queued', 'Supervised tasks waiting to run',
+                ('group', )).labels(name),
+            'rejected': self._metrics.counter(
+                'sirbot_tasks_rejected_total',
+                'Supervised tasks rejected because the group was full',
+                ('group', )).labels(name),
+            'wait': self._metrics.histogram(
+                'sirbot_tasks_wait_seconds',
+                'Time spent by the supervised tasks in the queue',
+                ('group', )).labels(name),
+            'duration': self._metrics.histogram(
+                'sirbot_tasks_duration_seconds',
+                'Duration of the supervised tasks',
+                ('group', )).labels(name),
+        }
+
+    async def spawn(self, coroutine, group=DEFAULT_GROUP):
+        """
+        Schedule a coroutine, waiting for room in the group queue
+
+        Args:
+            coroutine: Coroutine to run
+            group (str): Name of the group
+
+        Returns:
+            asyncio.Future: Result of the coroutine
+        """
+        return await self.group(group).spawn(coroutine)
+
+    def spawn_nowait(self, coroutine, group=DEFAULT_GROUP):
+        """
+        Schedule a coroutine
+
+        Args:
+            coroutine: Coroutine to run
+            group (str): Name of the group
+
+        Returns:
+            asyncio.Future: Result of the coroutine
+
+        Raises:
+            sirbot.core.errors.TaskQueueFull: The group is full
+        """
+        return self.group(group).spawn_nowait(coroutine)
+
+    def stats(self):
+        """
+        Running and queued tasks per group
+
+        Returns:
+            dict: :code:`{group: {'running': int, 'queued': int}}`
+        """
+        return {
+            name: {'running': group.running, 'queued': group.queued}
+            for name, group in self._groups.items()
+        }
+
+    async def join(self):
+        """
+        Wait until no task is running or queued in any group
+        """
+        while not all(group._idle.is_set() for group in self._groups.values()):
+            await asyncio.gather(
+                *(group.join() for group in self._groups.values()),
+                loop=self._loop
+            )
+
+    async def shutdown(self, timeout=None):
+        """
+        Drop the queued coroutines and cancel the running tasks of every
+        group
+
+        Args:
+            timeout (float): Seconds to wait for the tasks to finish
+        """
+        if self._groups:
+            await asyncio.gather(
+                *(group.shutdown(timeout) for group in self._groups.values()),
+                loop=self._loop
+            )
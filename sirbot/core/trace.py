@@ -0,0 +1,301 @@
+"""
+sirbot startup tracer
+
+Timeline of the startup and duration of the module imports
+"""
+
+import collections
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+JSON = 'json'
+CHROME = 'chrome'
+
+Span = collections.namedtuple(
+    'Span', ['name', 'category', 'start', 'duration', 'args']
+)
+
+ImportTime = collections.namedtuple(
+    'ImportTime', ['module', 'start', 'self', 'cumulative']
+)
+
+
+class ImportTimer:
+    """
+    Measure the duration of the module imports
+
+    Installed at the front of :data:`sys.meta_path`, it wraps the loader of
+    the imported modules. Only the imports of the thread installing the
+    timer are measured. The :code:`self` duration excludes the nested
+    imports.
+    """
+    def __init__(self):
+        self.imports = list()
+        self._stack = list()
+        self._thread = None
+
+    def install(self):
+        self._thread = threading.get_ident()
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        if threading.get_ident() != self._thread:
+            return None
+
+        for finder in sys.meta_path:
+            find_spec = getattr(finder, 'find_spec', None)
+            if finder is self or find_spec is None:
+                continue
+
+            spec = find_spec(fullname, path, target)
+            if spec is not None:
+                if hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+    def measure(self, module, loader):
+        start = time.perf_counter()
+        self._stack.append(0)
+        try:
+            loader.exec_module(module)
+        finally:
+            duration = time.perf_counter() - start
+            nested = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += duration
+            self.imports.append(ImportTime(
+                module.__name__, start, duration - nested, duration
+            ))
+
+    def slowest(self, count=10):
+        """
+        Slowest imports
+
+        Args:
+            count (int): Number of imports
+
+        Returns:
+            list: :class:`ImportTime`, by decreasing :code:`self` duration
+        """
+        return sorted(self.imports, key=lambda i: -i.self)[:count]
+
+
+class _TimedLoader:
+    """
+    Loader measuring the execution of a module
+
+    The original loader is restored on the module once executed.
+    """
+    def __init__(self, loader, timer):
+        self._loader = loader
+        self._timer = timer
+
+    def __getattr__(self, item):
+        return getattr(self._loader, item)
+
+    def create_module(self, spec):
+        create_module = getattr(self._loader, 'create_module', None)
+        return create_module(spec) if create_module else None
+
+    def exec_module(self, module):
+        try:
+            self._timer.measure(module, self._loader)
+        finally:
+            module.__loader__ = self._loader
+            if getattr(module, '__spec__', None) is not None:
+                module.__spec__.loader = self._loader
+
+
+class StartupTracer:
+    """
+    Record the startup timeline
+
+    A disabled tracer records nothing.
+
+    Args:
+        enabled (bool): Record the timeline and the imports
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.spans = list()
+        self.origin = time.perf_counter()
+        self._imports = None
+        if enabled:
+            self._imports = ImportTimer()
+            self._imports.install()
+
+    @contextlib.contextmanager
+    def span(self, name, category='startup', **args):
+        """
+        Record the duration of a block
+
+        Args:
+            name (str): Name of the span
+            category (str): Category of the span
+            **args: Additional information (e.g. :code:`plugin`)
+        """
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, category, **args)
+
+    def add_span(self, name, start, category='startup', **args):
+        """
+        Record a span ending now
+
+        Args:
+            name (str): Name of the span
+            start (float): :func:`time.perf_counter` at the start of the span
+            category (str): Category of the span
+            **args: Additional information
+        """
+        if self.enabled:
+            self.spans.append(Span(
+                name, category, start, time.perf_counter() - start, args
+            ))
+
+    def finish(self):
+        """
+        Stop measuring the imports
+        """
+        if self._imports:
+            self._imports.uninstall()
+
+    def slowest_imports(self, count=10):
+        """
+        Slowest module imports
+
+        Args:
+            count (int): Number of imports
+
+        Returns:
+            list: :class:`ImportTime`
+        """
+        return self._imports.slowest(count) if self._imports else []
+
+    def trace(self, top_imports=10):
+        """
+        The timeline
+
+        Returns:
+            dict: :code:`spans` and the :code:`top_imports` slowest
+            :code:`imports`. Times are in seconds from the tracer creation
+        """
+        return {
+            'spans': [{
+                'name': span.name,
+                'category': span.category,
+                'start': span.start - self.origin,
+                'duration': span.duration,
+                'args': span.args
+            } for span in self.spans],
+            'imports': [{
+                'module': item.module,
+                'self': item.self,
+                'cumulative': item.cumulative
+            } for item in self.slowest_imports(top_imports)]
+        }
+
+    def chrome_trace(self):
+        """
+        The timeline in the Chrome trace event format
+
+        Plugins spans are on their own thread so they don't overlap. Load it
+        in :code:`chrome://tracing` or https://ui.perfetto.dev.
+
+        Returns:
+            dict: The trace
+        """
+        pid = os.getpid()
+        threads = {None: 0}
+        events = list()
+        for span in self.spans:
+            tid = threads.setdefault(span.args.get('plugin'), len(threads))
+            events.append(self._event(
+                span.name, span.category, span.start, span.duration, pid,
+                tid, span.args
+            ))
+
+        if self._imports:
+            for item in self._imports.imports:
+                events.append(self._event(
+                    item.module, 'import', item.start, item.cumulative, pid,
+                    0, {'self': item.self}
+                ))
+
+        for name, tid in threads.items():
+            events.append({
+                'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                'args': {'name': name or 'sirbot'}
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def _event(self, name, category, start, duration, pid, tid, args):
+        return {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': (start - self.origin) * 1e6,
+            'dur': duration * 1e6,
+            'pid': pid,
+            'tid': tid,
+            'args': args
+        }
+
+    def write(self, path, format_=JSON, top_imports=10):
+        """
+        Write the timeline to a file
+
+        Args:
+            path (str): Path of the file
+            format_ (str): :data:`JSON` or :data:`CHROME`
+            top_imports (int): Number of imports of the :data:`JSON` format
+        """
+        if format_ == CHROME:
+            data = self.chrome_trace()
+        elif format_ == JSON:
+            data = self.trace(top_imports)
+        else:
+            raise ValueError('Unknown trace format: {}'.format(format_))
+
+        with open(path, 'w') as file:
+            json.dump(data, file)
+
+
+def traced(func):
+    """
+    Record a span for each call of a method of an object with a
+    :code:`_tracer` attribute
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self._tracer.span(func.__name__):
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
+def traced_coroutine(func):
+    """
+    :func:`traced` for coroutine functions
+    """
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        with self._tracer.span(func.__name__):
+            return await func(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,172 @@
+"""
+sirbot watchdog
+
+Detect callbacks blocking the event loop
+"""
+
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from sirbot.utils import current_task
+
+logger = logging.getLogger(__name__)
+
+
+class Watchdog:
+    """
+    Event loop watchdog
+
+    A heartbeat is scheduled in the event loop every :code:`interval`
+    seconds. A watcher thread checks the heartbeat and, when the loop is
+    blocked for more than :code:`threshold` seconds, sample the stack of the
+    loop thread to blame the plugin and coroutine responsible.
+
+    It doesn't rely on the asyncio debug mode.
+
+    Args:
+        loop (asyncio.AbstractEventLoop): Event loop
+        modules (dict): Plugin name for module names. A frame belonging to
+            a module or one of its submodules is blamed on the plugin.
+        threshold (float): Seconds before a callback is considered blocking
+        interval (float): Seconds between heartbeats
+        stack_depth (int): Number of frames logged
+        metrics (sirbot.core.metrics.Metrics): Metrics collection
+    """
+    def __init__(self, loop, modules, *, threshold=0.1, interval=0.05,
+                 stack_depth=10, metrics=None):
+        self._loop = loop
+        self._modules = sorted(modules.items(), key=lambda m: -len(m[0]))
+        self._threshold = threshold
+        self._interval = interval
+        self._stack_depth = stack_depth
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._loop_thread = None
+        self._handle = None
+        self._beat = 0
+        self._last_beat = time.monotonic()
+        self._stall = None
+        self._stats = dict()
+
+        self._stalls = self._seconds = None
+        if metrics:
+            self._stalls = metrics.counter(
+                'sirbot_watchdog_stalls_total',
+                'Event loop stalls detected by the watchdog',
+                ('plugin', )
+            )
+            self._seconds = metrics.counter(
+                'sirbot_watchdog_stall_seconds_total',
+                'Duration of the event loop stalls',
+                ('plugin', )
+            )
+
+    def start(self):
+        """
+        Start the watchdog. Must be called from the event loop thread.
+        """
+        self._loop_thread = threading.get_ident()
+        self._stopped.clear()
+        self._heartbeat()
+        self._thread = threading.Thread(
+            target=self._watch, name='sirbot-watchdog', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the watchdog
+        """
+        self._stopped.set()
+        if self._handle:
+            self._handle.cancel()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        """
+        Event loop stalls per plugin
+
+        Returns:
+            dict: :code:`{plugin: {'stalls': int, 'seconds': float}}`
+        """
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def _heartbeat(self):
+        now = time.monotonic()
+        with self._lock:
+            lag = now - self._last_beat - self._interval
+            stall, self._stall = self._stall, None
+            self._beat += 1
+            self._last_beat = now
+
+        if stall and lag > self._threshold:
+            self._record(stall, lag)
+
+        self._handle = self._loop.call_later(self._interval, self._heartbeat)
+
+    def _watch(self):
+        while not self._stopped.wait(self._interval):
+            with self._lock:
+                blocked = time.monotonic() - self._last_beat - self._interval
+                beat, reported = self._beat, self._stall
+
+            if blocked > self._threshold and reported is None:
+                self._report(beat, blocked)
+
+    def _report(self, beat, blocked):
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+
+        plugin = self._blame(frame)
+        coroutine = self._coroutine()
+        stack = ''.join(traceback.format_stack(frame, limit=self._stack_depth))
+
+        with self._lock:
+            if beat != self._beat:
+                return
+            self._stall = plugin
+            stats = self._stats.setdefault(plugin, {'stalls': 0, 'seconds': 0})
+            stats['stalls'] += 1
+
+        if self._stalls:
+            self._stalls.labels(plugin).inc()
+
+        logger.warning(
+            'Event loop blocked for more than %.3fs by plugin %s in %s\n%s',
+            blocked, plugin, coroutine, stack
+        )
+
+    def _record(self, plugin, lag):
+        with self._lock:
+            self._stats[plugin]['seconds'] += lag
+
+        if self._seconds:
+            self._seconds.labels(plugin).inc(lag)
+
+        logger.warning('Event loop was blocked for %.3fs by plugin %s',
+                       lag, plugin)
+
+    def _blame(self, frame):
+        while frame is not None:
+            module = frame.f_globals.get('__name__', '')
+            for prefix, plugin in self._modules:
+                if module == prefix or module.startswith(prefix + '.'):
+                    return plugin
+            frame = frame.f_back
+        return 'unknown'
+
+    def _coroutine(self):
+        task = current_task(self._loop)
+        coro = getattr(task, '_coro', None)
+        if coro is None:
+            return 'callback'
+        return getattr(coro, '__qualname__', repr(coro))
@@ -0,0 +1,161 @@
+"""
+sirbot workers
+
+Run Sir Bot-a-lot in multiple processes sharing the same port
+"""
+
+import logging
+import os
+import signal
+import socket
+import time
+
+logger = logging.getLogger(__name__)
+
+SIGNALS = (signal.SIGINT, signal.SIGTERM, signal.SIGHUP)
+
+
+def reuse_port_socket(host: str, port: int) -> socket.socket:
+    """
+    Create a listening socket bound with :code:`SO_REUSEPORT`
+
+    Multiple processes can bind the same host and port. The kernel balance
+    the incoming connections between them.
+
+    Args:
+        host (str): host
+        port (int): port
+
+    Returns:
+        socket.socket: The bound socket
+    """
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    return sock
+
+
+class Supervisor:
+    """
+    Fork and supervise worker processes
+
+    Workers exiting unexpectedly are restarted. A worker crashing shortly
+    after being started is restarted with an increasing delay.
+
+    :code:`SIGINT` and :code:`SIGTERM` received by the supervisor are
+    forwarded to the workers for a graceful shutdown. :code:`SIGHUP` is
+    forwarded as is and ignored by the workers until the bot installs its
+    reload handler.
+
+    Each worker runs in its own process group so signals sent to the
+    group of the supervisor (e.g. :code:`Ctrl+C` in a terminal) are only
+    delivered once, by the supervisor.
+
+    Args:
+        target (callable): Function run in each worker process
+        workers (int): Number of workers
+        restart_delay (float): Initial delay before restarting a worker
+        max_restart_delay (float): Maximum delay before restarting a worker
+    """
+    def __init__(self, target, workers: int, *, restart_delay: float = 1,
+                 max_restart_delay: float = 30):
+        self._target = target
+        self._size = workers
+        self._restart_delay = restart_delay
+        self._max_restart_delay = max_restart_delay
+        self._delay = restart_delay
+        self._workers = dict()
+        self._stopping = False
+
+    def run(self) -> None:
+        """
+        Start the workers and supervise them until they are all stopped
+        """
+        handlers = {
+            signum: signal.signal(signum, self._forward_signal)
+            for signum in SIGNALS
+        }
+
+        logger.info('Starting %s workers', self._size)
+        try:
+            for _ in range(self._size):
+                if not self._stopping:
+                    self._spawn()
+            self._supervise()
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+        logger.info('All workers stopped')
+
+    def _supervise(self) -> None:
+        while self._workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+
+            started = self._workers.pop(pid, None)
+            if started is None:
+                continue
+
+            if self._stopping:
+                logger.info('Worker %s stopped', pid)
+            else:
+                self._restart(pid, status, started)
+
+    def _restart(self, pid: int, status: int, started: float) -> None:
+        if time.monotonic() - started < self._max_restart_delay:
+            delay, self._delay = self._delay, min(
+                self._delay * 2, self._max_restart_delay
+            )
+        else:
+            delay = self._delay = self._restart_delay
+
+        logger.warning('Worker %s exited with status %s, restarting in %ss',
+                       pid, status, delay)
+        time.sleep(delay)
+        if not self._stopping:
+            self._spawn()
+
+    def _spawn(self) -> None:
+        # Signals are blocked until the worker is registered so none can be
+        # forwarded before the supervisor knows about it.
+        signal.pthread_sigmask(signal.SIG_BLOCK, SIGNALS)
+        try:
+            pid = os.fork()
+            if pid == 0:  # pragma: no cover
+                self._run_worker()
+            self._workers[pid] = time.monotonic()
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, SIGNALS)
+
+        logger.debug('Worker %s started', pid)
+
+    def _run_worker(self) -> None:  # pragma: no cover
+        os.setpgid(0, 0)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, SIGNALS)
+
+        code = 0
+        try:
+            self._target()
+        except BaseException:
+            logger.exception('Worker %s crashed', os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _forward_signal(self, signum, frame) -> None:
+        if signum in (signal.SIGINT, signal.SIGTERM):
+            self._stopping = True
+
+        for pid in self._workers:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
@@ -0,0 +1,351 @@
+"""
+sirbot work queue
+
+Durable queue of jobs backed by SQLite
+"""
+
+import asyncio
+import collections
+import contextlib
+import json
+import logging
+import sqlite3
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+Job = collections.namedtuple('Job', ['id', 'queue', 'payload', 'attempts'])
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        queue TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        available_at REAL NOT NULL
+    )''',
+    '''CREATE INDEX IF NOT EXISTS jobs_available
+        ON jobs (queue, available_at)''',
+    '''CREATE TABLE IF NOT EXISTS dead_letters (
+        id INTEGER PRIMARY KEY,
+        queue TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        attempts INTEGER NOT NULL,
+        error TEXT,
+        failed_at REAL NOT NULL
+    )''',
+)
+
+
+class WorkQueue:
+    """
+    Durable work queue
+
+    Jobs are stored in a SQLite database in WAL mode. Every database access
+    runs in a dedicated thread so the event loop is never blocked.
+
+    A job taken from the queue is leased for :code:`lease` seconds. It must
+    be acknowledged with :meth:`ack` once processed, or given back with
+    :meth:`nack` to be retried with an exponential backoff. A job not
+    acknowledged before the end of its lease (e.g. the bot crashed) is
+    available again. After :code:`max_attempts` attempts a job is moved to
+    the dead letters.
+
+    Args:
+        path (str): Path of the database
+        loop (asyncio.AbstractEventLoop): Event loop
+        max_attempts (int): Attempts before a job is moved to the dead
+            letters
+        backoff (float): Seconds before the first retry. Doubled on each
+            attempt
+        max_backoff (float): Maximum seconds between retries
+        lease (float): Seconds a job is reserved for the consumer
+        poll_interval (float): Seconds between checks for delayed jobs
+        metrics (sirbot.core.metrics.Metrics): Metrics collection
+    """
+    def __init__(self, path, *, loop, max_attempts=5, backoff=1,
+                 max_backoff=300, lease=60, poll_interval=1, metrics=None):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._loop = loop
+        self._executor = ThreadPoolExecutor(1)
+        self._db = None
+        self._events = collections.defaultdict(
+            lambda: asyncio.Event(loop=self._loop)
+        )
+
+        self._jobs = None
+        if metrics:
+            self._jobs = metrics.counter(
+                'sirbot_workqueue_jobs_total',
+                'Jobs of the work queue by outcome',
+                ('queue', 'outcome')
+            )
+
+    async def _run(self, func, *args):
+        return await self._loop.run_in_executor(self._executor, func, *args)
+
+    def _connection(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                self._db.execute(statement)
+        return self._db
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        db = self._connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        else:
+            db.execute('COMMIT')
+
+    def _count(self, queue, outcome, amount=1):
+        if self._jobs:
+            self._jobs.labels(queue, outcome).inc(amount)
+
+    async def put(self, queue, payload, *, delay=0):
+        """
+        Add a job
+
+        Args:
+            queue (str): Name of the queue
+            payload: JSON serializable payload
+            delay (float): Seconds before the job is available
+
+        Returns:
+            int: Id of the job
+        """
+        ids = await self.put_many(queue, [payload], delay=delay)
+        return ids[0]
+
+    async def put_many(self, queue, payloads, *, delay=0):
+        """
+        Add jobs in a single transaction
+
+        Args:
+            queue (str): Name of the queue
+            payloads (list): JSON serializable payloads
+            delay (float): Seconds before the jobs are available
+
+        Returns:
+            list: Ids of the jobs
+        """
+        rows = [json.dumps(payload) for payload in payloads]
+        ids = await self._run(self._put, queue, rows, delay)
+        self._count(queue, 'enqueued', len(ids))
+        self._events[queue].set()
+        return ids
+
+    def _put(self, queue, rows, delay):
+        available_at = time.time() + delay
+        ids = list()
+        with self._transaction() as db:
+            for payload in rows:
+                ids.append(db.execute(
+                    'INSERT INTO jobs (queue, payload, available_at) '
+                    'VALUES (?, ?, ?)',
+                    (queue, payload, available_at)
+                ).lastrowid)
+        return ids
+
+    async def get_nowait(self, queue, size=1):
+        """
+        Take the available jobs without waiting
+
+        Args:
+            queue (str): Name of the queue
+            size (int): Maximum number of jobs
+
+        Returns:
+            list: The jobs, possibly empty
+        """
+        return await self._run(self._get, queue, size)
+
+    async def get(self, queue, size=1):
+        """
+        Wait for available jobs
+
+        Args:
+            queue (str): Name of the queue
+            size (int): Maximum number of jobs
+
+        Returns:
+            list: The jobs
+        """
+        event = self._events[queue]
+        while True:
+            event.clear()
+            jobs = await self._run(self._get, queue, size)
+            if jobs:
+                return jobs
+
+            try:
+                await asyncio.wait_for(event.wait(), self.poll_interval,
+                                       loop=self._loop)
+            except asyncio.TimeoutError:
+                pass
+
+    def _get(self, queue, size):
+        now = time.time()
+        with self._transaction() as db:
+            rows = db.execute(
+                'SELECT id, payload, attempts FROM jobs '
+                'WHERE queue = ? AND available_at <= ? '
+                'ORDER BY available_at, id LIMIT ?',
+                (queue, now, size)
+            ).fetchall()
+            db.executemany(
+                'UPDATE jobs SET attempts = attempts + 1, available_at = ? '
+                'WHERE id = ?',
+                [(now + self.lease, row[0]) for row in rows]
+            )
+        return [Job(id_, queue, json.loads(payload), attempts + 1)
+                for id_, payload, attempts in rows]
+
+    async def ack(self, *jobs):
+        """
+        Acknowledge processed jobs and remove them from the queue
+
+        Args:
+            *jobs (Job): The jobs
+        """
+        await self._run(self._ack, [job.id for job in jobs])
+        for job in jobs:
+            self._count(job.queue, 'acked')
+
+    def _ack(self, ids):
+        with self._transaction() as db:
+            db.executemany('DELETE FROM jobs WHERE id = ?',
+                           [(id_, ) for id_ in ids])
+
+    async def nack(self, job, error=None):
+        """
+        Give back a job that failed
+
+        The job is retried after a backoff or, after :code:`max_attempts`
+        attempts, moved to the dead letters.
+
+        Args:
+            job (Job): The job
+            error (str): Description of the failure
+
+        Returns:
+            bool: :code:`True` if the job was moved to the dead letters
+        """
+        dead = job.attempts >= self.max_attempts
+        if dead:
+            await self._run(self._bury, job, error)
+            self._count(job.queue, 'dead')
+            logger.warning('Job %s of queue %s moved to the dead letters '
+                           'after %s attempts: %s', job.id, job.queue,
+                           job.attempts, error)
+        else:
+            delay = min(self.backoff * 2 ** (job.attempts - 1),
+                        self.max_backoff)
+            await self._run(self._retry, job.id, delay)
+            self._count(job.queue, 'retried')
+        return dead
+
+    def _retry(self, id_, delay):
+        with self._transaction() as db:
+            db.execute('UPDATE jobs SET available_at = ? WHERE id = ?',
+                       (time.time() + delay, id_))
+
+    def _bury(self, job, error):
+        with self._transaction() as db:
+            db.execute(
+                'INSERT INTO dead_letters (id, queue, payload, attempts, '
+                'error, failed_at) SELECT id, queue, payload, ?, ?, ? '
+                'FROM jobs WHERE id = ?',
+                (job.attempts, error, time.time(), job.id)
+            )
+            db.execute('DELETE FROM jobs WHERE id = ?', (job.id, ))
+
+    async def dead_letters(self, queue, limit=100):
+        """
+        Jobs moved to the dead letters
+
+        Args:
+            queue (str): Name of the queue
+            limit (int): Maximum number of jobs
+
+        Returns:
+            list: The jobs and their errors as :code:`(Job, error)` tuples
+        """
+        rows = await self._run(self._dead_letters, queue, limit)
+        return [(Job(id_, queue, json.loads(payload), attempts), error)
+                for id_, payload, attempts, error in rows]
+
+    def _dead_letters(self, queue, limit):
+        return self._connection().execute(
+            'SELECT id, payload, attempts, error FROM dead_letters '
+            'WHERE queue = ? ORDER BY failed_at LIMIT ?', (queue, limit)
+        ).fetchall()
+
+    async def retry_dead_letters(self, queue):
+        """
+        Move the dead letters of a queue back to the queue
+
+        Args:
+            queue (str): Name of the queue
+
+        Returns:
+            int: Number of jobs moved
+        """
+        count = await self._run(self._retry_dead_letters, queue)
+        self._events[queue].set()
+        return count
+
+    def _retry_dead_letters(self, queue):
+        with self._transaction() as db:
+            db.execute(
+                'INSERT INTO jobs (id, queue, payload, attempts, '
+                'available_at) SELECT id, queue, payload, 0, ? '
+                'FROM dead_letters WHERE queue = ?', (time.time(), queue)
+            )
+            return db.execute('DELETE FROM dead_letters WHERE queue = ?',
+                              (queue, )).rowcount
+
+    async def stats(self):
+        """
+        Jobs per queue
+
+        Returns:
+            dict: :code:`{queue: {'jobs': int, 'dead': int}}`
+        """
+        return await self._run(self._stats)
+
+    def _stats(self):
+        db = self._connection()
+        stats = collections.defaultdict(lambda: {'jobs': 0, 'dead': 0})
+        for table, key in (('jobs', 'jobs'), ('dead_letters', 'dead')):
+            for queue, count in db.execute(
+                    'SELECT queue, COUNT(*) FROM {} GROUP BY queue'.format(
+                        table)):
+                stats[queue][key] = count
+        return dict(stats)
+
+    async def close(self):
+        """
+        Close the database
+        """
+        await self._run(self._close)
+        self._executor.shutdown()
+
+    def _close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -1,5 +1,23 @@
-from collections import MutableMapping
+import keyword
+import logging
+import weakref
+
+from collections import MutableMapping, Counter
 from sirbot.core.errors import SirBotError
+from sirbot.utils import current_task
+
+logger = logging.getLogger(__name__)
+
+SINGLETON = 'singleton'
+"""Factory called once, the result is shared by every lookup"""
+
+PER_TASK = 'per-task'
+"""Factory called once per asyncio task"""
+
+TRANSIENT = 'transient'
+"""Factory called on every lookup"""
+
+SCOPES = (SINGLETON, PER_TASK, TRANSIENT)
 
 
 class RegistryError(SirBotError):
@@ -14,20 +32,76 @@ class FrozenRegistryError(RegistryError):
     """
 
 
+class RegistrySnapshot:
+    """
+    Immutable view of a frozen registry
+
+    Each factory is available as an attribute holding a bound callable
+    returning the factory result. Non identifier characters of the registry
+    names are replaced by :code:`_` (e.g. :code:`snapshot.my_plugin()` for
+    :code:`my-plugin`). Names hidden by an attribute of the registry (e.g.
+    :code:`stats`), or sharing their attribute with another name, are only
+    available as items.
+
+    The callable can be looked up once (i.e. at configuration) and called
+    in the hot path.
+    """
+    __slots__ = ('_getters', )
+
+    def __init__(self, getters):
+        object.__setattr__(self, '_getters', getters)
+
+    def __setattr__(self, key, value):
+        raise FrozenRegistryError()
+
+    def __delattr__(self, item):
+        raise FrozenRegistryError()
+
+    def __getitem__(self, item):
+        return self._getters[item]()
+
+    def __iter__(self):
+        return iter(self._getters)
+
+    def __len__(self):
+        return len(self._getters)
+
+    def __contains__(self, item):
+        return item in self._getters
+
+
+def _attribute_name(key):
+    name = str(key).replace('-', '_').replace('.', '_')
+    if name.isidentifier() and not keyword.iskeyword(name) \
+            and not name.startswith('_'):
+        return name
+
+
 class RegistrySingleton(MutableMapping):
     """
     Class regrouping all available plugin factory.
 
-    The plugin factory is called each time the registry is queried.
-    It is good practice to keep interacting on the same factory result without
-    querying the registry each time.
+    The plugin factory is called depending on the scope declared at
+    registration:
+
+        * :data:`TRANSIENT`: each time the registry is queried (default)
+        * :data:`PER_TASK`: once for the lifetime of an asyncio task
+        * :data:`SINGLETON`: once
+
+    Once frozen the factories are also available as attributes
+    (see :class:`RegistrySnapshot`).
 
     Similar behaviour as a dictionary
     """
     def __init__(self):
         super().__init__()
         self._frozen = False
+        self._snapshot = None
         self._plugins = dict()
+        self._scopes = dict()
+        self._getters = dict()
+        self._hits = Counter()
+        self._misses = Counter()
 
     @property
     def frozen(self):
@@ -37,17 +111,152 @@ class RegistrySingleton(MutableMapping):
     def frozen(self, _):
         raise ValueError('Read only property')
 
+    @property
+    def snapshot(self):
+        """
+        :class:`RegistrySnapshot` of the registry. :code:`None` until frozen.
+        """
+        return self._snapshot
+
     def freeze(self):
+        """
+        Freeze the registry
+
+        Check every factory is callable and build the registry snapshot.
+
+        Returns:
+            RegistrySnapshot: Immutable view of the registry
+        """
+        for key, factory in self._plugins.items():
+            if not callable(factory):
+                raise RegistryError(
+                    'Factory of "{}" is not callable'.format(key)
+                )
+
+        keys = dict()
+        for key in self._getters:
+            name = _attribute_name(key)
+            if name:
+                keys.setdefault(name, []).append(key)
+
+        attributes = dict()
+        for name, matching in keys.items():
+            if hasattr(type(self), name) or hasattr(RegistrySnapshot, name):
+                logger.warning('Registry name "%s" is hidden by the registry '
+                               'attribute "%s", use item access instead',
+                               matching[0], name)
+            elif len(matching) > 1:
+                logger.warning('Registry names %s share the attribute "%s", '
+                               'use item access instead',
+                               ', '.join(map(str, matching)), name)
+            else:
+                attributes[name] = self._getters[matching[0]]
+
+        cls = type('RegistrySnapshot', (RegistrySnapshot, ),
+                   {'__slots__': tuple(attributes)})
+        snapshot = cls(dict(self._getters))
+        for name, getter in attributes.items():
+            object.__setattr__(snapshot, name, getter)
+
+        self._snapshot = snapshot
         self._frozen = True
+        return snapshot
+
+    def register(self, key, factory, scope=TRANSIENT):
+        """
+        Register a plugin factory
+
+        Args:
+            key (str): Name in the registry
+            factory (callable): Plugin factory
+            scope (str): Factory scope. One of :data:`SCOPES`
+        """
+        if self._frozen:
+            raise FrozenRegistryError()
+        if scope not in SCOPES:
+            raise RegistryError('Unknown factory scope: {}'.format(scope))
+
+        self._plugins[key] = factory
+        self._scopes[key] = scope
+        builders = {
+            SINGLETON: self._singleton_getter,
+            PER_TASK: self._per_task_getter,
+            TRANSIENT: self._transient_getter
+        }
+        self._getters[key] = builders[scope](key, factory)
+
+    def stats(self):
+        """
+        Lookups statistics of the factories
+
+        A miss means the factory was called.
+
+        Returns:
+            dict: :code:`{name: {'scope': str, 'hits': int, 'misses': int}}`
+        """
+        return {
+            key: {
+                'scope': self._scopes[key],
+                'hits': self._hits[key],
+                'misses': self._misses[key]
+            }
+            for key in self._plugins
+        }
+
+    def _transient_getter(self, key, factory):
+        misses = self._misses
+
+        def getter():
+            misses[key] += 1
+            return factory()
+        return getter
+
+    def _singleton_getter(self, key, factory):
+        hits = self._hits
+        misses = self._misses
+        instance = []
+
+        def getter():
+            if instance:
+                hits[key] += 1
+            else:
+                misses[key] += 1
+                instance.append(factory())
+            return instance[0]
+        return getter
+
+    def _per_task_getter(self, key, factory):
+        hits = self._hits
+        misses = self._misses
+        instances = weakref.WeakKeyDictionary()
+
+        def getter():
+            task = current_task()
+            if task is None:
+                misses[key] += 1
+                return factory()
+
+            try:
+                instance = instances[task]
+            except KeyError:
+                misses[key] += 1
+                instance = instances[task] = factory()
+            else:
+                hits[key] += 1
+            return instance
+        return getter
+
+    def __getattr__(self, item):
+        snapshot = self.__dict__.get('_snapshot')
+        if snapshot is None:
+            raise AttributeError(item)
+        return getattr(snapshot, item)
 
     def __getitem__(self, item):
-        return self._plugins[item]()
+        return self._getters[item]()
 
     def __setitem__(self, key, value):
-        if not self._frozen:
-            self._plugins[key] = value
-        else:
-            raise FrozenRegistryError()
+        self.register(key, value)
 
     def __delitem__(self, key):
         raise FrozenRegistryError()
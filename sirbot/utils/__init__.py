@@ -1,28 +1,110 @@
 import asyncio
+import inspect
 import logging
 import functools
 
 main_logger = logging.getLogger(__name__)
 
+if hasattr(asyncio, 'current_task'):
+    _current_task = asyncio.current_task
+else:
+    _current_task = asyncio.Task.current_task
 
-def merge_dict(a, b, path=None):
+
+def current_task(loop=None):
+    """
+    Task currently running in the event loop
+
+    Args:
+        loop (asyncio.AbstractEventLoop): Event loop
+
+    Returns:
+        asyncio.Task: The running task or :code:`None` outside of a task
+    """
+    try:
+        return _current_task(loop=loop)
+    except RuntimeError:
+        return None
+
+
+def merge_dict(a, b):
     """
     Merge dict b into a
+
+    Values of a take precedence. Nested dicts are merged in a single pass
+    without recursion.
     """
-    if not path:
-        path = []
-    for key in b:
-        if key in a:
-            if isinstance(a[key], dict) and isinstance(b[key], dict):
-                merge_dict(a[key], b[key], path + [str(key)])
-            else:
+    stack = [(a, b)]
+    while stack:
+        target, source = stack.pop()
+        for key, value in source.items():
+            try:
+                current = target[key]
+            except KeyError:
+                target[key] = value
                 continue
-        else:
-            a[key] = b[key]
+            if isinstance(current, dict) and isinstance(value, dict):
+                stack.append((current, value))
     return a
 
 
+def set_event_loop_policy(name=None):
+    """
+    Install an event loop policy
+
+    Fallback to the default asyncio event loop, with a warning, when the
+    requested one is not installed.
+
+    Args:
+        name (str): :code:`asyncio` (default) or :code:`uvloop`
+
+    Returns:
+        str: Name of the installed event loop
+    """
+    if not name or name == 'asyncio':
+        return 'asyncio'
+    elif name != 'uvloop':
+        raise ValueError('Unknown event loop: {}'.format(name))
+
+    try:
+        import uvloop
+    except ImportError:
+        main_logger.warning('uvloop is not installed, using the asyncio '
+                            'event loop')
+        return 'asyncio'
+
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return 'uvloop'
+
+
+def accepted_kwargs(func, **kwargs):
+    """
+    Keep only the keyword arguments accepted by a function
+
+    Allow passing new arguments to callbacks written for an older
+    signature.
+
+    Args:
+        func (callable): Function
+        **kwargs: Keyword arguments
+
+    Returns:
+        dict: The keyword arguments accepted by :code:`func`
+    """
+    parameters = inspect.signature(func).parameters
+    if any(parameter.kind == parameter.VAR_KEYWORD
+           for parameter in parameters.values()):
+        return kwargs
+    return {key: value for key, value in kwargs.items() if key in parameters}
+
+
 def ensure_future(coroutine, loop=None, logger=None):
+    """
+    Schedule a coroutine and log its error
+
+    The task is neither bounded nor cancelled on stop. Plugins should use
+    the :class:`sirbot.core.supervisor.TaskSupervisor` instead.
+    """
     logger = logger or main_logger
     callback = functools.partial(error_callback, logger=logger)
     future = asyncio.ensure_future(coroutine, loop=loop)
@@ -0,0 +1,273 @@
+"""
+In memory caches
+"""
+
+import asyncio
+import collections
+import functools
+import time
+
+_MISSING = object()
+
+
+class Cache:
+    """
+    Size bounded cache with expiring entries
+
+    The least recently used entry is evicted when the cache is full.
+    :code:`None` values are negative results (e.g. an unknown user) and are
+    kept for :code:`negative_ttl` seconds.
+
+    Args:
+        maxsize (int): Maximum number of entries
+        ttl (float): Seconds an entry is kept. :code:`None` for no expiration
+        negative_ttl (float): Seconds a :code:`None` value is kept. Default
+            to :code:`ttl`
+        loop (asyncio.AbstractEventLoop): Event loop
+    """
+    def __init__(self, maxsize=1024, ttl=300, negative_ttl=None, *, loop):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self._loop = loop
+        self._data = collections.OrderedDict()
+        self._inflight = dict()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0,
+                       'expirations': 0}
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self._lookup(key, count=False) is not _MISSING
+
+    def _lookup(self, key, count=True):
+        try:
+            value, expires_at = self._data[key]
+        except KeyError:
+            if count:
+                self._stats['misses'] += 1
+            return _MISSING
+
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            if count:
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+            return _MISSING
+
+        if count:
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+        return value
+
+    def get(self, key, default=None):
+        """
+        Value of a key
+
+        Args:
+            key: Key
+            default: Value returned for a missing or expired key
+
+        Returns:
+            The value
+        """
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def set(self, key, value, ttl=None):
+        """
+        Set the value of a key
+
+        Args:
+            key: Key
+            value: Value
+            ttl (float): Seconds the entry is kept. Default to the cache
+                :code:`ttl` or :code:`negative_ttl`
+        """
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def delete(self, key):
+        """
+        Remove a key
+        """
+        self._data.pop(key, None)
+
+    def clear(self):
+        """
+        Remove every key
+        """
+        self._data.clear()
+
+    async def get_or_set(self, key, factory, ttl=None):
+        """
+        Value of a key, computed by :code:`factory` when missing
+
+        Concurrent calls for the same missing key wait for a single call of
+        :code:`factory`. Errors are not cached.
+
+        Args:
+            key: Key
+            factory (callable): Coroutine function computing the value
+            ttl (float): Seconds the entry is kept
+
+        Returns:
+            The value
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        try:
+            future = self._inflight[key]
+        except KeyError:
+            future = self._inflight[key] = asyncio.ensure_future(
+                self._load(key, factory, ttl), loop=self._loop
+            )
+            future.add_done_callback(
+                lambda _: self._inflight.pop(key, None)
+            )
+        return await asyncio.shield(future, loop=self._loop)
+
+    async def _load(self, key, factory, ttl):
+        value = await factory()
+        self.set(key, value, ttl)
+        return value
+
+    def stats(self):
+        """
+        Statistics of the cache
+
+        Returns:
+            dict: :code:`hits`, :code:`misses`, :code:`evictions`,
+            :code:`expirations` and :code:`size`
+        """
+        stats = dict(self._stats)
+        stats['size'] = len(self._data)
+        return stats
+
+
+def cached(cache, key=None, ttl=None):
+    """
+    Cache the result of a coroutine function
+
+    .. code-block:: python
+
+        @cached('_users')
+        async def user(self, user_id):
+            ...
+
+    Args:
+        cache (Cache or str): The cache or, for methods, the name of the
+            instance attribute holding the cache
+        key (callable): Compute the key from the arguments. Default to the
+            function name and its arguments
+        ttl (float): Seconds an entry is kept
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if isinstance(cache, str):
+                instance = getattr(args[0], cache)
+                key_args = args[1:]
+            else:
+                instance = cache
+                key_args = args
+
+            if key is None:
+                cache_key = (func.__qualname__, key_args,
+                             tuple(sorted(kwargs.items())))
+            else:
+                cache_key = key(*args, **kwargs)
+
+            return await instance.get_or_set(
+                cache_key, functools.partial(func, *args, **kwargs), ttl=ttl
+            )
+        return wrapper
+    return decorator
+
+
+class Caches:
+    """
+    Named caches shared with the plugins
+
+    Args:
+        config (dict): :code:`cache` configuration. Keys:
+
+            * :code:`maxsize`, :code:`ttl`, :code:`negative_ttl`: Defaults
+              of the caches
+            * :code:`caches`: Options of specific caches
+
+        loop (asyncio.AbstractEventLoop): Event loop
+        metrics (sirbot.core.metrics.Metrics): Metrics collection
+    """
+    def __init__(self, config=None, *, loop, metrics=None):
+        self._config = config or {}
+        self._loop = loop
+        self._caches = dict()
+        self._metrics = metrics
+        if metrics:
+            metrics.add_collector(self._collect)
+
+    def get_cache(self, name, **options):
+        """
+        Get or create a cache
+
+        Options of the configuration take precedence over the arguments.
+
+        Args:
+            name (str): Name of the cache
+            **options: :code:`maxsize`, :code:`ttl` and
+                :code:`negative_ttl` of the cache
+
+        Returns:
+            Cache: The cache
+        """
+        try:
+            return self._caches[name]
+        except KeyError:
+            pass
+
+        for option in ('maxsize', 'ttl', 'negative_ttl'):
+            if option in self._config:
+                options.setdefault(option, self._config[option])
+        options.update(self._config.get('caches', {}).get(name, {}))
+
+        cache = self._caches[name] = Cache(loop=self._loop, **options)
+        return cache
+
+    def stats(self):
+        """
+        Statistics of every cache
+
+        Returns:
+            dict: :code:`{name: stats}`
+        """
+        return {name: cache.stats() for name, cache in self._caches.items()}
+
+    def _collect(self):
+        events = self._metrics.gauge(
+            'sirbot_cache_events', 'Cache lookups and removals',
+            ('cache', 'event')
+        )
+        size = self._metrics.gauge(
+            'sirbot_cache_size', 'Entries in the cache', ('cache', )
+        )
+        ratio = self._metrics.gauge(
+            'sirbot_cache_hit_ratio', 'Ratio of lookups served by the cache',
+            ('cache', )
+        )
+        for name, stats in self.stats().items():
+            for event in ('hits', 'misses', 'evictions', 'expirations'):
+                events.labels(name, event).set(stats[event])
+            size.labels(name).set(stats['size'])
+            lookups = stats['hits'] + stats['misses']
+            ratio.labels(name).set(stats['hits'] / lookups if lookups else 0)
@@ -0,0 +1,185 @@
+"""
+Configuration loading
+
+YAML files are parsed with the LibYAML loader when available. The parsed
+result is cached in memory and, when enabled, on disk keyed by the file
+modification time and content hash.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+ENV_PREFIX = 'SIRBOT__'
+ENV_SEPARATOR = '__'
+
+_memory = dict()
+
+
+def cache_directory():
+    """
+    Directory of the configuration cache
+
+    The disk cache is opt-in: :code:`SIRBOT_CONFIG_CACHE` if set and not
+    empty.
+
+    Returns:
+        str: The directory or :code:`None`
+    """
+    return os.getenv('SIRBOT_CONFIG_CACHE') or None
+
+
+def load_yaml(path, cache=True):
+    """
+    Load a YAML file
+
+    The result is cached in memory and in :func:`cache_directory`, as JSON
+    readable only by the current user. Content JSON can't represent (e.g.
+    dates or non string keys) is only cached in memory. A cached result is
+    used while the file modification time and size are unchanged, or if its
+    content hash is unchanged. Each call returns a new object.
+
+    Args:
+        path (str): Path of the file
+        cache (bool): Use the cache
+
+    Returns:
+        The content of the file
+    """
+    path = os.path.abspath(path)
+    if not cache:
+        with open(path, 'rb') as file:
+            return yaml.load(file, Loader=Loader)
+
+    stat = os.stat(path)
+    entry = _memory.get(path) or _read_cache(path)
+    if entry and entry['mtime'] == stat.st_mtime_ns \
+            and entry['size'] == stat.st_size:
+        _memory[path] = entry
+        return pickle.loads(entry['data'])
+
+    with open(path, 'rb') as file:
+        content = file.read()
+    digest = hashlib.sha1(content).hexdigest()
+
+    if entry and entry['hash'] == digest:
+        data = entry['data']
+        parsed = pickle.loads(data)
+    else:
+        logger.debug('Parsing configuration file %s', path)
+        parsed = yaml.load(content, Loader=Loader)
+        data = pickle.dumps(parsed, pickle.HIGHEST_PROTOCOL)
+
+    entry = {
+        'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'hash': digest,
+        'data': parsed
+    }
+    _write_cache(path, entry)
+    _memory[path] = dict(entry, data=data)
+    return pickle.loads(data)
+
+
+def _cache_path(path):
+    directory = cache_directory()
+    if directory:
+        return os.path.join(
+            directory,
+            hashlib.sha1(path.encode('utf-8')).hexdigest() + '.json'
+        )
+
+
+def _read_cache(path):
+    cache_path = _cache_path(path)
+    if not cache_path:
+        return None
+
+    try:
+        with open(cache_path, encoding='utf-8') as file:
+            entry = json.load(file)
+        entry['data'] = pickle.dumps(entry['data'], pickle.HIGHEST_PROTOCOL)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.debug('Invalid configuration cache %s', cache_path,
+                     exc_info=True)
+        return None
+    return entry
+
+
+def _write_cache(path, entry):
+    cache_path = _cache_path(path)
+    if not cache_path:
+        return
+
+    try:
+        content = json.dumps(entry)
+    except (TypeError, ValueError):
+        return
+    if json.loads(content)['data'] != entry['data']:
+        return
+
+    temporary = '{}.{}'.format(cache_path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_path), mode=0o700, exist_ok=True)
+        fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, 'w', encoding='utf-8') as file:
+            file.write(content)
+        os.replace(temporary, cache_path)
+    except OSError:
+        logger.debug('Unable to write the configuration cache %s',
+                     cache_path, exc_info=True)
+
+
+def env_overlay(config, environ=None, prefix=ENV_PREFIX):
+    """
+    Override configuration values with environment variables
+
+    :code:`SIRBOT__SIRBOT__HTTP__LIMIT=50` set :code:`config['sirbot']['http']
+    ['limit']` to :code:`50`. Each part of the name matches an existing key
+    ignoring the case and with :code:`-` as :code:`_` (e.g.
+    :code:`USER_AGENT` for :code:`user-agent`), or a new lowercase key. Values
+    are parsed as YAML.
+
+    Args:
+        config (dict): Configuration, modified in place
+        environ (dict): Environment variables. Default to :data:`os.environ`
+        prefix (str): Prefix of the variables
+
+    Returns:
+        dict: The configuration
+    """
+    if environ is None:
+        environ = os.environ
+
+    for name in sorted(environ):
+        if not name.startswith(prefix) or name == prefix:
+            continue
+
+        parts = name[len(prefix):].split(ENV_SEPARATOR)
+        target = config
+        for part in parts[:-1]:
+            key = _env_key(target, part)
+            if not isinstance(target.get(key), dict):
+                target[key] = dict()
+            target = target[key]
+
+        target[_env_key(target, parts[-1])] = yaml.load(
+            environ[name], Loader=Loader
+        )
+    return config
+
+
+def _env_key(mapping, part):
+    normalized = part.upper()
+    for key in mapping:
+        if str(key).upper().replace('-', '_') == normalized:
+            return key
+    return part.lower()
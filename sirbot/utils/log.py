@@ -0,0 +1,325 @@
+"""
+Logging helpers
+"""
+
+import contextlib
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import weakref
+
+from . import current_task
+
+DROP = 'drop'
+SAMPLE = 'sample'
+
+_RECORD_ATTRIBUTES = frozenset(
+    logging.LogRecord('', 0, '', 0, '', (), None).__dict__
+) | {'message', 'asctime'}
+
+_contexts = weakref.WeakKeyDictionary()
+
+_encode = json.JSONEncoder(check_circular=False, default=str).encode
+
+
+class Lazy:
+    """
+    Log argument computed only when the record is formatted
+
+    .. code-block:: python
+
+        logger.debug('Payload: %s', Lazy(json.dumps, payload, indent=2))
+
+    Args:
+        func (callable): Function computing the value
+        *args: Function arguments
+        **kwargs: Function keyword arguments
+    """
+    __slots__ = ('_func', '_args', '_kwargs', '_value')
+
+    _missing = object()
+
+    def __init__(self, func, *args, **kwargs):
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._value = self._missing
+
+    @property
+    def value(self):
+        if self._value is self._missing:
+            self._value = self._func(*self._args, **self._kwargs)
+        return self._value
+
+    def __str__(self):
+        return str(self.value)
+
+    def __repr__(self):
+        return repr(self.value)
+
+
+def get_context():
+    """
+    Logging context of the current task
+
+    Returns:
+        dict: The bound fields or :code:`None`
+    """
+    task = current_task()
+    if task is not None:
+        return _contexts.get(task)
+
+
+def set_task_context(task, **fields):
+    """
+    Bind fields to the logs of a task
+
+    Args:
+        task (asyncio.Task): Task
+        **fields: Fields added to the log records
+    """
+    context = dict(_contexts.get(task) or {})
+    context.update(fields)
+    _contexts[task] = context
+
+
+@contextlib.contextmanager
+def bind(**fields):
+    """
+    Bind fields to the logs of the current task for the duration of the
+    context manager
+
+    .. code-block:: python
+
+        with bind(user=user_id):
+            logger.info('Message received')
+
+    Args:
+        **fields: Fields added to the log records
+    """
+    task = current_task()
+    if task is None:
+        yield
+        return
+
+    previous = _contexts.get(task)
+    set_task_context(task, **fields)
+    try:
+        yield
+    finally:
+        if previous is None:
+            _contexts.pop(task, None)
+        else:
+            _contexts[task] = previous
+
+
+def install_context():
+    """
+    Add the logging context of the current task to every log record
+
+    The fields are added as attributes of the records when they are
+    created.
+    """
+    factory = logging.getLogRecordFactory()
+    if getattr(factory, 'sirbot_context', False):
+        return
+
+    def record_factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        context = get_context()
+        if context:
+            record.__dict__.update(context)
+        return record
+
+    record_factory.sirbot_context = True
+    logging.setLogRecordFactory(record_factory)
+
+
+def context_middleware():
+    """
+    aiohttp middleware factory binding a :code:`request_id` to the logs
+
+    The id is taken from the :code:`X-Request-Id` header or generated.
+
+    Returns:
+        The middleware factory
+    """
+    prefix = '{:x}-'.format(os.getpid())
+    counter = itertools.count()
+
+    async def factory(app, handler):
+        async def context(request):
+            request_id = request.headers.get('X-Request-Id') or \
+                prefix + str(next(counter))
+            with bind(request_id=request_id):
+                return await handler(request)
+        return context
+    return factory
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Format the log records as JSON objects
+
+    The objects contain the :code:`time`, :code:`level`, :code:`logger` and
+    :code:`message` of the record, the fields passed with :code:`extra` or
+    bound to the context and the formatted exception if any.
+    :class:`Lazy` fields are computed when formatted.
+
+    .. code-block:: yaml
+
+        logging:
+          formatters:
+            json:
+              (): sirbot.utils.log.JSONFormatter
+    """
+    def format(self, record):
+        data = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+
+        for key in record.__dict__.keys() - _RECORD_ATTRIBUTES:
+            value = record.__dict__[key]
+            data[key] = value.value if isinstance(value, Lazy) else value
+
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc_info'] = record.exc_text
+        if record.stack_info:
+            data['stack_info'] = self.formatStack(record.stack_info)
+
+        return _encode(data)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Handler sending the records to a bounded queue without blocking
+
+    The records are not formatted before being enqueued, formatting is left
+    to the :class:`logging.handlers.QueueListener` thread. Arguments of the
+    records must not be mutated after logging.
+
+    When the queue is full the record is dropped. With the :data:`SAMPLE`
+    policy, once the queue is half full, only one out of :code:`sample`
+    records below :code:`WARNING` is enqueued.
+
+    Args:
+        queue (queue.Queue): Bounded queue
+        policy (str): :data:`DROP` or :data:`SAMPLE`
+        sample (int): Sampling rate of the :data:`SAMPLE` policy
+    """
+    def __init__(self, queue, policy=DROP, sample=10):
+        if policy not in (DROP, SAMPLE):
+            raise ValueError('Unknown logging queue policy: {}'.format(policy))
+
+        super().__init__(queue)
+        self.policy = policy
+        self.sample = sample
+        self.watermark = queue.maxsize // 2
+        self.enqueued = 0
+        self.dropped = 0
+        self.sampled = 0
+        self._seen = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if self.policy == SAMPLE and record.levelno < logging.WARNING and \
+                self.queue.qsize() >= self.watermark:
+            self._seen += 1
+            if self._seen % self.sample:
+                self.sampled += 1
+                return
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        else:
+            self.enqueued += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class QueueLogging:
+    """
+    Move the logging handlers to background threads
+
+    The handlers of every logger are replaced by a
+    :class:`BoundedQueueHandler`. A :class:`logging.handlers.QueueListener`
+    thread, one per logger, format and write the records with the original
+    handlers.
+
+    Args:
+        size (int): Maximum number of records waiting in each queue
+        policy (str): :data:`DROP` or :data:`SAMPLE`
+        sample (int): Sampling rate of the :data:`SAMPLE` policy
+    """
+    def __init__(self, size=10000, policy=DROP, sample=10):
+        self._size = size
+        self._policy = policy
+        self._sample = sample
+        self._installed = list()
+
+    def start(self):
+        """
+        Replace the handlers and start the listeners
+        """
+        loggers = [logging.getLogger()] + [
+            logger for logger in logging.Logger.manager.loggerDict.values()
+            if isinstance(logger, logging.Logger)
+        ]
+
+        for logger in loggers:
+            handlers = [handler for handler in logger.handlers
+                        if not isinstance(handler, BoundedQueueHandler)]
+            if not handlers or len(handlers) != len(logger.handlers):
+                continue
+
+            handler = BoundedQueueHandler(
+                queue.Queue(self._size), self._policy, self._sample
+            )
+            listener = _Listener(handler.queue, *handlers,
+                                 respect_handler_level=True)
+            logger.handlers = [handler]
+            listener.start()
+            self._installed.append((logger, handlers, handler, listener))
+
+    def stop(self):
+        """
+        Flush the queues, stop the listeners and restore the handlers
+        """
+        for logger, handlers, handler, listener in self._installed:
+            listener.stop()
+            if logger.handlers == [handler]:
+                logger.handlers = handlers
+        self._installed = list()
+
+    def stats(self):
+        """
+        Records statistics summed over all queues
+
+        Returns:
+            dict: :code:`enqueued`, :code:`dropped`, :code:`sampled` records
+            and :code:`queued` records waiting to be written
+        """
+        stats = {'enqueued': 0, 'dropped': 0, 'sampled': 0, 'queued': 0}
+        for _, _, handler, _ in self._installed:
+            stats['enqueued'] += handler.enqueued
+            stats['dropped'] += handler.dropped
+            stats['sampled'] += handler.sampled
+            stats['queued'] += handler.queue.qsize()
+        return stats
@@ -0,0 +1,6 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def config_cache(monkeypatch):
+    monkeypatch.delenv('SIRBOT_CONFIG_CACHE', raising=False)
@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+
+from sirbot.core.bus import (BLOCK, EXACT, GLOB, PREFIX, EventBus, Message,
+                             compile_pattern)
+from sirbot.core.metrics import Metrics
+
+
+def test_compile_pattern():
+    assert compile_pattern('slack.message') == (EXACT, 'slack.message')
+    assert compile_pattern('slack.*') == (PREFIX, 'slack.')
+    kind, match = compile_pattern('*.message')
+    assert kind == GLOB
+    assert match('slack.message')
+    assert not match('slack.reaction')
+
+
+async def test_routing(loop):
+    bus = EventBus(loop=loop)
+    exact = bus.subscribe('slack.message')
+    prefix = bus.subscribe('slack.*')
+    glob = bus.subscribe('*.message')
+
+    assert bus.publish_nowait('slack.message', 1) == 3
+    assert bus.publish_nowait('slack.reaction', 2) == 1
+    assert bus.publish_nowait('irc.message', 3) == 1
+    assert bus.publish_nowait('irc.join', 4) == 0
+
+    assert await exact.get() == Message('slack.message', 1)
+    assert exact.qsize() == 0
+    assert [m.event for m in await prefix.get_batch(10)] == [1, 2]
+    assert [m.event for m in await glob.get_batch(10)] == [1, 3]
+
+
+async def test_unsubscribe(loop):
+    bus = EventBus(loop=loop)
+    subscription = bus.subscribe('slack.*')
+    assert bus.publish_nowait('slack.message', 1) == 1
+    subscription.close()
+    assert bus.publish_nowait('slack.message', 1) == 0
+    assert bus.stats() == {}
+
+
+async def test_drop(loop):
+    metrics = Metrics()
+    bus = EventBus({'size': 2}, loop=loop, metrics=metrics)
+    subscription = bus.subscribe('test')
+    for event in range(3):
+        bus.publish_nowait('test', event)
+
+    assert subscription.dropped == 1
+    assert bus.stats() == {
+        'test': {'subscriptions': 1, 'queued': 2, 'dropped': 1}
+    }
+    assert 'sirbot_bus_dropped_total{pattern="test"} 1' in metrics.render()
+
+
+async def test_block(loop):
+    bus = EventBus(loop=loop)
+    subscription = bus.subscribe('test', size=1, policy=BLOCK)
+    await bus.publish('test', 1)
+    publishing = asyncio.ensure_future(bus.publish('test', 2), loop=loop)
+    await asyncio.sleep(0.01, loop=loop)
+    assert not publishing.done()
+
+    assert (await subscription.get()).event == 1
+    assert await publishing == 1
+    assert (await subscription.get()).event == 2
+
+
+def test_unknown_policy(loop):
+    bus = EventBus(loop=loop)
+    with pytest.raises(ValueError):
+        bus.subscribe('test', policy='unknown')
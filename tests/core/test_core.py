@@ -5,13 +5,24 @@ test_sirbot
 
 Tests for `sirbot` module.
 """
+import asyncio
+import functools
+import json
 import logging
+import os
 import pytest
+import signal
 import sirbot
 
+from aiohttp import web
 from copy import deepcopy
 
+from sirbot.core.errors import (CircularDependencyError, DependencyError,
+                                PluginLoadError, StartupBudgetExceeded,
+                                UpdateError)
+from sirbot.utils import log
 from tests.core.test_plugin.sirbot import PluginTest
+from tests.core.test_plugin.sirbot_legacy import PluginTestLegacy
 
 CONFIG = {
     'sirbot': {
@@ -115,13 +126,613 @@ def test_plugin_priority(loop, registry):
     config['test-error'] = {'priority': 70}
     config['sirbot']['plugins'].append('tests.core.test_plugin.sirbot_start_error')
     bot = sirbot.SirBot(loop=loop, config=config)
-    assert bot._start_priority[80] == ['test']
-    assert bot._start_priority[70] == ['test-error']
+    assert bot._plugins['test']['priority'] == 80
+    assert bot._plugins['test-error']['priority'] == 70
 
 
 def test_plugin_no_start(loop, test_server):
     config = deepcopy(CONFIG)
     config['test']['priority'] = False
     bot = sirbot.SirBot(loop=loop, config=config)
-    assert bot._start_priority == {}
     assert bot._plugins == {}
+
+
+def test_start_plugins_legacy(loop, test_server, registry):
+    config = deepcopy(CONFIG)
+    config['sirbot']['plugins'] = ['tests.core.test_plugin.sirbot_legacy']
+    bot = sirbot.SirBot(loop=loop, config=config)
+    loop.run_until_complete(test_server(bot._app))
+    assert bot._plugins['test-legacy']['plugin'].started
+    assert not bot._tasks['test-legacy'].cancelled()
+
+
+def test_start_plugins_no_polling(loop, test_server, registry, monkeypatch):
+    polls = []
+    monkeypatch.setattr(PluginTest, 'started', property(
+        lambda self: polls.append(self) or self._started.is_set()
+    ))
+    config = deepcopy(CONFIG)
+    config['test-legacy'] = {'priority': 40}
+    config['sirbot']['plugins'].append('tests.core.test_plugin.sirbot_legacy')
+    bot = sirbot.SirBot(loop=loop, config=config)
+    loop.run_until_complete(bot._start_plugins())
+    assert polls == []
+    assert bot._plugins['test']['plugin']._started.is_set()
+    assert bot._plugins['test-legacy']['plugin'].started
+
+
+async def test_wait_started_without_method(loop, registry):
+    class Bare:
+        started = False
+
+        async def start(self):
+            await asyncio.sleep(0.01, loop=loop)
+            self.started = True
+
+    config = deepcopy(CONFIG)
+    config['sirbot']['plugins'] = ['tests.core.test_plugin.sirbot_legacy']
+    bot = sirbot.SirBot(loop=loop, config=config)
+    plugin = bot._plugins['test-legacy']['plugin'] = Bare()
+    bot._tasks['test-legacy'] = loop.create_task(plugin.start())
+    await bot._wait_started('test-legacy')
+    assert plugin.started
+
+
+async def test_wait_started_cancelled(loop, registry):
+    config = deepcopy(CONFIG)
+    config['sirbot']['plugins'] = ['tests.core.test_plugin.sirbot_legacy']
+    bot = sirbot.SirBot(loop=loop, config=config)
+    task = bot._tasks['test-legacy'] = loop.create_task(
+        asyncio.sleep(10, loop=loop)
+    )
+
+    waiting = loop.create_task(bot._wait_started('test-legacy'))
+    await asyncio.sleep(0.05, loop=loop)
+    waiting.cancel()
+    await asyncio.wait([waiting], loop=loop)
+    await asyncio.sleep(0.01, loop=loop)
+
+    pending = [t for t in asyncio.Task.all_tasks(loop)
+               if not t.done() and 'Plugin.wait_started' in repr(t)]
+    assert pending == []
+    task.cancel()
+
+
+def test_plugin_dependencies_priority(loop, registry):
+    config = deepcopy(CONFIG)
+    config['test']['priority'] = 80
+    config['test-error'] = {'priority': 70}
+    config['sirbot']['plugins'].append(
+        'tests.core.test_plugin.sirbot_start_error'
+    )
+    bot = sirbot.SirBot(loop=loop, config=config)
+    assert bot._dependencies == {'test': set(), 'test-error': {'test'}}
+    assert bot._start_order == ['test', 'test-error']
+
+
+def test_plugin_requires_lower_priority(loop, registry, monkeypatch):
+    monkeypatch.setattr(PluginTest, '__requires__', ('test-legacy', ))
+    config = deepcopy(CONFIG)
+    config['test-legacy'] = {'priority': 40}
+    config['sirbot']['plugins'].append('tests.core.test_plugin.sirbot_legacy')
+    bot = sirbot.SirBot(loop=loop, config=config)
+    assert bot._dependencies == {'test': {'test-legacy'}, 'test-legacy': set()}
+    assert bot._start_order == ['test-legacy', 'test']
+
+
+def test_plugin_requires(loop, registry, monkeypatch):
+    monkeypatch.setattr(PluginTest, '__requires__', ())
+    config = deepcopy(CONFIG)
+    config['test-legacy'] = {'priority': 80}
+    config['sirbot']['plugins'].append('tests.core.test_plugin.sirbot_legacy')
+    bot = sirbot.SirBot(loop=loop, config=config)
+    assert bot._dependencies['test'] == set()
+    assert bot._dependencies['test-legacy'] == set()
+
+    monkeypatch.setattr(PluginTestLegacy, '__requires__', ('test', ))
+    bot._dependencies = dict()
+    bot._resolve_dependencies()
+    assert bot._dependencies['test-legacy'] == {'test'}
+    assert bot._start_order == ['test', 'test-legacy']
+
+    loop.run_until_complete(bot._start_plugins())
+    assert bot._plugins['test-legacy']['plugin'].started
+
+
+def test_plugin_requires_missing(loop, registry, monkeypatch):
+    monkeypatch.setattr(PluginTest, '__requires__', ('xxx', ))
+    with pytest.raises(DependencyError):
+        sirbot.SirBot(loop=loop, config=CONFIG)
+
+
+def test_plugin_requires_cycle(loop, registry, monkeypatch):
+    monkeypatch.setattr(PluginTest, '__requires__', ('test', ))
+    with pytest.raises(CircularDependencyError) as error:
+        sirbot.SirBot(loop=loop, config=CONFIG)
+    assert 'test -> test' in str(error.value)
+
+
+def test_lazy_plugin(loop, test_server, registry):
+    config = deepcopy(CONFIG)
+    config['sirbot']['plugins'] = [{
+        'module': 'tests.core.test_plugin.sirbot', 'name': 'test',
+        'factory': True, 'scope': 'singleton', 'requires': ()
+    }]
+    bot = sirbot.SirBot(loop=loop, config=config)
+    assert bot._plugins['test']['plugin'] is None
+    assert bot._dependencies == {'test': set()}
+    assert 'test' in sirbot.registry.registry
+
+    loop.run_until_complete(bot._configure_plugins())
+    assert isinstance(bot._plugins['test']['plugin'], PluginTest)
+    assert bot._plugins['test']['plugin'].config == CONFIG['test']
+
+    loop.run_until_complete(test_server(bot._app))
+    assert set(bot.startup_timings()['test']) == {
+        'import', 'init', 'configure', 'start'
+    }
+
+
+def test_lazy_plugin_factory(loop, registry):
+    config = deepcopy(CONFIG)
+    config['sirbot']['plugins'].append({
+        'module': 'tests.core.test_plugin.sirbot_legacy',
+        'name': 'test-legacy', 'factory': True
+    })
+    bot = sirbot.SirBot(loop=loop, config=config)
+    assert bot._plugins['test-legacy']['plugin'] is None
+    assert bot._dependencies['test-legacy'] == set()
+    assert set(bot.startup_timings()['test']) == {'import', 'init'}
+
+    sirbot.registry.registry['test-legacy']
+    assert isinstance(bot._plugins['test-legacy']['plugin'], PluginTestLegacy)
+
+
+def test_lazy_plugin_deferred_configure(loop, test_server, registry):
+    config = deepcopy(CONFIG)
+    config['sirbot']['plugins'] = [{
+        'module': 'tests.core.test_plugin.sirbot', 'name': 'test'
+    }]
+    bot = sirbot.SirBot(loop=loop, config=config)
+    assert 'test' not in sirbot.registry.registry
+
+    loop.run_until_complete(bot._configure_plugins())
+    assert bot._plugins['test']['plugin'] is None
+
+    loop.run_until_complete(test_server(bot._app))
+    assert bot._plugins['test']['plugin'].config == CONFIG['test']
+
+
+def test_lazy_plugin_configured_before_start(loop, test_server, registry,
+                                             monkeypatch):
+    config = deepcopy(CONFIG)
+    config['sirbot']['plugins'].append({
+        'module': 'tests.core.test_plugin.sirbot_legacy',
+        'name': 'test-legacy', 'factory': True
+    })
+    config['test-legacy'] = {'priority': 40, 'lazy': True}
+    monkeypatch.setattr(PluginTestLegacy, 'factory', lambda self: self,
+                        raising=False)
+    used = []
+
+    async def start(self):
+        used.append(sirbot.registry.registry['test-legacy'].config)
+        self._started.set()
+
+    monkeypatch.setattr(PluginTest, 'start', start)
+    bot = sirbot.SirBot(loop=loop, config=config)
+    assert bot._start_order == ['test', 'test-legacy']
+
+    loop.run_until_complete(bot._configure_plugins())
+    loop.run_until_complete(test_server(bot._app))
+    assert used == [config['test-legacy']]
+
+
+def test_lazy_plugin_wrong_module(loop, registry):
+    config = deepcopy(CONFIG)
+    config['sirbot']['plugins'] = [
+        {'module': 'tests.core.test_plugin.sirbot', 'name': 'xxx'}
+    ]
+    bot = sirbot.SirBot(loop=loop, config=config)
+    with pytest.raises(PluginLoadError):
+        bot._load_plugin('xxx')
+
+
+def test_update_plugins(loop, registry, monkeypatch):
+    updated = []
+
+    async def update(self, config, plugins):
+        updated.append(self.__name__)
+
+    monkeypatch.setattr(PluginTestLegacy, 'update', update, raising=False)
+    config = deepcopy(CONFIG)
+    config['sirbot']['plugins'].append({
+        'module': 'tests.core.test_plugin.sirbot_legacy',
+        'name': 'test-legacy'
+    })
+    bot = sirbot.SirBot(loop=loop, config=config)
+    with pytest.raises(ValueError):
+        loop.run_until_complete(bot.update(['xxx']))
+
+    loop.run_until_complete(bot.update(['test-legacy']))
+    assert updated == ['test-legacy']
+
+
+def test_update_cleanup(loop, registry, monkeypatch):
+    errors = []
+    monkeypatch.setattr(
+        'sirbot.core.core.logger.exception',
+        lambda msg, *args: errors.append(msg % args)
+    )
+    stopped = []
+    stop = log.QueueLogging.stop
+
+    def stop_queue(self):
+        stopped.append(self)
+        stop(self)
+
+    monkeypatch.setattr(log.QueueLogging, 'stop', stop_queue)
+    config = deepcopy(CONFIG)
+    config['sirbot']['log_queue'] = {'enabled': True}
+    bot = sirbot.SirBot(loop=loop, config=config)
+
+    async def shutdown(timeout):
+        raise RuntimeError()
+
+    monkeypatch.setattr(bot._supervisor, 'shutdown', shutdown)
+    loop.run_until_complete(bot.update())
+    assert errors == ['Error during shutdown phase supervisor shutdown']
+    assert stopped == [bot._log_queue]
+    assert bot._executors._closed
+    assert bot._session.closed
+
+
+def update_config(**test_legacy):
+    config = deepcopy(CONFIG)
+    config['test-legacy'] = test_legacy
+    config['sirbot']['plugins'].append('tests.core.test_plugin.sirbot_legacy')
+    return config
+
+
+def slow_update(updated, delay=0.1):
+    async def update(self, config, plugins):
+        await asyncio.sleep(delay, loop=self.loop)
+        updated.append(self.__name__)
+    return update
+
+
+def test_update_concurrent(loop, registry, monkeypatch):
+    updated = []
+    monkeypatch.setattr(PluginTest, 'update', slow_update(updated))
+    monkeypatch.setattr(PluginTestLegacy, 'update', slow_update(updated),
+                        raising=False)
+    bot = sirbot.SirBot(loop=loop, config=update_config())
+
+    start = loop.time()
+    report = loop.run_until_complete(bot.update())
+    assert loop.time() - start < 0.18
+    assert sorted(updated) == ['test', 'test-legacy']
+    assert {name: r['status'] for name, r in report.items()} == {
+        'test': 'updated', 'test-legacy': 'updated'
+    }
+    assert bot._session.closed
+
+
+def test_update_dependencies(loop, registry, monkeypatch):
+    updated = []
+    monkeypatch.setattr(PluginTest, 'update', slow_update(updated))
+    monkeypatch.setattr(PluginTestLegacy, 'update', slow_update(updated, 0),
+                        raising=False)
+    bot = sirbot.SirBot(loop=loop, config=update_config(priority=40))
+    loop.run_until_complete(bot.update())
+    assert updated == ['test', 'test-legacy']
+
+
+def test_update_timeout(loop, registry, monkeypatch):
+    updated = []
+    monkeypatch.setattr(PluginTest, 'update', slow_update(updated, 1))
+    config = update_config(priority=40)
+    config['test']['update_timeout'] = 0.05
+    bot = sirbot.SirBot(loop=loop, config=config)
+
+    with pytest.raises(UpdateError) as error:
+        loop.run_until_complete(bot.update())
+    assert {n: r['status'] for n, r in error.value.report.items()} == {
+        'test': 'timeout', 'test-legacy': 'blocked'
+    }
+    assert updated == []
+
+
+def test_update_dry_run(loop, registry, monkeypatch):
+    updated = []
+
+    async def pending_updates(self, config):
+        return ['migration 2']
+
+    monkeypatch.setattr(PluginTest, 'update', slow_update(updated))
+    monkeypatch.setattr(PluginTest, 'pending_updates', pending_updates)
+    bot = sirbot.SirBot(loop=loop, config=update_config())
+    report = loop.run_until_complete(bot.update(dry_run=True))
+    assert report == {'test': ['migration 2'], 'test-legacy': None}
+    assert updated == []
+
+
+def test_profile_startup(loop, registry):
+    bot = sirbot.SirBot(loop=loop, config=deepcopy(CONFIG))
+    timings = loop.run_until_complete(bot.profile_startup())
+    assert set(timings['test']) == {'import', 'init', 'configure', 'start'}
+    assert timings['test']['start'] >= bot._plugins['test']['plugin'].slept
+    assert bot._plugins['test']['plugin'].stopped
+
+
+def test_startup_trace(loop, registry, tmpdir):
+    path = tmpdir.join('trace.json')
+    config = deepcopy(CONFIG)
+    config['sirbot']['startup'] = {'trace': True, 'trace_path': str(path)}
+    bot = sirbot.SirBot(loop=loop, config=config)
+    loop.run_until_complete(bot.profile_startup())
+
+    spans = {(span['name'], span['args'].get('plugin'))
+             for span in json.loads(path.read())['spans']}
+    assert spans >= {
+        ('SirBot.__init__', None), ('_configure', None),
+        ('_import_plugins', None), ('_initialize_plugins', None),
+        ('_register_factory', None), ('_configure_plugins', None),
+        ('_start_plugins', None), ('configure', 'test'), ('start', 'test')
+    }
+
+
+def test_startup_budgets(loop, registry):
+    config = deepcopy(CONFIG)
+    config['sirbot']['startup'] = {
+        'budgets': {'test': {'start': 0.01, 'import': 10}}
+    }
+    bot = sirbot.SirBot(loop=loop, config=config)
+    loop.run_until_complete(bot.profile_startup())
+    exceeded = bot.check_startup_budgets()
+    assert len(exceeded) == 1
+    assert exceeded[0].startswith('test start took')
+
+
+def test_startup_budgets_fail(loop, registry):
+    config = deepcopy(CONFIG)
+    config['sirbot']['startup'] = {
+        'budgets': {'test': 0.01}, 'budget_action': 'fail'
+    }
+    bot = sirbot.SirBot(loop=loop, config=config)
+    with pytest.raises(StartupBudgetExceeded):
+        loop.run_until_complete(bot.profile_startup())
+
+
+async def test_reload(loop, registry):
+    config = deepcopy(CONFIG)
+    config['sirbot']['plugins'].append('tests.core.test_plugin.sirbot_legacy')
+    bot = sirbot.SirBot(loop=loop, config=deepcopy(config))
+    await bot._configure_plugins()
+
+    config['test'] = {'test_config': False}
+    config['test-legacy'] = {'option': 1}
+    report = await bot.reload(deepcopy(config))
+    assert report == {
+        'reconfigured': ['test'], 'restart': ['test-legacy'], 'failed': []
+    }
+    assert bot._plugins['test']['plugin'].config == {'test_config': False}
+    assert bot._plugins['test-legacy']['config'] == {}
+    assert bot.config['test'] == {'test_config': False}
+    assert 'test-legacy' not in bot.config
+
+    config['sirbot']['port'] = 9000
+    report = await bot.reload(deepcopy(config))
+    assert report['restart'] == ['sirbot', 'test-legacy']
+    assert report['reconfigured'] == []
+    assert bot.config['sirbot']['port'] != 9000
+
+    with pytest.raises(ValueError):
+        await bot.reload()
+
+
+async def test_reload_endpoint(loop, test_client, registry):
+    config = deepcopy(CONFIG)
+    config['sirbot']['reload'] = {'path': '/reload', 'token': 'secret'}
+    new = deepcopy(config)
+    new['test'] = {'test_config': False}
+    bot = sirbot.SirBot(loop=loop, config=config,
+                        config_loader=lambda: deepcopy(new))
+    await bot._configure_plugins()
+    client = await test_client(bot.app)
+
+    response = await client.post('/reload')
+    assert response.status == 401
+
+    response = await client.post(
+        '/reload', headers={'Authorization': 'Bearer secret'}
+    )
+    assert response.status == 200
+    assert (await response.json())['reconfigured'] == ['test']
+
+    new['test'] = {'test_config': 'sighup'}
+    os.kill(os.getpid(), signal.SIGHUP)
+    await asyncio.sleep(0.1, loop=loop)
+    assert bot._plugins['test']['plugin'].config == {'test_config': 'sighup'}
+
+    del new['sirbot']['reload']['token']
+    response = await client.post(
+        '/reload', headers={'Authorization': 'Bearer secret'}
+    )
+    assert (await response.json())['restart'] == ['sirbot']
+    response = await client.post('/reload')
+    assert response.status == 401
+
+
+def test_http_session(loop, registry):
+    config = deepcopy(CONFIG)
+    config['sirbot']['http'] = {'limit': 10, 'timeout': {'connect': 5}}
+    bot = sirbot.SirBot(loop=loop, config=config)
+    assert bot._session.connector.limit == 10
+    assert bot._session._conn_timeout == 5
+    assert bot._session._read_timeout == 300
+    assert bot._plugins['test']['session'] is bot._session
+    assert bot.http_stats() == {
+        'shared': {'limit': 10, 'in_use': 0, 'idle': 0, 'waiting': 0}
+    }
+    loop.run_until_complete(bot._close_sessions())
+
+
+def test_http_isolated_session(loop, registry):
+    config = deepcopy(CONFIG)
+    config['test']['http'] = {'limit': 5, 'timeout': {'total': 10}}
+    bot = sirbot.SirBot(loop=loop, config=config)
+    session = bot._plugins['test']['session']
+    assert session is not bot._session
+    assert session.connector.limit == 5
+    assert session.connector.limit_per_host == 0
+    assert session._read_timeout == 10
+    assert set(bot.http_stats()) == {'shared', 'test'}
+
+    loop.run_until_complete(bot._close_sessions())
+    assert session.closed
+    assert bot._session.closed
+
+
+async def test_metrics_endpoint(loop, test_client, registry):
+    bot = sirbot.SirBot(loop=loop, config=deepcopy(CONFIG))
+    await bot._configure_plugins()
+    client = await test_client(bot.app)
+    response = await client.get('/metrics')
+    assert response.status == 200
+    assert response.headers['Content-Type'].startswith('text/plain')
+
+    text = await response.text()
+    assert 'sirbot_plugin_configure_seconds{plugin="test"}' in text
+    assert 'sirbot_plugin_start_seconds{plugin="test"}' in text
+    assert 'sirbot_plugin_tasks{state="done"} 1.0' in text
+    assert ('sirbot_http_pool_connections'
+            '{session="shared",state="idle"}') in text
+
+    response = await client.get('/metrics')
+    text = await response.text()
+    assert ('sirbot_http_request_duration_seconds_count'
+            '{method="GET",route="/metrics"} 1') in text
+
+
+def test_metrics_disabled(loop, registry):
+    config = deepcopy(CONFIG)
+    config['sirbot']['metrics'] = {'enabled': False}
+    config['sirbot']['log_context'] = {'enabled': False}
+    config['sirbot']['health'] = {'enabled': False}
+    bot = sirbot.SirBot(loop=loop, config=config)
+    assert list(bot.app.middlewares) == [bot._inflight_middleware]
+    assert len(bot.app.router.routes()) == 0
+
+
+async def test_health(loop, test_client, registry):
+    bot = sirbot.SirBot(loop=loop, config=deepcopy(CONFIG))
+    await bot._configure_plugins()
+    assert bot._readiness[0] == 503
+
+    client = await test_client(bot.app)
+    response = await client.get('/healthz')
+    assert response.status == 200
+
+    response = await client.get('/readyz')
+    assert response.status == 200
+    assert await response.json() == {
+        'ready': True, 'plugins': {'test': 'started'}
+    }
+
+    await bot.app.shutdown()
+    response = await client.get('/readyz')
+    assert response.status == 503
+
+
+async def test_health_plugin_failed(loop, test_client, registry):
+    bot = sirbot.SirBot(loop=loop, config=deepcopy(CONFIG))
+    await bot._configure_plugins()
+    client = await test_client(bot.app)
+
+    async def fail():
+        raise ValueError()
+
+    task = loop.create_task(fail())
+    task.add_done_callback(functools.partial(bot._plugin_done, 'test'))
+    await asyncio.wait([task], loop=loop)
+
+    response = await client.get('/readyz')
+    assert response.status == 503
+    assert (await response.json())['plugins'] == {'test': 'failed'}
+
+
+async def test_graceful_shutdown(loop, test_client, registry):
+    bot = sirbot.SirBot(loop=loop, config=deepcopy(CONFIG))
+    await bot._configure_plugins()
+    handled = []
+
+    async def slow(request):
+        await asyncio.sleep(0.1, loop=loop)
+        handled.append(request)
+        return web.Response(text='ok')
+
+    async def job():
+        await asyncio.sleep(0.1, loop=loop)
+        handled.append('job')
+
+    bot.app.router.add_get('/slow', slow)
+    client = await test_client(bot.app)
+    assert bot._ready
+
+    request = asyncio.ensure_future(client.get('/slow'), loop=loop)
+    await asyncio.sleep(0.02, loop=loop)
+    assert bot._inflight == 1
+    bot._supervisor.spawn_nowait(job())
+
+    await bot.app.shutdown()
+    assert not bot._ready
+    assert len(handled) == 2
+    response = await request
+    assert await response.text() == 'ok'
+
+    await client.close()
+    assert bot._plugins['test']['plugin'].stopped
+    assert bot._purge_task.cancelled()
+    assert bot._session.closed
+
+
+async def test_stop_failed_start_task(loop, test_client, registry,
+                                      monkeypatch):
+    logs = []
+    monkeypatch.setattr(
+        'sirbot.core.core.logger.error',
+        lambda msg, *args, **kwargs: logs.append(msg % args)
+    )
+    bot = sirbot.SirBot(loop=loop, config=deepcopy(CONFIG))
+    plugin = bot._plugins['test']['plugin']
+
+    async def start():
+        plugin._started.set()
+        await asyncio.sleep(0.01, loop=loop)
+        raise ValueError
+
+    plugin.start = start
+    await bot._configure_plugins()
+    client = await test_client(bot.app)
+    await asyncio.sleep(0.05, loop=loop)
+    assert bot._health['test'] == 'failed'
+
+    await client.close()
+    assert logs == ['Plugin test start task failed']
+    assert bot._executors._closed
+    assert bot._session.closed
+
+
+async def test_graceful_shutdown_timeout(loop, test_client, registry):
+    config = deepcopy(CONFIG)
+    config['sirbot']['shutdown'] = {'timeout': 0.05}
+    bot = sirbot.SirBot(loop=loop, config=config)
+    await bot._configure_plugins()
+    await test_client(bot.app)
+
+    future = bot._supervisor.spawn_nowait(asyncio.sleep(10, loop=loop))
+    start = loop.time()
+    await bot.app.shutdown()
+    assert loop.time() - start < 1
+    assert not future.done()
@@ -0,0 +1,74 @@
+import asyncio
+import math
+import threading
+import time
+import pytest
+
+from sirbot.core.executor import Executors
+from sirbot.core.metrics import Metrics
+
+
+def blocking(duration, result=None):
+    time.sleep(duration)
+    return result
+
+
+async def test_run_in_thread(loop):
+    executors = Executors({'threads': 2}, loop=loop)
+    executor = executors.for_plugin('test')
+    result = await executor.run_in_thread(blocking, 0.01, result='ok')
+    assert result == 'ok'
+    await executors.shutdown()
+
+
+async def test_run_in_process(loop):
+    executors = Executors({'processes': 1}, loop=loop)
+    executor = executors.for_plugin('test')
+    assert await executor.run_in_process(math.factorial, 5) == 120
+    await executors.shutdown()
+
+
+async def test_process_disabled(loop):
+    executors = Executors({'processes': 0}, loop=loop)
+    with pytest.raises(RuntimeError):
+        await executors.for_plugin('test').run_in_process(math.factorial, 5)
+    await executors.shutdown()
+
+
+async def test_quota(loop):
+    metrics = Metrics()
+    executors = Executors({'threads': 4, 'quota': 1}, loop=loop,
+                          metrics=metrics)
+    executor = executors.for_plugin('test')
+    running = []
+
+    def job():
+        running.append(threading.get_ident())
+        time.sleep(0.05)
+        assert len(running) == 1
+        running.pop()
+
+    jobs = asyncio.gather(*(executor.run_in_thread(job) for _ in range(3)),
+                          loop=loop)
+    await asyncio.sleep(0.01, loop=loop)
+    text = metrics.render()
+    assert 'sirbot_executor_running{plugin="test",pool="thread"} 1' in text
+    assert 'sirbot_executor_waiting{plugin="test",pool="thread"} 2' in text
+
+    await jobs
+    await executors.shutdown()
+
+
+async def test_shutdown_drain(loop):
+    executors = Executors({'threads': 1}, loop=loop)
+    job = asyncio.ensure_future(
+        executors.for_plugin('test').run_in_thread(blocking, 0.1, 'done'),
+        loop=loop
+    )
+    await asyncio.sleep(0.01, loop=loop)
+    await executors.shutdown()
+    assert job.done()
+    assert job.result() == 'done'
+
+    with pytest.raises(RuntimeError):
+        await executors.for_plugin('test').run_in_thread(blocking, 0)
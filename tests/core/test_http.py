@@ -0,0 +1,145 @@
+import asyncio
+import pytest
+
+from aiohttp import web
+from multidict import CIMultiDict, MultiDict
+
+from sirbot.core.errors import RateLimitExceeded
+from sirbot.core.http import create_limiter, create_session, retry_after
+from sirbot.core.metrics import Metrics
+from sirbot.core.ratelimit import TokenBucket
+
+
+def test_retry_after():
+    assert retry_after({}) is None
+    assert retry_after({'Retry-After': '2'}) == 2
+    assert retry_after({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}) == 0
+    assert retry_after({'Retry-After': 'invalid'}) is None
+
+
+def test_token_bucket(loop):
+    bucket = TokenBucket(10, 2, loop=loop)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    bucket.pause(5)
+    assert bucket.reserve() >= 4.9
+
+
+def test_limiter_rules(loop):
+    limiter = create_limiter({'rate_limits': [
+        {'host': 'slack.com', 'rate': 1},
+        {'host': 'slack.com', 'path': '/api/chat.', 'rate': 1},
+        {'rate': 1, 'name': 'default'}
+    ]}, loop=loop)
+    assert limiter.rule('https://slack.com/api/chat.postMessage')[1] == \
+        'slack.com/api/chat.'
+    assert limiter.rule('https://slack.com/api/users.info')[1] == 'slack.com'
+    assert limiter.rule('https://example.com/')[1] == 'default'
+    assert create_limiter({}, loop=loop) is None
+
+
+async def test_limiter_rejected(loop):
+    metrics = Metrics()
+    limiter = create_limiter({'rate_limits': [
+        {'host': 'slack.com', 'rate': 1, 'max_wait': 0}
+    ]}, loop=loop, metrics=metrics)
+    await limiter.acquire('https://slack.com/api')
+    with pytest.raises(RateLimitExceeded):
+        await limiter.acquire('https://slack.com/api')
+    assert 'sirbot_http_ratelimit_rejected_total{rule="slack.com"} 1' in \
+        metrics.render()
+
+
+async def test_session_rate_limit(loop, test_server):
+    app = web.Application(loop=loop)
+    app.router.add_get('/', lambda request: web.Response(text='ok'))
+    server = await test_server(app)
+
+    limiter = create_limiter({'rate_limits': [{'rate': 20, 'burst': 1}]},
+                             loop=loop)
+    session = create_session({}, loop=loop, limiter=limiter)
+    start = loop.time()
+    for _ in range(3):
+        async with session.get(server.make_url('/')) as response:
+            assert response.status == 200
+    assert loop.time() - start >= 0.09
+    await session.close()
+
+
+async def test_session_retry_after(loop, test_server):
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return web.Response(status=429, headers={'Retry-After': '0'})
+        return web.Response(text='ok')
+
+    app = web.Application(loop=loop)
+    app.router.add_post('/', handler)
+    server = await test_server(app)
+
+    session = create_session({'retry_after': {'retries': 1}}, loop=loop)
+    async with session.post(server.make_url('/'), data=b'data') as response:
+        assert response.status == 200
+    assert len(calls) == 2
+    assert session.retried == 1
+    await session.close()
+
+
+async def test_session_coalesce(loop, test_server):
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(0.05, loop=loop)
+        return web.json_response({'ok': True})
+
+    app = web.Application(loop=loop)
+    app.router.add_get('/', handler)
+    server = await test_server(app)
+
+    session = create_session({'coalesce': True}, loop=loop)
+    url = server.make_url('/')
+    responses = await asyncio.gather(
+        session.get(url), session.get(url), session.get(url, params={'a': 1}),
+        loop=loop
+    )
+    assert len(calls) == 2
+    assert session.coalesced == 1
+    for response in responses:
+        assert await response.json() == {'ok': True}
+    await session.close()
+
+
+async def test_session_coalesce_multidict(loop, test_server):
+    async def handler(request):
+        await asyncio.sleep(0.05, loop=loop)
+        return web.json_response({
+            'id': request.query.getall('id', []),
+            'auth': request.headers.get('Authorization')
+        })
+
+    app = web.Application(loop=loop)
+    app.router.add_get('/', handler)
+    server = await test_server(app)
+
+    session = create_session({'coalesce': True}, loop=loop)
+    url = server.make_url('/')
+    responses = await asyncio.gather(
+        session.get(url, params=MultiDict(id=1)),
+        session.get(url, params=MultiDict(id=2)),
+        session.get(url, params=MultiDict([('id', 1), ('id', 2)])),
+        session.get(url, headers=CIMultiDict(Authorization='a')),
+        session.get(url, headers=CIMultiDict(Authorization='b')),
+        loop=loop
+    )
+    assert session.coalesced == 0
+    assert [(await response.json())['id'] for response in responses] == [
+        ['1'], ['2'], ['1', '2'], [], []
+    ]
+    assert [(await response.json())['auth'] for response in responses] == [
+        None, None, None, 'a', 'b'
+    ]
+    await session.close()
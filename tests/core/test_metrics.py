@@ -0,0 +1,74 @@
+from aiohttp import web
+
+from sirbot.core.metrics import Metrics, middleware
+
+
+def test_counter_gauge():
+    metrics = Metrics()
+    metrics.counter('test_total', 'Test counter', ('name', )).labels(
+        'a"b').inc(2)
+    metrics.gauge('test_gauge', 'Test gauge').set(1.5)
+
+    assert metrics.render() == (
+        '# HELP test_gauge Test gauge\n'
+        '# TYPE test_gauge gauge\n'
+        'test_gauge 1.5\n'
+        '# HELP test_total Test counter\n'
+        '# TYPE test_total counter\n'
+        'test_total{name="a\\"b"} 2.0\n'
+    )
+
+
+def test_histogram():
+    metrics = Metrics()
+    histogram = metrics.histogram('test_seconds', 'Test', buckets=(1, 0.1))
+    histogram.observe(0.05)
+    histogram.observe(0.1)
+    histogram.observe(5)
+
+    assert metrics.render().splitlines()[2:] == [
+        'test_seconds_bucket{le="0.1"} 2',
+        'test_seconds_bucket{le="1.0"} 2',
+        'test_seconds_bucket{le="+Inf"} 3',
+        'test_seconds_sum 5.15',
+        'test_seconds_count 3',
+    ]
+
+
+def test_get_or_create():
+    metrics = Metrics()
+    gauge = metrics.gauge('test', 'Test')
+    assert metrics.gauge('test', 'Test') is gauge
+    assert gauge.labels() is gauge.labels()
+
+
+def test_collector():
+    metrics = Metrics()
+    metrics.add_collector(lambda: metrics.gauge('test', 'Test').inc())
+    metrics.render()
+    assert metrics.render().endswith('test 2.0\n')
+
+
+async def handler(request):
+    return web.Response()
+
+
+async def test_middleware_unmatched_routes(test_client):
+    histogram = Metrics().histogram(
+        'test_seconds', 'Test histogram', ('method', 'route')
+    )
+    factory = middleware(histogram)
+    app = web.Application(middlewares=[factory])
+    app.router.add_get('/', handler)
+    client = await test_client(app)
+
+    await client.get('/')
+    await client.get('/missing')
+    size = len(factory.children)
+
+    for _ in range(5):
+        await client.get('/missing')
+        await client.post('/')
+
+    assert len(factory.children) == size == 2
+    assert sum(histogram.labels('*', 'unmatched').counts) == 11
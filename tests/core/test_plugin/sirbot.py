@@ -10,21 +10,34 @@ class PluginTest(Plugin):
     def __init__(self, loop):
         super().__init__(loop)
         self.loop = loop
-        self._started = False
+        self._started = asyncio.Event(loop=loop)
+        self.stopped = False
+        self.slept = None
 
     async def configure(self, config, router, session):
         self.config = config
 
+    async def reconfigure(self, config):
+        self.config = config
+
     async def start(self):
+        start = self.loop.time()
         await asyncio.sleep(0.1, loop=self.loop)
-        self._started = True
+        self.slept = self.loop.time() - start
+        self._started.set()
+
+    async def wait_started(self, loop):
+        await self._started.wait()
+
+    async def stop(self):
+        self.stopped = True
 
     def facade(self):
         return FacadeTest()
 
     @property
     def started(self):
-        return self._started
+        return self._started.is_set()
 
 
 class FacadeTest:
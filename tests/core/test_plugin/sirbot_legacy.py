@@ -0,0 +1,29 @@
+import asyncio
+
+from sirbot.core.plugin import Plugin
+from sirbot.core.hookimpl import hookimpl
+
+
+class PluginTestLegacy(Plugin):
+    __name__ = 'test-legacy'
+
+    def __init__(self, loop):
+        super().__init__(loop)
+        self.loop = loop
+        self._started = False
+
+    async def configure(self, config, router, session):
+        self.config = config
+
+    async def start(self):
+        await asyncio.sleep(0.1, loop=self.loop)
+        self._started = True
+
+    @property
+    def started(self):
+        return self._started
+
+
+@hookimpl
+def plugins(loop):
+    return PluginTestLegacy(loop)
@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+
+from sirbot.core.state import MEMORY, SQLITE, create_state, purge_expired
+
+
+@pytest.fixture(params=[MEMORY, SQLITE])
+def state(request, loop, tmpdir):
+    backend = create_state(
+        {'backend': request.param, 'path': str(tmpdir.join('state.db'))},
+        loop=loop
+    )
+    yield backend
+    loop.run_until_complete(backend.close())
+
+
+async def test_get_set(state):
+    assert await state.get('a') is None
+    assert await state.get('a', 'default') == 'default'
+    await state.set('a', {'value': 1})
+    assert await state.get('a') == {'value': 1}
+    assert await state.mget(['a', 'b']) == [{'value': 1}, None]
+    await state.delete('a')
+    assert await state.get('a') is None
+
+
+async def test_incr(state):
+    assert await state.incr('counter') == 1
+    assert await state.incr('counter', 5) == 6
+    assert await state.get('counter') == 6
+
+
+async def test_cas(state):
+    assert await state.cas('lock', None, 'owner')
+    assert not await state.cas('lock', None, 'other')
+    assert await state.cas('lock', 'owner', 'other')
+    assert await state.get('lock') == 'other'
+
+
+async def test_expire(state, loop):
+    await state.set('a', 1, ttl=0.01)
+    await state.set('b', 1)
+    assert not await state.expire('c', 10)
+    assert await state.expire('b', 0.01)
+    await asyncio.sleep(0.02, loop=loop)
+    assert await state.mget(['a', 'b']) == [None, None]
+    assert await state.incr('a') == 1
+
+
+async def test_purge_expired(state, loop):
+    await state.set('a', 1, ttl=0.01)
+    await state.set('b', 1)
+    task = loop.create_task(purge_expired(state, 0.02, loop=loop))
+    await asyncio.sleep(0.05, loop=loop)
+    task.cancel()
+    assert await state.purge() == 0
+    assert await state.get('b') == 1
+
+
+async def test_sqlite_shared(loop, tmpdir):
+    config = {'backend': SQLITE, 'path': str(tmpdir.join('state.db'))}
+    first = create_state(config, loop=loop)
+    second = create_state(config, loop=loop)
+    await asyncio.gather(*(s.incr('counter') for s in (first, second) * 5),
+                         loop=loop)
+    assert await first.get('counter') == 10
+    await first.set('a', 1, ttl=0)
+    assert await second.purge() == 1
+    await first.close()
+    await second.close()
+
+
+def test_unknown_backend(loop):
+    with pytest.raises(ValueError):
+        create_state({'backend': 'unknown'}, loop=loop)
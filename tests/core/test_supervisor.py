@@ -0,0 +1,102 @@
+import asyncio
+import pytest
+
+from sirbot.core.errors import TaskQueueFull
+from sirbot.core.metrics import Metrics
+from sirbot.core.supervisor import TaskSupervisor
+
+
+async def test_spawn(loop):
+    supervisor = TaskSupervisor({}, loop=loop)
+
+    async def job():
+        return 'ok'
+
+    future = await supervisor.spawn(job())
+    assert await future == 'ok'
+    await supervisor.shutdown()
+
+
+async def test_limit_and_queue(loop):
+    metrics = Metrics()
+    supervisor = TaskSupervisor({'groups': {'test': {'limit': 2}}},
+                                loop=loop, metrics=metrics)
+    running = []
+    event = asyncio.Event(loop=loop)
+
+    async def job():
+        running.append(1)
+        await event.wait()
+        running.pop()
+
+    futures = [supervisor.spawn_nowait(job(), group='test') for _ in range(5)]
+    await asyncio.sleep(0, loop=loop)
+    assert len(running) == 2
+    assert supervisor.stats() == {'test': {'running': 2, 'queued': 3}}
+    text = metrics.render()
+    assert 'sirbot_tasks_running{group="test"} 2' in text
+    assert 'sirbot_tasks_queued{group="test"} 3' in text
+
+    event.set()
+    await asyncio.gather(*futures, loop=loop)
+    assert supervisor.stats() == {'test': {'running': 0, 'queued': 0}}
+    await supervisor.shutdown()
+
+
+async def test_spawn_nowait_full(loop):
+    supervisor = TaskSupervisor({'limit': 1, 'queue': 1}, loop=loop)
+    event = asyncio.Event(loop=loop)
+
+    supervisor.spawn_nowait(event.wait())
+    supervisor.spawn_nowait(event.wait())
+    with pytest.raises(TaskQueueFull):
+        supervisor.spawn_nowait(event.wait())
+
+    event.set()
+    await supervisor.shutdown(1)
+
+
+async def test_spawn_backpressure(loop):
+    supervisor = TaskSupervisor({'limit': 1, 'queue': 1}, loop=loop)
+    event = asyncio.Event(loop=loop)
+
+    supervisor.spawn_nowait(event.wait())
+    supervisor.spawn_nowait(event.wait())
+    waiting = asyncio.ensure_future(supervisor.spawn(event.wait()), loop=loop)
+    await asyncio.sleep(0.01, loop=loop)
+    assert not waiting.done()
+
+    event.set()
+    future = await waiting
+    await future
+    await supervisor.shutdown()
+
+
+async def test_error(loop, monkeypatch):
+    from sirbot.core import supervisor as module
+    errors = []
+    monkeypatch.setattr(module.logger, 'error',
+                        lambda *args, **kwargs: errors.append(args))
+    supervisor = TaskSupervisor({}, loop=loop)
+
+    async def job():
+        raise ValueError('boom')
+
+    future = supervisor.spawn_nowait(job())
+    with pytest.raises(ValueError):
+        await future
+    assert len(errors) == 1
+    await supervisor.shutdown()
+
+
+async def test_shutdown(loop):
+    supervisor = TaskSupervisor({'limit': 1}, loop=loop)
+    running = supervisor.spawn_nowait(asyncio.sleep(10, loop=loop))
+    queued = supervisor.spawn_nowait(asyncio.sleep(10, loop=loop))
+    await asyncio.sleep(0, loop=loop)
+
+    await supervisor.shutdown(1)
+    assert running.cancelled()
+    assert queued.cancelled()
+    with pytest.raises(RuntimeError):
+        supervisor.spawn_nowait(asyncio.sleep(0, loop=loop))
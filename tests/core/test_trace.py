@@ -0,0 +1,77 @@
+import importlib
+import json
+import sys
+
+import pytest
+
+from sirbot.core import trace
+
+
+@pytest.fixture
+def modules(tmpdir, monkeypatch):
+    tmpdir.join('trace_parent.py').write(
+        'import time\nimport trace_child\ntime.sleep(0.02)\n'
+    )
+    tmpdir.join('trace_child.py').write('import time\ntime.sleep(0.05)\n')
+    monkeypatch.syspath_prepend(str(tmpdir))
+    yield
+    for name in ('trace_parent', 'trace_child'):
+        sys.modules.pop(name, None)
+
+
+def test_import_timer(modules):
+    timer = trace.ImportTimer()
+    timer.install()
+    try:
+        module = importlib.import_module('trace_parent')
+    finally:
+        timer.uninstall()
+
+    assert timer not in sys.meta_path
+    assert not isinstance(module.__loader__, trace._TimedLoader)
+    assert module.__spec__.loader is module.__loader__
+
+    imports = {item.module: item for item in timer.imports}
+    assert imports['trace_child'].self >= 0.05
+    assert imports['trace_parent'].cumulative >= 0.07
+    assert imports['trace_parent'].self < 0.05
+    assert [i.module for i in timer.slowest(1)] == ['trace_child']
+
+
+def test_tracer_disabled():
+    tracer = trace.StartupTracer()
+    with tracer.span('test'):
+        pass
+    assert tracer.spans == []
+    assert tracer.trace() == {'spans': [], 'imports': []}
+
+
+def test_tracer(modules, tmpdir):
+    tracer = trace.StartupTracer(enabled=True)
+    with tracer.span('import'):
+        importlib.import_module('trace_parent')
+    with tracer.span('start', 'plugin', plugin='test'):
+        pass
+    tracer.finish()
+
+    data = tracer.trace(top_imports=1)
+    assert [span['name'] for span in data['spans']] == ['import', 'start']
+    assert data['spans'][1]['args'] == {'plugin': 'test'}
+    assert data['imports'][0]['module'] == 'trace_child'
+
+    path = str(tmpdir.join('trace.json'))
+    tracer.write(path, trace.CHROME)
+    with open(path) as file:
+        events = json.load(file)['traceEvents']
+
+    spans = {e['name']: e for e in events if e['ph'] == 'X'}
+    assert spans['import']['tid'] == 0
+    assert spans['start']['tid'] == 1
+    assert spans['trace_child']['cat'] == 'import'
+    assert spans['import']['dur'] >= 70000
+    assert {e['args']['name'] for e in events if e['ph'] == 'M'} == {
+        'sirbot', 'test'
+    }
+
+    with pytest.raises(ValueError):
+        tracer.write(path, 'xxx')
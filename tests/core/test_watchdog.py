@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from sirbot.core.metrics import Metrics
+from sirbot.core.watchdog import Watchdog
+
+
+def block(seconds):
+    time.sleep(seconds)
+
+
+async def test_watchdog(loop, monkeypatch):
+    logs = []
+    monkeypatch.setattr(
+        'sirbot.core.watchdog.logger.warning',
+        lambda msg, *args: logs.append(msg % args)
+    )
+    metrics = Metrics()
+    watchdog = Watchdog(loop, {__name__: 'blocking'}, threshold=0.1,
+                        interval=0.02, metrics=metrics)
+    watchdog.start()
+    try:
+        await asyncio.sleep(0.05, loop=loop)
+        block(0.3)
+        await asyncio.sleep(0.05, loop=loop)
+    finally:
+        watchdog.stop()
+
+    stats = watchdog.stats()
+    assert stats['blocking']['stalls'] == 1
+    assert stats['blocking']['seconds'] >= 0.2
+    assert 'sirbot_watchdog_stalls_total{plugin="blocking"} 1.0' in \
+        metrics.render()
+    assert 'blocking in test_watchdog' in logs[0]
+    assert 'block(0.3)' in logs[0]
+
+
+async def test_watchdog_no_stall(loop):
+    watchdog = Watchdog(loop, {__name__: 'blocking'}, threshold=0.1,
+                        interval=0.02)
+    watchdog.start()
+    await asyncio.sleep(0.1, loop=loop)
+    watchdog.stop()
+    assert watchdog.stats() == {}
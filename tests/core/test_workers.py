@@ -0,0 +1,50 @@
+import os
+import signal
+import socket
+import time
+
+from sirbot.core.workers import reuse_port_socket, Supervisor
+
+
+def test_reuse_port_socket():
+    first = reuse_port_socket('127.0.0.1', 0)
+    port = first.getsockname()[1]
+    second = reuse_port_socket('127.0.0.1', port)
+    try:
+        assert second.getsockname()[1] == port
+        assert second.getsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT)
+    finally:
+        first.close()
+        second.close()
+
+
+def test_supervisor_forward_stop():
+    parent = os.getpid()
+
+    def target():
+        os.kill(parent, signal.SIGTERM)
+        time.sleep(10)
+
+    handler = signal.getsignal(signal.SIGTERM)
+    supervisor = Supervisor(target, 2)
+    supervisor.run()
+
+    assert supervisor._stopping
+    assert supervisor._workers == {}
+    assert signal.getsignal(signal.SIGTERM) is handler
+
+
+def test_supervisor_worker_signals(tmpdir):
+    parent = os.getpid()
+    result = tmpdir.join('result')
+
+    def target():
+        result.write('{} {}'.format(
+            signal.getsignal(signal.SIGHUP) == signal.SIG_IGN,
+            os.getpgrp() == os.getpid()
+        ))
+        os.kill(parent, signal.SIGTERM)
+        time.sleep(10)
+
+    Supervisor(target, 1).run()
+    assert result.read() == 'True True'
@@ -0,0 +1,78 @@
+import pytest
+
+from sirbot.core.metrics import Metrics
+from sirbot.core.workqueue import WorkQueue
+
+
+@pytest.fixture
+def path(tmpdir):
+    return str(tmpdir.join('sirbot.db'))
+
+
+async def test_put_get_ack(loop, path):
+    metrics = Metrics()
+    queue = WorkQueue(path, loop=loop, metrics=metrics)
+    await queue.put('events', {'type': 'message'})
+    await queue.put_many('events', [1, 2])
+
+    jobs = await queue.get('events', size=2)
+    assert [job.payload for job in jobs] == [{'type': 'message'}, 1]
+    assert all(job.attempts == 1 for job in jobs)
+    assert await queue.get_nowait('other') == []
+
+    await queue.ack(*jobs)
+    assert await queue.stats() == {'events': {'jobs': 1, 'dead': 0}}
+    assert ('sirbot_workqueue_jobs_total{queue="events",outcome="acked"} 2'
+            in metrics.render())
+    await queue.close()
+
+
+async def test_lease(loop, path):
+    queue = WorkQueue(path, loop=loop, lease=0)
+    await queue.put('events', 1)
+    first = await queue.get('events')
+    second = await queue.get('events')
+    assert first[0].id == second[0].id
+    assert second[0].attempts == 2
+    await queue.close()
+
+
+async def test_durable(loop, path):
+    queue = WorkQueue(path, loop=loop)
+    await queue.put('events', 1)
+    await queue.close()
+
+    queue = WorkQueue(path, loop=loop)
+    jobs = await queue.get_nowait('events')
+    assert [job.payload for job in jobs] == [1]
+    await queue.close()
+
+
+async def test_retry_and_dead_letters(loop, path):
+    queue = WorkQueue(path, loop=loop, max_attempts=2, backoff=0)
+    await queue.put('events', 1)
+
+    job, = await queue.get('events')
+    assert not await queue.nack(job, 'boom')
+    job, = await queue.get('events')
+    assert job.attempts == 2
+    assert await queue.nack(job, 'boom')
+
+    assert await queue.get_nowait('events') == []
+    dead = await queue.dead_letters('events')
+    assert [(job.payload, error) for job, error in dead] == [(1, 'boom')]
+
+    assert await queue.retry_dead_letters('events') == 1
+    job, = await queue.get('events')
+    assert job.payload == 1
+    assert job.attempts == 1
+    await queue.close()
+
+
+async def test_backoff(loop, path):
+    queue = WorkQueue(path, loop=loop, backoff=10)
+    await queue.put('events', 1)
+    job, = await queue.get('events')
+    await queue.nack(job)
+    assert await queue.get_nowait('events') == []
+    await queue.close()
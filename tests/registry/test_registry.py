@@ -0,0 +1,108 @@
+import asyncio
+import pytest
+
+from sirbot.registry import (FrozenRegistryError, PER_TASK, RegistryError,
+                             RegistrySingleton, SINGLETON)
+
+
+class Factory:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return object()
+
+
+@pytest.fixture
+def registry():
+    return RegistrySingleton()
+
+
+def test_transient(registry):
+    factory = Factory()
+    registry['test'] = factory
+    assert registry['test'] is not registry['test']
+    assert factory.calls == 2
+    assert registry.stats() == {
+        'test': {'scope': 'transient', 'hits': 0, 'misses': 2}
+    }
+
+
+def test_singleton(registry):
+    factory = Factory()
+    registry.register('test', factory, scope=SINGLETON)
+    assert registry['test'] is registry['test']
+    assert factory.calls == 1
+    assert registry.stats()['test']['hits'] == 1
+    assert registry.stats()['test']['misses'] == 1
+
+
+async def test_per_task(loop, registry):
+    factory = Factory()
+    registry.register('test', factory, scope=PER_TASK)
+
+    async def lookup():
+        first = registry['test']
+        await asyncio.sleep(0, loop=loop)
+        assert registry['test'] is first
+        return first
+
+    results = await asyncio.gather(lookup(), lookup(), loop=loop)
+    assert results[0] is not results[1]
+    assert factory.calls == 2
+    assert registry.stats()['test']['hits'] == 2
+
+
+def test_unknown_scope(registry):
+    with pytest.raises(RegistryError):
+        registry.register('test', Factory(), scope='xxx')
+
+
+def test_freeze_hidden_names(registry, monkeypatch):
+    logs = []
+    monkeypatch.setattr(
+        'sirbot.registry.logger.warning',
+        lambda msg, *args: logs.append(msg % args)
+    )
+    for key in ('stats', 'items', 'my-plugin', 'my_plugin'):
+        registry.register(key, Factory(), scope=SINGLETON)
+    snapshot = registry.freeze()
+
+    assert registry['stats'] is snapshot['stats']
+    assert registry['my-plugin'] is not registry['my_plugin']
+    assert callable(registry.stats)
+    assert not hasattr(snapshot, 'stats')
+    assert not hasattr(snapshot, 'my_plugin')
+    assert len(logs) == 3
+
+
+def test_frozen(registry):
+    registry.freeze()
+    with pytest.raises(FrozenRegistryError):
+        registry['test'] = Factory()
+
+
+def test_freeze_snapshot(registry):
+    factory = Factory()
+    registry.register('test-plugin', factory, scope=SINGLETON)
+    snapshot = registry.freeze()
+
+    assert registry.snapshot is snapshot
+    assert snapshot.test_plugin() is registry['test-plugin']
+    assert registry.test_plugin is snapshot.test_plugin
+    assert snapshot['test-plugin'] is registry['test-plugin']
+    assert 'test-plugin' in snapshot
+    assert factory.calls == 1
+
+    with pytest.raises(FrozenRegistryError):
+        snapshot.test_plugin = None
+    with pytest.raises(AttributeError):
+        snapshot.xxx()
+
+
+def test_freeze_not_callable(registry):
+    registry['test'] = None
+    with pytest.raises(RegistryError):
+        registry.freeze()
+    assert not registry.frozen
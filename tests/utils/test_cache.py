@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+
+from sirbot.core.metrics import Metrics
+from sirbot.utils.cache import Cache, Caches, cached
+
+
+def test_lru(loop):
+    cache = Cache(maxsize=2, loop=loop)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert 'b' not in cache
+    assert cache.get('a') == 1
+    assert cache.stats()['evictions'] == 1
+
+
+def test_ttl(loop):
+    cache = Cache(ttl=0, negative_ttl=10, loop=loop)
+    cache.set('a', 1)
+    cache.set('b', None)
+    assert cache.get('a', 'missing') == 'missing'
+    assert 'b' in cache
+    assert cache.stats()['expirations'] == 1
+
+
+async def test_single_flight(loop):
+    cache = Cache(loop=loop)
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.01, loop=loop)
+        return 'value'
+
+    values = await asyncio.gather(
+        *(cache.get_or_set('key', factory) for _ in range(5)), loop=loop
+    )
+    assert values == ['value'] * 5
+    assert len(calls) == 1
+    assert await cache.get_or_set('key', factory) == 'value'
+    assert len(calls) == 1
+
+
+async def test_errors_not_cached(loop):
+    cache = Cache(loop=loop)
+
+    async def factory():
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        await cache.get_or_set('key', factory)
+    assert 'key' not in cache
+
+
+async def test_cached(loop):
+    class Client:
+        def __init__(self):
+            self.calls = 0
+            self._cache = Cache(loop=loop)
+
+        @cached('_cache')
+        async def user(self, user_id):
+            self.calls += 1
+            return {'id': user_id}
+
+    client = Client()
+    assert await client.user('U1') == {'id': 'U1'}
+    assert await client.user('U1') == {'id': 'U1'}
+    assert await client.user('U2') == {'id': 'U2'}
+    assert client.calls == 2
+
+
+def test_caches(loop):
+    metrics = Metrics()
+    caches = Caches({'ttl': 10, 'caches': {'users': {'maxsize': 5}}},
+                    loop=loop, metrics=metrics)
+    users = caches.get_cache('users', maxsize=100, ttl=60)
+    assert caches.get_cache('users') is users
+    assert users.maxsize == 5
+    assert users.ttl == 60
+
+    users.set('a', 1)
+    users.get('a')
+    users.get('b')
+    text = metrics.render()
+    assert 'sirbot_cache_hit_ratio{cache="users"} 0.5' in text
+    assert 'sirbot_cache_size{cache="users"} 1' in text
@@ -0,0 +1,99 @@
+import datetime
+import json
+import os
+import stat
+
+import pytest
+import yaml
+
+from sirbot.utils import config
+
+
+@pytest.fixture
+def parsed(tmpdir, monkeypatch):
+    monkeypatch.setenv('SIRBOT_CONFIG_CACHE', str(tmpdir.join('cache')))
+    monkeypatch.setattr(config, '_memory', dict())
+    calls = []
+    load = yaml.load
+
+    def counting_load(*args, **kwargs):
+        calls.append(args)
+        return load(*args, **kwargs)
+
+    monkeypatch.setattr(config.yaml, 'load', counting_load)
+    return calls
+
+
+def test_load_yaml_cache(tmpdir, parsed):
+    path = tmpdir.join('sirbot.yml')
+    path.write('sirbot:\n  port: 8080\n')
+
+    data = config.load_yaml(str(path))
+    assert data == {'sirbot': {'port': 8080}}
+    assert len(parsed) == 1
+
+    data['sirbot']['port'] = 1
+    assert config.load_yaml(str(path)) == {'sirbot': {'port': 8080}}
+    assert len(parsed) == 1
+
+    config._memory.clear()
+    assert config.load_yaml(str(path)) == {'sirbot': {'port': 8080}}
+    assert len(parsed) == 1
+    cache = tmpdir.join('cache').listdir()
+    assert len(cache) == 1
+    assert json.loads(cache[0].read())['data'] == {'sirbot': {'port': 8080}}
+    assert stat.S_IMODE(os.stat(str(cache[0])).st_mode) == 0o600
+
+
+def test_load_yaml_changed(tmpdir, parsed):
+    path = tmpdir.join('sirbot.yml')
+    path.write('port: 8080\n')
+    config.load_yaml(str(path))
+
+    os.utime(str(path), ns=(0, 0))
+    assert config.load_yaml(str(path)) == {'port': 8080}
+    assert len(parsed) == 1
+
+    path.write('port: 9090\n')
+    assert config.load_yaml(str(path)) == {'port': 9090}
+    assert len(parsed) == 2
+
+
+@pytest.mark.parametrize('directory', ('', None))
+def test_load_yaml_no_cache(tmpdir, parsed, monkeypatch, directory):
+    if directory is None:
+        monkeypatch.delenv('SIRBOT_CONFIG_CACHE')
+    else:
+        monkeypatch.setenv('SIRBOT_CONFIG_CACHE', directory)
+    path = tmpdir.join('sirbot.yml')
+    path.write('port: 8080\n')
+    config.load_yaml(str(path))
+    config._memory.clear()
+    assert config.load_yaml(str(path)) == {'port': 8080}
+    assert len(parsed) == 2
+    assert not tmpdir.join('cache').check()
+
+
+def test_load_yaml_not_json(tmpdir, parsed):
+    path = tmpdir.join('sirbot.yml')
+    path.write('1: 2017-01-01\n')
+    assert config.load_yaml(str(path)) == {1: datetime.date(2017, 1, 1)}
+    assert not tmpdir.join('cache').check()
+
+    config._memory.clear()
+    config.load_yaml(str(path))
+    assert len(parsed) == 2
+
+
+def test_env_overlay():
+    data = {'sirbot': {'user-agent': 'bot', 'http': {'limit': 100}}}
+    environ = {
+        'SIRBOT__SIRBOT__HTTP__LIMIT': '50',
+        'SIRBOT__SIRBOT__USER_AGENT': 'other',
+        'SIRBOT__SLACK__TOKENS': '[a, b]',
+        'SIRBOT_PORT': '8080'
+    }
+    assert config.env_overlay(data, environ) == {
+        'sirbot': {'user-agent': 'other', 'http': {'limit': 50}},
+        'slack': {'tokens': ['a', 'b']}
+    }
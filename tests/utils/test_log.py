@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+import queue
+import threading
+
+from sirbot.utils.log import (BoundedQueueHandler, JSONFormatter, Lazy,
+                              QueueLogging, SAMPLE, bind, get_context,
+                              install_context)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.threads.add(threading.get_ident())
+        self.records.append(self.format(record))
+
+
+def make_record(level=logging.INFO, msg='test %s', args=(1, )):
+    return logging.LogRecord('test', level, __file__, 1, msg, args, None)
+
+
+def test_bounded_queue_drop():
+    handler = BoundedQueueHandler(queue.Queue(2))
+    for _ in range(3):
+        handler.handle(make_record())
+    assert handler.enqueued == 2
+    assert handler.dropped == 1
+
+
+def test_bounded_queue_not_formatted():
+    handler = BoundedQueueHandler(queue.Queue(2))
+    record = make_record()
+    handler.handle(record)
+    assert handler.queue.get_nowait() is record
+    assert record.args == (1, )
+
+
+def test_bounded_queue_sample():
+    handler = BoundedQueueHandler(queue.Queue(100), policy=SAMPLE, sample=10)
+    for _ in range(150):
+        handler.handle(make_record())
+    handler.handle(make_record(level=logging.ERROR))
+
+    assert handler.enqueued == 50 + 10 + 1
+    assert handler.sampled == 90
+    assert handler.dropped == 0
+
+
+def test_queue_logging():
+    logger = logging.getLogger('sirbot.test_queue_logging')
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    target = ListHandler()
+    logger.addHandler(target)
+
+    queue_logging = QueueLogging(size=10)
+    queue_logging.start()
+    try:
+        assert isinstance(logger.handlers[0], BoundedQueueHandler)
+        logger.info('hello %s', 'world')
+    finally:
+        queue_logging.stop()
+
+    assert logger.handlers == [target]
+    assert target.records == ['hello world']
+    assert threading.get_ident() not in target.threads
+    assert queue_logging.stats()['enqueued'] == 0
+
+
+def test_json_formatter():
+    record = make_record()
+    record.user = 'U000'
+    data = json.loads(JSONFormatter().format(record))
+    assert data['message'] == 'test 1'
+    assert data['level'] == 'INFO'
+    assert data['logger'] == 'test'
+    assert data['user'] == 'U000'
+    assert 'args' not in data
+
+
+def test_json_formatter_exception():
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        record = logging.LogRecord('test', logging.ERROR, __file__, 1,
+                                   'error', (), __import__('sys').exc_info())
+    data = json.loads(JSONFormatter().format(record))
+    assert 'ValueError: boom' in data['exc_info']
+
+
+def test_lazy_not_computed():
+    calls = []
+    logger = logging.getLogger('sirbot.test.lazy')
+    logger.setLevel(logging.INFO)
+    logger.debug('test %s', Lazy(calls.append, 1))
+    assert calls == []
+
+
+def test_lazy_field():
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return 'value'
+
+    record = make_record(args=(Lazy(compute), ))
+    record.field = Lazy(compute)
+    data = json.loads(JSONFormatter().format(record))
+    assert data['message'] == 'test value'
+    assert data['field'] == 'value'
+    assert len(calls) == 2
+
+
+def test_bind_outside_task():
+    with bind(plugin='test'):
+        assert get_context() is None
+
+
+async def test_bind(loop):
+    install_context()
+    handler = ListHandler()
+    handler.setFormatter(JSONFormatter())
+    logger = logging.getLogger('sirbot.test.context')
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+    async def log(name):
+        with bind(plugin=name):
+            await asyncio.sleep(0, loop=loop)
+            logger.info('test')
+        logger.info('unbound')
+
+    try:
+        await asyncio.gather(log('a'), log('b'), loop=loop)
+    finally:
+        logger.removeHandler(handler)
+
+    records = [json.loads(record) for record in handler.records]
+    assert sorted(r.get('plugin') for r in records if r['message'] == 'test') \
+        == ['a', 'b']
+    assert all('plugin' not in r for r in records if r['message'] != 'test')
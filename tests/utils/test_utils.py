@@ -1,6 +1,8 @@
 import asyncio
+import sys
+import pytest
 
-from sirbot.utils import ensure_future, merge_dict
+from sirbot.utils import ensure_future, merge_dict, set_event_loop_policy
 
 
 async def test_ensure_future(loop, capsys):
@@ -41,3 +43,32 @@ def test_merge_dict():
     c = {"b": [4, 5], "c": {"x": 1}}
     c = merge_dict(c, a)
     assert c == c_ok
+
+
+def test_merge_dict_deep():
+    a = b = dict()
+    for _ in range(5000):
+        b['x'] = dict()
+        b = b['x']
+    b['y'] = 1
+
+    merged = merge_dict({'x': {'z': 2}}, a)
+    assert merged['x']['z'] == 2
+    assert merged['x']['x']['x']['x'] is a['x']['x']['x']['x']
+
+
+def test_set_event_loop_policy_default():
+    assert set_event_loop_policy() == 'asyncio'
+    assert set_event_loop_policy('asyncio') == 'asyncio'
+
+
+def test_set_event_loop_policy_fallback(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'uvloop', None)
+    policy = asyncio.get_event_loop_policy()
+    assert set_event_loop_policy('uvloop') == 'asyncio'
+    assert asyncio.get_event_loop_policy() is policy
+
+
+def test_set_event_loop_policy_unknown():
+    with pytest.raises(ValueError):
+        set_event_loop_policy('xxx')